@@ -1,14 +1,62 @@
 import re
+import io
+import math
+import json
+import logging
+import logging.handlers
 import time
 import sqlite3
 import os
+import hashlib
+import hmac
+import gzip
+import heapq
+import threading
+import socket
+import datetime
+import bisect
+import array
+import functools
+import glob
+import itertools
+import argparse
+import cProfile
+import pstats
+import unicodedata
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+from email.utils import format_datetime, parsedate_to_datetime
 import requests
-from lxml import html
-from flask import Flask, request, render_template_string, redirect
+from lxml import etree, html
+from flask import Flask, Response, g, request, render_template_string, redirect, send_file, abort, stream_with_context, url_for
 import html as html_lib
 
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = None
+    sparse = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 DB_PATH = "inmusic.db"
-LOG_PATH = "crawler_log.txt"
+LOG_PATH = "crawler_log.jsonl"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 3
+LOG_WORKER_KEEP = 16
+LOG_TAIL_MAX_BYTES = 512 * 1024
+LOG_TAIL_BLOCK = 16 * 1024
 
 G1_URL = "https://g1.globo.com/pop-arte/musica/"
 POPLINE_URL = "https://portalpopline.com.br/categoria/musica/"
@@ -16,42 +64,546 @@ TRACKLIST_URL = "https://tracklist.com.br/categoria/noticias/"
 
 UA_HEADER = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
 
+SITE_HOSTS = {
+    "g1.globo.com": "G1 Música",
+    "portalpopline.com.br": "Portal POPline",
+    "tracklist.com.br": "Tracklist",
+}
+
+HOST_RATE_DEFAULT = (2.0, 4)
+HOST_RATES = {
+    "g1.globo.com": (2.0, 4),
+    "portalpopline.com.br": (1.0, 3),
+    "tracklist.com.br": (1.0, 3),
+}
+HTTP_MAX_RETRIES = 3
+RETRY_AFTER_MAX = 300
+ROBOTS_TTL = 6 * 3600
+CRAWLER_AGENT = "InMusic"
+FETCH_MAX_BYTES = 3 * 1024 * 1024
+FETCH_MAX_SECONDS = 20
+FETCH_CHUNK = 32 * 1024
+ARTICLE_BODY_CLASSES = ("mc-article-body", "entry-content", "post-content", "td-post-content", "article-body")
+ARTICLE_SKIP_PARENTS = {"aside", "header", "nav", "footer"}
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "gbraid", "wbraid", "msclkid", "yclid", "igshid",
+    "mc_cid", "mc_eid", "_ga", "_gl", "ref", "ref_src", "amp", "outputtype",
+}
+TRACKING_PREFIXES = ("utm_", "pk_", "mtm_")
+
+METRIC_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRIC_HELP = {
+    "inmusic_http_request_duration_seconds": "Latência das rotas Flask, incluindo o envio do corpo.",
+    "inmusic_db_duration_seconds": "Tempo das funções de acesso ao banco.",
+    "inmusic_crawler_duration_seconds": "Tempo de fetch, parse, extração e gravação por fonte.",
+    "inmusic_crawler_items_total": "Notícias coletadas por fonte.",
+    "inmusic_errors_total": "Erros registrados no log por contexto.",
+    "inmusic_crawler_throttle_total": "Eventos de limitação por host (espera, 429/503, robots).",
+    "inmusic_crawler_fetch_total": "Páginas lidas por fonte e como a leitura terminou (fim, antecipado, limite).",
+    "inmusic_body_fetch_total": "Textos completos baixados sob demanda (buscou, aguardou, prazo, erro).",
+    "inmusic_feed_rebuilds_total": "Atualizações incrementais dos feeds RSS/Atom/JSON em memória.",
+    "inmusic_startup_seconds": "Tempo entre o início do processo e o servidor pronto / a primeira requisição.",
+}
+
+PROCESS_START = time.perf_counter()
+
+ADMIN_TOKEN = os.environ.get("INMUSIC_ADMIN_TOKEN")
+PROFILE_DIR = "profiles"
+PROFILE_SAMPLE_EVERY = int(os.environ.get("INMUSIC_PROFILE_SAMPLE", "0") or 0)
+PROFILE_CRAWLS = os.environ.get("INMUSIC_PROFILE_CRAWL") == "1"
+PROFILE_KEEP = 50
+PROFILE_TOP = 40
+
+THUMB_DIR = "thumb_cache"
+THUMB_SIZE = (560, 380)
+THUMB_CACHE_MAX_BYTES = 256 * 1024 * 1024
+THUMB_MAX_SOURCE_BYTES = 8 * 1024 * 1024
+THUMB_MAX_AGE = 365 * 24 * 3600
+THUMB_PREFETCH_WORKERS = 4
+THUMB_FETCH_TIMEOUT = 5
+
+COMMENTS_PAGE_SIZE = 50
+
+CATEGORY_KEYWORDS = {
+    "Shows": {
+        "show": 1.0, "turnê": 1.5, "apresentação": 1.0, "festival": 1.5,
+        "ingresso": 1.0, "palco": 0.5, "setlist": 1.0,
+    },
+    "Lançamentos": {
+        "álbum": 1.5, "disco": 1.0, "single": 1.5, "faixa": 1.0, "lançamento": 1.5,
+        "lança": 1.0, "clipe": 1.0, "ep": 1.0,
+    },
+    "Listas": {
+        "lista": 1.0, "top": 1.0, "ranking": 1.5, "os melhores": 1.5, "as melhores": 1.5,
+    },
+}
+CATEGORY_ORDER = ["Shows", "Lançamentos", "Listas"]
+CATEGORY_TITLE_WEIGHT = 2.0
+CATEGORY_MIN_SHARE = 0.2
+RECLASSIFY_BATCH = 2000
+FRONTIER_BATCH = 8
+FRONTIER_LEASE = 180
+FRONTIER_MAX_ATTEMPTS = 3
+FRONTIER_POLL = 5
+ARCHIVE_DIR = "arquivo"
+ARCHIVE_AFTER_DAYS = 90
+ARCHIVE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS p.idx_news_created ON news(created_at, id)",
+    "CREATE INDEX IF NOT EXISTS p.idx_news_site_created ON news(site, created_at)",
+    "CREATE INDEX IF NOT EXISTS p.idx_news_categoria_created ON news(categoria, created_at)",
+    "CREATE INDEX IF NOT EXISTS p.idx_news_views ON news(views, created_at)",
+    "CREATE INDEX IF NOT EXISTS p.idx_news_trend ON news(trend_score)",
+]
+SCHEDULE_DEFAULT_INTERVAL = 3600
+SCHEDULE_MIN_INTERVAL = 15 * 60
+SCHEDULE_MAX_INTERVAL = 12 * 3600
+SCHEDULE_TARGET_NEW = 10
+SCHEDULE_ALPHA = 0.3
+SCHEDULE_PAGE_SLACK = 1.5
+SCHEDULE_POLL = 60
+LAZY_BODIES = False
+BODY_PREFETCH_LIMIT = 200
+BODY_PREFETCH_WORKERS = 4
+BODY_FETCH_TIMEOUT = 30
+BODY_PAGE_DEADLINE = 5
+BODY_RETRY_AFTER = 10 * 60
+FEED_SIZE = 50
+FEED_CACHE_MAX = 64
+FEED_TITLE = "InMusic – Notícias de Música"
+FEED_FORMATS = {
+    "rss": "application/rss+xml; charset=utf-8",
+    "atom": "application/atom+xml; charset=utf-8",
+    "json": "application/feed+json; charset=utf-8",
+}
+SNAPSHOT_TABLES = ["news", "comments", "news_categorias", "artists", "artist_news", "news_related"]
+SNAPSHOT_BATCH = 5000
+
+TREND_HALF_LIFE = 12 * 3600
+TREND_LAMBDA = math.log(2) / TREND_HALF_LIFE
+TREND_EPOCH = 1_700_000_000
+TREND_WEIGHTS = {"publicacao": 3.0, "view": 1.0, "like": 4.0, "comentario": 6.0}
+
+ARTISTAS = [
+    "Anitta", "Ludmilla", "Luísa Sonza", "Pabllo Vittar", "Gloria Groove", "Iza", "Marília Mendonça",
+    "Jorge & Mateus", "Henrique & Juliano", "Gusttavo Lima", "Ana Castela", "Simone Mendes", "Luan Santana",
+    "Zé Neto & Cristiano", "Maiara & Maraisa", "Wesley Safadão", "Alok", "Vintage Culture", "Pedro Sampaio",
+    "MC Cabelinho", "Matuê", "Veigh", "Filipe Ret", "L7nnon", "Racionais MC's", "Emicida", "Criolo", "Djonga",
+    "BK'", "Marina Sena", "Liniker", "Duda Beat", "Jão", "Manu Gavassi", "Vitor Kley", "Tiago Iorc",
+    "Caetano Veloso", "Gilberto Gil", "Chico Buarque", "Milton Nascimento", "Maria Bethânia", "Gal Costa",
+    "Marisa Monte", "Ivete Sangalo", "Claudia Leitte", "Daniela Mercury", "Roberto Carlos", "Zeca Pagodinho",
+    "Seu Jorge", "Djavan", "Ney Matogrosso", "Rita Lee", "Os Paralamas do Sucesso", "Titãs", "Skank",
+    "Legião Urbana", "Capital Inicial", "Pitty", "Sepultura", "Xamã", "Thiaguinho", "Péricles", "Ferrugem",
+    "Menos é Mais", "Sorriso Maroto", "Taylor Swift", "Beyoncé", "Rihanna", "Lady Gaga", "Dua Lipa",
+    "Billie Eilish", "Olivia Rodrigo", "Ariana Grande", "Sabrina Carpenter", "Bad Bunny", "Shakira",
+    "Karol G", "Rosalía", "The Weeknd", "Drake", "Kendrick Lamar", "Travis Scott", "Ed Sheeran",
+    "Bruno Mars", "Coldplay", "Imagine Dragons", "Metallica", "Iron Maiden", "Foo Fighters",
+    "Red Hot Chili Peppers", "Guns N' Roses", "Paul McCartney", "The Rolling Stones", "Madonna",
+    "Katy Perry", "Miley Cyrus", "Harry Styles", "BTS", "Blackpink", "Stray Kids", "Twice",
+]
+ARTIST_MIN_NEWS = 2
+ARTIST_PAGE_LIMIT = 200
+CAPS_NGRAM_RE = re.compile(
+    r"\b([A-ZÀ-Ý][\wÀ-ÿ'’-]*(?:\s+(?:(?:d[aeo]s?|&|e)\s+)?[A-ZÀ-Ý][\wÀ-ÿ'’-]*){1,3})"
+)
+CAPS_STOP = frozenset(
+    """
+    o a os as um uma em no na nos nas de da do para por com sem sobre apos como quando
+    segundo ele ela eles elas eu nos voce voces esse essa este esta isso aqui ja mais
+    janeiro fevereiro marco abril maio junho julho agosto setembro outubro novembro dezembro
+    segunda terca quarta quinta sexta sabado domingo
+    brasil sao rio paulo janeiro minas gerais belo horizonte estados unidos
+    g1 globo tv rede instagram tiktok youtube spotify twitter x grammy latin festival rock lollapalooza
+    """.split()
+)
+
+SUGGEST_K = 8
+SUGGEST_PRECOMPUTE_LEN = 3
+SUGGEST_ARTIST_BOOST = 3.0
+SUGGEST_MIN_WEIGHT = 2.0
+SUGGEST_REFRESH = 30
+WORD_RE = re.compile(r"\w+")
+RELATED_K = 6
+RELATED_TEXT_CHARS = 4000
+RELATED_MAX_DF = 0.5
+RELATED_TERMS_PER_DOC = 30
+RELATED_MIN_SCORE = 0.05
+RELATED_CHUNK_ROWS = 512
+RELATED_REBUILD_RATIO = 0.2
+RELATED_SAVE_EVERY = 300
+TOKEN_RE = re.compile(r"[a-z0-9]{3,}")
+STOPWORDS = frozenset(
+    """
+    que com para por uma uns umas dos das nos nas aos mais como foi ser sao seu sua seus suas
+    tem ter ele ela eles elas isso isto este esta esse essa pelo pela pelos pelas entre sobre
+    ate tambem quando muito apos ainda mas nao sem era sera vai pode mesmo onde qual quem
+    the and for you with from that this are was
+    """.split()
+)
+
+SEARCH_FILTER_RE = re.compile(r'\b(site|categoria|de|ate):(?:"([^"]*)"|(\S+))', re.IGNORECASE)
+
+NEWS_DDL = """
+CREATE TABLE IF NOT EXISTS {schema}news (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    titulo TEXT,
+    imagem_url TEXT,
+    resumo TEXT,
+    texto_completo TEXT,
+    link TEXT UNIQUE,
+    autor TEXT,
+    site TEXT,
+    categoria TEXT,
+    views INTEGER DEFAULT 0,
+    created_at INTEGER,
+    likes INTEGER DEFAULT 0,
+    liked INTEGER DEFAULT 0,
+    comment_count INTEGER DEFAULT 0,
+    trend_score REAL
+)
+"""
+
+# Incrementar a cada mudança de esquema em init_db (tabela, coluna, índice ou backfill).
+SCHEMA_VERSION = 3
+
+NEWS_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_news_created ON news(created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_news_site_created ON news(site, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_news_categoria_created ON news(categoria, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_comments_news_created ON comments(news_id, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_news_views ON news(views, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_news_trend ON news(trend_score)",
+    "CREATE INDEX IF NOT EXISTS idx_news_categorias_categoria ON news_categorias(categoria, news_id)",
+    "CREATE INDEX IF NOT EXISTS idx_artist_news_news ON artist_news(news_id)",
+    "CREATE INDEX IF NOT EXISTS idx_frontier_status ON frontier(status, prioridade, atualizado)",
+]
+
+
+_log_lock = threading.Lock()
+_log_handler = None
+_process_log_path = None
+
+
+def get_log_handler():
+    global _log_handler
+    with _log_lock:
+        caminho = _process_log_path or LOG_PATH
+        if _log_handler is None or _log_handler.baseFilename != os.path.abspath(caminho):
+            _log_handler = logging.handlers.RotatingFileHandler(
+                caminho, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8", delay=True
+            )
+        return _log_handler
+
 
-def log_error(contexto, erro):
+def worker_log_paths():
+    raiz, ext = os.path.splitext(LOG_PATH)
+    return glob.glob(f"{glob.escape(raiz)}.trabalhador-*{ext}")
+
+
+def use_process_log():
+    """Aponta o log deste processo para um arquivo só dele.
+
+    RotatingFileHandler não coordena a rotação entre processos: com `servir` e os
+    trabalhadores no mesmo arquivo, um renomeia o log enquanto os outros ainda
+    escrevem no antigo. Cada trabalhador grava e rotaciona o seu; read_log_tail junta tudo.
+    """
+    global _process_log_path
+    raiz, ext = os.path.splitext(LOG_PATH)
+    _process_log_path = f"{raiz}.trabalhador-{os.getpid()}{ext}"
+    antigos = []
+    for caminho in worker_log_paths():
+        try:
+            antigos.append((os.stat(caminho).st_mtime, caminho))
+        except OSError:
+            continue
+    antigos.sort()
+    for _, caminho in antigos[:-LOG_WORKER_KEEP]:
+        for arquivo in [caminho] + glob.glob(f"{glob.escape(caminho)}.*"):
+            try:
+                os.remove(arquivo)
+            except OSError:
+                pass
+
+
+def log_event(contexto, nivel="info", **campos):
     try:
-        with open(LOG_PATH, "a", encoding="utf-8") as f:
-            ts = time.strftime("%d/%m/%Y %H:%M:%S", time.localtime())
-            f.write(f"[{ts}] {contexto}: {erro}\n")
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime()),
+            "nivel": nivel,
+            "contexto": contexto,
+        }
+        entry.update({k: v for k, v in campos.items() if v is not None})
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        get_log_handler().handle(logging.makeLogRecord({"msg": line, "levelno": logging.INFO}))
     except Exception:
         pass
 
 
-def db_connect():
-    return sqlite3.connect(DB_PATH)
+def log_error(contexto, erro, **campos):
+    inc("inmusic_errors_total", contexto=contexto)
+    log_event(contexto, nivel="erro", erro=str(erro), **campos)
+
+
+_metrics_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+
+
+def observe(nome, segundos, **labels):
+    chave = (nome, tuple(sorted(labels.items())))
+    i = bisect.bisect_left(METRIC_BUCKETS, segundos)
+    with _metrics_lock:
+        h = _histograms.get(chave)
+        if h is None:
+            h = _histograms[chave] = [[0] * (len(METRIC_BUCKETS) + 1), 0.0]
+        h[0][i] += 1
+        h[1] += segundos
+
+
+def inc(nome, valor=1, **labels):
+    chave = (nome, tuple(sorted(labels.items())))
+    with _metrics_lock:
+        _counters[chave] = _counters.get(chave, 0) + valor
+
+
+def timed(nome):
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe("inmusic_db_duration_seconds", time.perf_counter() - inicio, funcao=nome)
+
+        return wrapper
+
+    return deco
+
+
+def source_for_url(url):
+    host = (urlparse(url or "").hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    return SITE_HOSTS.get(host, host or "desconhecida")
+
+
+def _format_labels(labels, extra=None):
+    itens = list(labels) + (extra or [])
+    if not itens:
+        return ""
+    partes = []
+    for k, v in itens:
+        v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        partes.append(f'{k}="{v}"')
+    return "{" + ",".join(partes) + "}"
+
+
+def render_metrics():
+    with _metrics_lock:
+        hist = {k: (list(v[0]), v[1]) for k, v in _histograms.items()}
+        counters = dict(_counters)
+    linhas = []
+    for nome in sorted({k[0] for k in hist}):
+        linhas.append(f"# HELP {nome} {METRIC_HELP.get(nome, nome)}")
+        linhas.append(f"# TYPE {nome} histogram")
+        for (n, labels), (buckets, soma) in sorted(hist.items()):
+            if n != nome:
+                continue
+            acumulado = 0
+            for limite, qtd in zip(METRIC_BUCKETS, buckets):
+                acumulado += qtd
+                linhas.append(f"{nome}_bucket{_format_labels(labels, [('le', limite)])} {acumulado}")
+            acumulado += buckets[-1]
+            linhas.append(f"{nome}_bucket{_format_labels(labels, [('le', '+Inf')])} {acumulado}")
+            linhas.append(f"{nome}_sum{_format_labels(labels)} {soma:.6f}")
+            linhas.append(f"{nome}_count{_format_labels(labels)} {acumulado}")
+    for nome in sorted({k[0] for k in counters}):
+        linhas.append(f"# HELP {nome} {METRIC_HELP.get(nome, nome)}")
+        linhas.append(f"# TYPE {nome} counter")
+        for (n, labels), valor in sorted(counters.items()):
+            if n == nome:
+                linhas.append(f"{nome}{_format_labels(labels)} {valor}")
+    return "\n".join(linhas) + "\n"
+
+
+_profile_lock = threading.Lock()
+_profile_requests = itertools.count(1)
+_profile_files = itertools.count(1)
+
+
+def admin_authorized(valor):
+    return bool(ADMIN_TOKEN) and bool(valor) and hmac.compare_digest(valor, ADMIN_TOKEN)
+
+
+def start_profile():
+    perfil = cProfile.Profile()
+    try:
+        perfil.enable()
+    except ValueError:
+        # A partir do Python 3.12 só um profiler pode estar ativo no processo.
+        return None
+    return perfil
+
+
+def profiled_call(perfis, fn, *args, **kwargs):
+    perfil = start_profile()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        if perfil is not None:
+            perfil.disable()
+            perfis.append(perfil)
+
+
+def save_profile(nome, perfis, segundos):
+    """Grava os perfis (somados) em PROFILE_DIR e apaga os mais antigos além de PROFILE_KEEP."""
+    perfis = [p for p in perfis if p is not None]
+    if not perfis:
+        return None
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r"[^a-z0-9]+", "-", nome.lower()).strip("-") or "raiz"
+    arquivo = (
+        f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_profile_files)}"
+        f"-{slug[:60]}-{round(segundos * 1000)}ms.prof"
+    )
+    stats = pstats.Stats(perfis[0])
+    for p in perfis[1:]:
+        stats.add(p)
+    stats.dump_stats(os.path.join(PROFILE_DIR, arquivo))
+    antigos = sorted(
+        (e for e in os.scandir(PROFILE_DIR) if e.name.endswith(".prof")), key=lambda e: e.stat().st_mtime
+    )
+    for e in antigos[:-PROFILE_KEEP]:
+        try:
+            os.remove(e.path)
+        except OSError:
+            pass
+    log_event("perfil", nome=nome, arquivo=arquivo, ms=round(segundos * 1000))
+    return arquivo
+
+
+def profile_report(arquivo, ordem="cumulative", linhas=PROFILE_TOP):
+    out = io.StringIO()
+    pstats.Stats(os.path.join(PROFILE_DIR, arquivo), stream=out).strip_dirs().sort_stats(ordem).print_stats(linhas)
+    return out.getvalue()
+
+
+def read_log_tail(max_linhas=200, contexto=None, max_bytes=LOG_TAIL_MAX_BYTES):
+    """Últimas linhas do log principal e dos logs dos trabalhadores, em ordem de horário."""
+    filtro = (contexto or "").casefold()
+    out = []
+    for caminho in [LOG_PATH] + sorted(worker_log_paths()):
+        out.extend(read_file_tail(caminho, max_linhas, filtro, max_bytes))
+    out.sort(key=lambda e: e.get("ts", ""))
+    return out[-max_linhas:]
+
+
+def read_file_tail(caminho, max_linhas, filtro, max_bytes):
+    if not os.path.exists(caminho):
+        return []
+    out = []
+    with open(caminho, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        lido = 0
+        resto = b""
+        while pos > 0 and lido < max_bytes and len(out) < max_linhas:
+            bloco = min(LOG_TAIL_BLOCK, pos)
+            pos -= bloco
+            f.seek(pos)
+            dados = f.read(bloco) + resto
+            lido += bloco
+            linhas = dados.split(b"\n")
+            resto = linhas.pop(0) if pos > 0 else b""
+            for raw in reversed(linhas):
+                if not raw.strip():
+                    continue
+                texto = raw.decode("utf-8", errors="replace")
+                try:
+                    entry = json.loads(texto)
+                except ValueError:
+                    entry = {"contexto": "", "erro": texto}
+                if filtro and filtro not in str(entry.get("contexto", "")).casefold():
+                    continue
+                out.append(entry)
+                if len(out) >= max_linhas:
+                    break
+    out.reverse()
+    return out
+
+
+def trend_term(evento, ts=None):
+    ts = time.time() if ts is None else ts
+    return math.log(TREND_WEIGHTS[evento]) + TREND_LAMBDA * (ts - TREND_EPOCH)
+
+
+def trend_add(atual, termo):
+    if atual is None:
+        return termo
+    alto, baixo = (atual, termo) if atual >= termo else (termo, atual)
+    return alto + math.log1p(math.exp(baixo - alto))
+
+
+def trend_sub(atual, termo):
+    if atual is None or termo >= atual:
+        return None
+    return atual + math.log1p(-math.exp(termo - atual))
+
+
+def trend_seed(created_at, views, likes, comentarios):
+    peso = (
+        TREND_WEIGHTS["publicacao"]
+        + TREND_WEIGHTS["view"] * (views or 0)
+        + TREND_WEIGHTS["like"] * (likes or 0)
+        + TREND_WEIGHTS["comentario"] * (comentarios or 0)
+    )
+    return math.log(peso) + TREND_LAMBDA * ((created_at or time.time()) - TREND_EPOCH)
 
 
-def init_db():
+def trend_points(score, agora=None):
+    if score is None:
+        return 0.0
+    agora = time.time() if agora is None else agora
+    return math.exp(score - TREND_LAMBDA * (agora - TREND_EPOCH))
+
+
+def db_connect(caminho=None):
+    con = sqlite3.connect(caminho or DB_PATH)
+    con.create_function("trend_add", 2, trend_add, deterministic=True)
+    con.create_function("trend_sub", 2, trend_sub, deterministic=True)
+    return con
+
+
+def init_db(indices=True):
     con = db_connect()
     cur = con.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA user_version")
+    versao = cur.fetchone()[0]
+    if indices and versao >= SCHEMA_VERSION:
+        con.close()
+        return
+    inicio = time.perf_counter()
+    cur.execute(NEWS_DDL.format(schema=""))
     cur.execute(
         """
-        CREATE TABLE IF NOT EXISTS news (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            titulo TEXT,
-            imagem_url TEXT,
-            resumo TEXT,
-            texto_completo TEXT,
-            link TEXT UNIQUE,
-            autor TEXT,
-            site TEXT,
-            categoria TEXT,
-            views INTEGER DEFAULT 0,
-            created_at INTEGER,
-            likes INTEGER DEFAULT 0,
-            liked INTEGER DEFAULT 0
+        CREATE TABLE IF NOT EXISTS archive_months (
+            mes TEXT PRIMARY KEY,
+            arquivo TEXT,
+            total INTEGER,
+            inicio INTEGER,
+            fim INTEGER
         )
         """
     )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS archive_index (
+            news_id INTEGER PRIMARY KEY,
+            mes TEXT
+        ) WITHOUT ROWID
+        """
+    )
     cur.execute(
         """
         CREATE TABLE IF NOT EXISTS comments (
@@ -63,43 +615,336 @@ def init_db():
         )
         """
     )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS news_daily (
+            dia INTEGER,
+            site TEXT,
+            categoria TEXT,
+            total INTEGER DEFAULT 0,
+            PRIMARY KEY (dia, site, categoria)
+        ) WITHOUT ROWID
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS news_related (
+            news_id INTEGER,
+            posicao INTEGER,
+            related_id INTEGER,
+            score REAL,
+            PRIMARY KEY (news_id, posicao)
+        ) WITHOUT ROWID
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS artists (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT,
+            chave TEXT UNIQUE,
+            curado INTEGER DEFAULT 0,
+            mencoes INTEGER DEFAULT 0,
+            noticias INTEGER DEFAULT 0
+        )
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS artist_news (
+            artist_id INTEGER,
+            news_id INTEGER,
+            mencoes INTEGER,
+            PRIMARY KEY (artist_id, news_id)
+        ) WITHOUT ROWID
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS news_categorias (
+            news_id INTEGER,
+            categoria TEXT,
+            peso REAL,
+            PRIMARY KEY (news_id, categoria)
+        ) WITHOUT ROWID
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS crawl_state (
+            fonte TEXT PRIMARY KEY,
+            pagina INTEGER,
+            itens INTEGER,
+            iniciado INTEGER,
+            concluido INTEGER
+        )
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS crawl_urls (
+            url TEXT PRIMARY KEY,
+            fonte TEXT,
+            status TEXT,
+            tentativas INTEGER DEFAULT 0,
+            atualizado INTEGER
+        ) WITHOUT ROWID
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS crawl_schedule (
+            fonte TEXT PRIMARY KEY,
+            taxa REAL,
+            cards_pagina REAL,
+            intervalo INTEGER,
+            paginas INTEGER,
+            ultima INTEGER,
+            proxima INTEGER,
+            novas_ultima INTEGER
+        )
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS frontier (
+            url TEXT PRIMARY KEY,
+            fonte TEXT,
+            tipo TEXT,
+            pagina INTEGER,
+            dados TEXT,
+            prioridade REAL DEFAULT 0,
+            status TEXT DEFAULT 'pendente',
+            lease_ate INTEGER,
+            dono TEXT,
+            tentativas INTEGER DEFAULT 0,
+            atualizado INTEGER
+        )
+        """
+    )
+    if add_column_if_missing(cur, "news", "comment_count", "INTEGER DEFAULT 0"):
+        cur.execute(
+            """
+            UPDATE news SET comment_count =
+                (SELECT COUNT(*) FROM comments c WHERE c.news_id = news.id)
+            """
+        )
+    if add_column_if_missing(cur, "news", "trend_score", "REAL"):
+        con.create_function("trend_seed", 4, trend_seed, deterministic=True)
+        cur.execute("UPDATE news SET trend_score = trend_seed(created_at, views, likes, comment_count)")
+    if indices:
+        for ddl in NEWS_INDEXES:
+            cur.execute(ddl)
+    cur.execute("SELECT EXISTS(SELECT 1 FROM news) AND NOT EXISTS(SELECT 1 FROM news_daily)")
+    if cur.fetchone()[0]:
+        rebuild_daily_counts(cur)
+    if indices:
+        cur.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
     con.commit()
     con.close()
+    log_event("init_db", versao_anterior=versao, versao=SCHEMA_VERSION if indices else versao,
+              ms=round((time.perf_counter() - inicio) * 1000))
+
+
+def add_column_if_missing(cur, tabela, coluna, tipo):
+    cur.execute(f"PRAGMA table_info({tabela})")
+    if any(r[1] == coluna for r in cur.fetchall()):
+        return False
+    cur.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo}")
+    return True
+
+
+@functools.lru_cache(maxsize=8192)
+def _format_minute(minuto):
+    return time.strftime("%d/%m/%Y %H:%M", time.localtime(minuto * 60))
+
+
+def format_ts(ts):
+    return _format_minute(int(ts or time.time()) // 60)
+
+
+def day_number(ts):
+    return datetime.date.fromtimestamp(ts).toordinal()
+
+
+def rebuild_daily_counts(cur):
+    cur.execute("DELETE FROM news_daily")
+    cur.execute(
+        """
+        INSERT INTO news_daily (dia, site, categoria, total)
+        SELECT CAST(julianday(date(created_at, 'unixepoch', 'localtime')) - 1721424.5 AS INTEGER),
+               COALESCE(site, ''), COALESCE(categoria, ''), COUNT(*)
+        FROM news
+        GROUP BY 1, 2, 3
+        """
+    )
+
+
+def bump_daily_count(cur, ts, site, categoria, delta=1):
+    cur.execute(
+        """
+        INSERT INTO news_daily (dia, site, categoria, total) VALUES (?, ?, ?, ?)
+        ON CONFLICT (dia, site, categoria) DO UPDATE SET total = total + excluded.total
+        """,
+        (day_number(ts), site or "", categoria or "", delta),
+    )
+
+
+def _build_fold_table():
+    tabela = {}
+    for cp in range(0xC0, 0x250):
+        ch = chr(cp)
+        base = "".join(c for c in unicodedata.normalize("NFKD", ch) if not unicodedata.combining(c))
+        if base != ch and base.isascii():
+            tabela[cp] = base.lower()
+    return tabela
+
+
+FOLD_TABLE = _build_fold_table()
+
+
+def fold_text(texto):
+    return (texto or "").lower().translate(FOLD_TABLE)
+
+
+def _build_category_matcher():
+    pesos = {}
+    for categoria, palavras in CATEGORY_KEYWORDS.items():
+        for palavra, peso in palavras.items():
+            pesos.setdefault(fold_text(palavra), []).append((categoria, peso))
+    alternativas = sorted(pesos, key=len, reverse=True)
+    padrao = "|".join(re.escape(p).replace(r"\ ", r"\s+") for p in alternativas)
+    return re.compile(rf"\b({padrao})(?:s|es)?\b"), pesos
+
+
+CATEGORY_RE, CATEGORY_WEIGHTS = _build_category_matcher()
+
+
+def _score_categories(texto, fator, scores):
+    for m in CATEGORY_RE.finditer(fold_text(texto)):
+        chave = re.sub(r"\s+", " ", m.group(1))
+        for categoria, peso in CATEGORY_WEIGHTS.get(chave, ()):
+            scores[categoria] = scores.get(categoria, 0.0) + peso * fator
+
+
+def classify_categories(titulo, resumo):
+    scores = {}
+    _score_categories(titulo, CATEGORY_TITLE_WEIGHT, scores)
+    _score_categories(resumo, 1.0, scores)
+    total = sum(scores.values())
+    if not total:
+        return [("Outros", 1.0)]
+    labels = [(c, round(v / total, 3)) for c, v in scores.items() if v / total >= CATEGORY_MIN_SHARE]
+    labels.sort(key=lambda cv: (-cv[1], CATEGORY_ORDER.index(cv[0])))
+    return labels
 
 
 def classify_category(titulo, resumo):
-    texto = f"{titulo} {resumo}".lower()
-    if any(p in texto for p in ["show", "turnê", "turne", "apresentação", "festival"]):
-        return "Shows"
-    if any(p in texto for p in ["álbum", "album", "disco", "single", "faixa", "lançamento"]):
-        return "Lançamentos"
-    if any(p in texto for p in ["lista", "top", "ranking", "os melhores"]):
-        return "Listas"
-    return "Outros"
+    return classify_categories(titulo, resumo)[0][0]
+
+
+def save_categories(cur, news_id, labels):
+    cur.execute("DELETE FROM news_categorias WHERE news_id = ?", (news_id,))
+    cur.executemany(
+        "INSERT INTO news_categorias (news_id, categoria, peso) VALUES (?, ?, ?)",
+        [(news_id, c, p) for c, p in labels],
+    )
+
+
+def _classify_rows(rows):
+    return [(r[0], classify_categories(r[1], r[2] or "")) for r in rows]
+
+
+def reclassify_all(batch_size=RECLASSIFY_BATCH, processos=None):
+    processos = processos or os.cpu_count() or 1
+    leitura = db_connect()
+    escrita = db_connect()
+    inicio = time.perf_counter()
+    vistos = 0
+    alterados = 0
 
+    def lotes():
+        ultimo = 0
+        while True:
+            rows = leitura.execute(
+                "SELECT id, titulo, resumo FROM news WHERE id > ? ORDER BY id LIMIT ?",
+                (ultimo, batch_size),
+            ).fetchall()
+            if not rows:
+                return
+            ultimo = rows[-1][0]
+            yield rows
 
+    def grava(resultado):
+        nonlocal vistos, alterados
+        ids = [id_ for id_, _ in resultado]
+        atuais = dict(
+            (r[0], r[1:])
+            for r in escrita.execute(
+                f"SELECT id, categoria, site, created_at FROM news WHERE id IN ({','.join('?' * len(ids))})",
+                ids,
+            )
+        )
+        with escrita:
+            cur = escrita.cursor()
+            for id_, labels in resultado:
+                save_categories(cur, id_, labels)
+                nova = labels[0][0]
+                antiga, site, ts = atuais.get(id_, (nova, None, None))
+                if antiga != nova:
+                    cur.execute("UPDATE news SET categoria = ? WHERE id = ?", (nova, id_))
+                    bump_daily_count(cur, ts or time.time(), site, antiga, -1)
+                    bump_daily_count(cur, ts or time.time(), site, nova, 1)
+                    alterados += 1
+        vistos += len(resultado)
+
+    try:
+        if processos <= 1:
+            for rows in lotes():
+                grava(_classify_rows(rows))
+        else:
+            with ProcessPoolExecutor(max_workers=processos) as pool:
+                pendentes = []
+                for rows in lotes():
+                    pendentes.append(pool.submit(_classify_rows, rows))
+                    if len(pendentes) >= processos * 2:
+                        grava(pendentes.pop(0).result())
+                for fut in pendentes:
+                    grava(fut.result())
+    finally:
+        leitura.close()
+        escrita.close()
+    ms = round((time.perf_counter() - inicio) * 1000)
+    log_event("reclassify_all", noticias=vistos, alteradas=alterados, processos=processos, ms=ms)
+    print(f"Reclassificadas {vistos} notícias ({alterados} mudaram de categoria) em {ms} ms")
+    return vistos, alterados
+
+
+@timed("save_news_batch")
 def save_news_batch(news_list):
     con = db_connect()
     cur = con.cursor()
     now = int(time.time())
+    novos_ids = []
     for n in news_list:
         try:
             titulo = n["titulo"]
             resumo = n.get("resumo") or ""
-            categoria = classify_category(titulo, resumo)
+            labels = classify_categories(titulo, resumo)
+            categoria = labels[0][0]
             cur.execute(
                 """
                 INSERT OR IGNORE INTO news
                 (titulo, imagem_url, resumo, texto_completo, link,
-                 autor, site, categoria, views, created_at, likes, liked)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                 autor, site, categoria, views, created_at, likes, liked, trend_score)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """,
                 (
                     titulo,
                     n.get("imagem_url"),
                     resumo,
                     n.get("texto_completo"),
-                    n.get("link"),
+                    canonical_url(n.get("link")),
                     n.get("autor"),
                     n.get("site"),
                     categoria,
@@ -107,120 +952,217 @@ def save_news_batch(news_list):
                     now,
                     0,
                     0,
+                    trend_term("publicacao", now),
                 ),
             )
+            if cur.rowcount == 1:
+                novos_ids.append(cur.lastrowid)
+                bump_daily_count(cur, now, n.get("site"), categoria)
+                save_categories(cur, cur.lastrowid, labels)
         except Exception as e:
             print("DB erro ao salvar notícia:", e)
-            log_error("save_news_batch", e)
+            log_error("save_news_batch", e, url=n.get("link"), fonte=n.get("site"))
     con.commit()
     con.close()
+    return novos_ids
 
 
-def load_news(limit=200, offset=0):
+NEWS_COLUMNS = """
+    id, titulo, imagem_url, resumo, texto_completo, link,
+    autor, site, categoria, views, created_at, likes, liked, comment_count
+"""
+
+
+def news_from_row(r):
+    data_fmt = format_ts(r[10])
+    return {
+        "id": r[0],
+        "titulo": r[1],
+        "imagem_url": r[2],
+        "resumo": r[3],
+        "texto_completo": r[4],
+        "link": r[5],
+        "autor": r[6],
+        "site": r[7],
+        "categoria": r[8],
+        "views": r[9],
+        "data": data_fmt,
+        "likes": r[11],
+        "liked": r[12],
+        "comentarios": r[13] or 0,
+    }
+
+
+def iter_query(query, params, row_fn=news_from_row, nome="iter_query", caminho=None):
+    inicio = time.perf_counter()
+    con = db_connect(caminho)
+    try:
+        cur = con.cursor()
+        cur.execute(query, params)
+        for r in cur:
+            yield row_fn(r)
+    finally:
+        con.close()
+        observe("inmusic_db_duration_seconds", time.perf_counter() - inicio, funcao=nome)
+
+
+def archive_path(arquivo):
+    return os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), ARCHIVE_DIR, arquivo)
+
+
+def archive_months(de=None, ate=None):
     con = db_connect()
-    cur = con.cursor()
-    cur.execute(
-        """
-        SELECT id, titulo, imagem_url, resumo, texto_completo, link,
-               autor, site, categoria, views, created_at, likes, liked
-        FROM news
-        ORDER BY created_at DESC, id DESC
-        LIMIT ? OFFSET ?
-        """,
-        (limit, offset),
-    )
-    rows = cur.fetchall()
+    rows = con.execute("SELECT mes, arquivo, total, inicio, fim FROM archive_months ORDER BY mes DESC").fetchall()
     con.close()
-    out = []
-    for r in rows:
-        ts = r[10] or int(time.time())
-        data_fmt = time.strftime("%d/%m/%Y %H:%M", time.localtime(ts))
-        out.append(
-            {
-                "id": r[0],
-                "titulo": r[1],
-                "imagem_url": r[2],
-                "resumo": r[3],
-                "texto_completo": r[4],
-                "link": r[5],
-                "autor": r[6],
-                "site": r[7],
-                "categoria": r[8],
-                "views": r[9],
-                "data": data_fmt,
-                "likes": r[11],
-                "liked": r[12],
-            }
-        )
-    return out
+    return [
+        (archive_path(arquivo), total)
+        for mes, arquivo, total, inicio, fim in rows
+        if (de is None or fim >= de) and (ate is None or inicio <= ate)
+    ]
 
 
-def load_liked(limit=200):
+def archive_path_for(id_):
     con = db_connect()
-    cur = con.cursor()
-    cur.execute(
-        """
-        SELECT id, titulo, imagem_url, resumo, texto_completo, link,
-               autor, site, categoria, views, created_at, likes, liked
-        FROM news
-        WHERE liked = 1
-        ORDER BY created_at DESC, id DESC
-        LIMIT ?
-        """,
-        (limit,),
-    )
-    rows = cur.fetchall()
+    row = con.execute(
+        "SELECT m.arquivo FROM archive_index i JOIN archive_months m ON m.mes = i.mes WHERE i.news_id = ?",
+        (id_,),
+    ).fetchone()
     con.close()
-    out = []
-    for r in rows:
-        ts = r[10] or int(time.time())
-        data_fmt = time.strftime("%d/%m/%Y %H:%M", time.localtime(ts))
-        out.append(
-            {
-                "id": r[0],
-                "titulo": r[1],
-                "imagem_url": r[2],
-                "resumo": r[3],
-                "texto_completo": r[4],
-                "link": r[5],
-                "autor": r[6],
-                "site": r[7],
-                "categoria": r[8],
-                "views": r[9],
-                "data": data_fmt,
-                "likes": r[11],
-                "liked": r[12],
-            }
-        )
-    return out
+    return archive_path(row[0]) if row else None
 
 
-def count_news():
+def count_hot(query_count, params):
+    con = db_connect()
+    try:
+        return con.execute(query_count, params).fetchone()[0]
+    finally:
+        con.close()
+
+
+def iter_partitioned(query, params, limit, offset=0, row_fn=news_from_row, nome="iter_query",
+                     de=None, ate=None, query_count=None):
+    restante = limit
+    entregues = 0
+    for item in iter_query(query, list(params) + [restante, offset], row_fn, nome):
+        entregues += 1
+        yield item
+    restante -= entregues
+    if restante <= 0:
+        return
+    if offset and not entregues:
+        offset = max(0, offset - count_hot(query_count or "SELECT COUNT(*) FROM news", params))
+    else:
+        offset = 0
+    for caminho, total in archive_months(de, ate):
+        if restante <= 0:
+            break
+        if query_count is None and offset >= total:
+            offset -= total
+            continue
+        entregues = 0
+        for item in iter_query(query, list(params) + [restante, offset], row_fn, nome, caminho):
+            entregues += 1
+            yield item
+        restante -= entregues
+        offset = 0 if entregues or query_count is not None else max(0, offset - total)
+
+
+def iter_merged(query, params, limit, key, row_fn, nome, de=None, ate=None):
+    fontes = [iter_query(query, list(params) + [limit], lambda r: r, nome)]
+    fontes.extend(
+        iter_query(query, list(params) + [limit], lambda r: r, nome, caminho)
+        for caminho, _ in archive_months(de, ate)
+    )
+    for r in itertools.islice(heapq.merge(*fontes, key=key), limit):
+        yield row_fn(r)
+
+
+def iter_news(limit=200, offset=0):
+    return iter_partitioned(
+        f"""
+        SELECT {NEWS_COLUMNS}
+        FROM news
+        ORDER BY created_at DESC, id DESC
+        LIMIT ? OFFSET ?
+        """,
+        [],
+        limit,
+        offset,
+        nome="iter_news",
+    )
+
+
+@timed("load_news")
+def load_news(limit=200, offset=0):
+    return list(iter_news(limit, offset))
+
+
+def iter_liked(limit=200):
+    return iter_query(
+        f"""
+        SELECT {NEWS_COLUMNS}
+        FROM news
+        WHERE liked = 1
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+        """,
+        (limit,),
+        nome="iter_liked",
+    )
+
+
+@timed("load_liked")
+def load_liked(limit=200):
+    return list(iter_liked(limit))
+
+
+@timed("load_image_url")
+def load_image_url(id_):
+    con = db_connect()
+    cur = con.cursor()
+    cur.execute("SELECT imagem_url FROM news WHERE id=?", (id_,))
+    row = cur.fetchone()
+    con.close()
+    if not row:
+        caminho = archive_path_for(id_)
+        if not caminho:
+            return None
+        con = db_connect(caminho)
+        row = con.execute("SELECT imagem_url FROM news WHERE id=?", (id_,)).fetchone()
+        con.close()
+    return row[0] if row else None
+
+
+@timed("count_news")
+def count_news():
     con = db_connect()
     cur = con.cursor()
-    cur.execute("SELECT COUNT(*) FROM news")
+    cur.execute("SELECT (SELECT COUNT(*) FROM news) + (SELECT COALESCE(SUM(total), 0) FROM archive_months)")
     total = cur.fetchone()[0]
     con.close()
     return total
 
 
+@timed("load_one")
 def load_one(id_):
-    con = db_connect()
-    cur = con.cursor()
-    cur.execute(
-        """
+    query = """
         SELECT titulo, imagem_url, texto_completo, autor, site,
-               categoria, views, created_at, likes, liked
+               categoria, views, created_at, likes, liked, comment_count, link, resumo
         FROM news WHERE id=?
-        """,
-        (id_,),
-    )
-    row = cur.fetchone()
+    """
+    con = db_connect()
+    row = con.execute(query, (id_,)).fetchone()
     con.close()
+    if not row:
+        caminho = archive_path_for(id_)
+        if not caminho:
+            return None
+        con = db_connect(caminho)
+        row = con.execute(query, (id_,)).fetchone()
+        con.close()
     if not row:
         return None
-    ts = row[7] or int(time.time())
-    data_fmt = time.strftime("%d/%m/%Y %H:%M", time.localtime(ts))
+    data_fmt = format_ts(row[7])
     return {
         "titulo": row[0],
         "imagem_url": row[1],
@@ -232,38 +1174,61 @@ def load_one(id_):
         "data": data_fmt,
         "likes": row[8],
         "liked": row[9],
+        "comentarios": row[10] or 0,
+        "link": row[11],
+        "resumo": row[12],
     }
 
 
+@timed("increment_views")
 def increment_views(id_):
     try:
         con = db_connect()
         cur = con.cursor()
-        cur.execute("UPDATE news SET views = views + 1 WHERE id = ?", (id_,))
+        sql = "UPDATE news SET views = views + 1, trend_score = trend_add(trend_score, ?) WHERE id = ?"
+        cur.execute(sql, (trend_term("view"), id_))
+        arquivada = cur.rowcount == 0
         con.commit()
         con.close()
+        if arquivada:
+            update_archived_news(id_, sql, (trend_term("view"), id_))
     except Exception as e:
         print("Erro ao atualizar views:", e)
         log_error("increment_views", e)
 
 
+@timed("toggle_like")
 def toggle_like(id_):
     try:
         con = db_connect()
         cur = con.cursor()
-        cur.execute("SELECT likes, liked FROM news WHERE id = ?", (id_,))
+        cur.execute("SELECT likes, liked, created_at FROM news WHERE id = ?", (id_,))
         row = cur.fetchone()
         if not row:
             con.close()
-            return
-        likes, liked = row
+            caminho = archive_path_for(id_)
+            if not caminho:
+                return
+            con = db_connect(caminho)
+            cur = con.cursor()
+            cur.execute("SELECT likes, liked, created_at FROM news WHERE id = ?", (id_,))
+            row = cur.fetchone()
+            if not row:
+                con.close()
+                return
+        likes, liked, created_at = row
         if liked:
-            likes = max(0, likes - 1)
-            liked = 0
+            # O termo de agora pesa mais que o da curtida original; o piso da
+            # publicação impede que o score caia abaixo dela ou vire NULL.
+            cur.execute(
+                "UPDATE news SET likes=?, liked=0, trend_score=MAX(COALESCE(trend_sub(trend_score, ?), ?), ?) WHERE id=?",
+                (max(0, likes - 1), trend_term("like"), *[trend_term("publicacao", created_at)] * 2, id_),
+            )
         else:
-            likes = likes + 1
-            liked = 1
-        cur.execute("UPDATE news SET likes=?, liked=? WHERE id=?", (likes, liked, id_))
+            cur.execute(
+                "UPDATE news SET likes=?, liked=1, trend_score=trend_add(trend_score, ?) WHERE id=?",
+                (likes + 1, trend_term("like"), id_),
+            )
         con.commit()
         con.close()
     except Exception as e:
@@ -271,6 +1236,7 @@ def toggle_like(id_):
         log_error("toggle_like", e)
 
 
+@timed("load_most_viewed")
 def load_most_viewed(limit=5):
     con = db_connect()
     cur = con.cursor()
@@ -288,367 +1254,2689 @@ def load_most_viewed(limit=5):
     return [{"id": r[0], "titulo": r[1], "views": r[2]} for r in rows]
 
 
-def add_comment(news_id, nome, texto):
-    if not texto.strip():
-        return
-    if not nome.strip():
-        nome = "Anônimo"
+@timed("load_trending")
+def load_trending(limit=5):
     con = db_connect()
     cur = con.cursor()
     cur.execute(
         """
-        INSERT INTO comments (news_id, nome, texto, created_at)
-        VALUES (?, ?, ?, ?)
+        SELECT id, titulo, views, trend_score
+        FROM news
+        WHERE trend_score IS NOT NULL
+        ORDER BY trend_score DESC
+        LIMIT ?
         """,
-        (news_id, nome.strip(), texto.strip(), int(time.time())),
+        (limit,),
     )
-    con.commit()
+    rows = cur.fetchall()
     con.close()
+    agora = time.time()
+    return [
+        {"id": r[0], "titulo": r[1], "views": r[2], "pontos": round(trend_points(r[3], agora), 1)}
+        for r in rows
+    ]
+
+
+def load_sidebar(modo, limit=5):
+    if modo == "em_alta":
+        return load_trending(limit)
+    return load_most_viewed(limit)
+
+
+@timed("add_comment")
+def add_comment(news_id, nome, texto):
+    if not texto.strip():
+        return
+    if not nome.strip():
+        nome = "Anônimo"
+    con = db_connect()
+    try:
+        with con:
+            cur = con.cursor()
+            cur.execute(
+                """
+                INSERT INTO comments (news_id, nome, texto, created_at)
+                VALUES (?, ?, ?, ?)
+                """,
+                (news_id, nome.strip(), texto.strip(), int(time.time())),
+            )
+            sql = """
+                UPDATE news
+                SET comment_count = comment_count + 1,
+                    trend_score = trend_add(trend_score, ?)
+                WHERE id = ?
+            """
+            cur.execute(sql, (trend_term("comentario"), news_id))
+            arquivada = cur.rowcount == 0
+    finally:
+        con.close()
+    if arquivada:
+        update_archived_news(news_id, sql, (trend_term("comentario"), news_id))
+
+
+def update_archived_news(id_, sql, params):
+    caminho = archive_path_for(id_)
+    if not caminho:
+        return
+    con = db_connect(caminho)
+    try:
+        con.execute(sql, params)
+        con.commit()
+    finally:
+        con.close()
+
+
+def parse_comment_cursor(valor):
+    try:
+        ts, id_ = valor.split(".", 1)
+        return int(ts), int(id_)
+    except (AttributeError, ValueError):
+        return None
 
 
-def load_comments(news_id):
+@timed("load_comments")
+def load_comments_page(news_id, limit=COMMENTS_PAGE_SIZE, depois=None):
     con = db_connect()
     cur = con.cursor()
-    cur.execute(
-        """
-        SELECT nome, texto, created_at
-        FROM comments
-        WHERE news_id = ?
-        ORDER BY created_at ASC
-        """,
-        (news_id,),
-    )
+    if depois:
+        cur.execute(
+            """
+            SELECT id, nome, texto, created_at
+            FROM comments
+            WHERE news_id = ? AND (created_at, id) > (?, ?)
+            ORDER BY created_at ASC, id ASC
+            LIMIT ?
+            """,
+            (news_id, depois[0], depois[1], limit + 1),
+        )
+    else:
+        cur.execute(
+            """
+            SELECT id, nome, texto, created_at
+            FROM comments
+            WHERE news_id = ?
+            ORDER BY created_at ASC, id ASC
+            LIMIT ?
+            """,
+            (news_id, limit + 1),
+        )
     rows = cur.fetchall()
     con.close()
-    out = []
-    for r in rows:
-        ts = r[2]
-        data_fmt = time.strftime("%d/%m/%Y %H:%M", time.localtime(ts))
-        out.append({"nome": r[0], "texto": r[1], "data": data_fmt})
-    return out
+    proximo = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        proximo = f"{rows[-1][3]}.{rows[-1][0]}"
+    out = [{"nome": r[1], "texto": r[2], "data": format_ts(r[3])} for r in rows]
+    return out, proximo
 
 
-def search_news(term, limit=200, order="recentes"):
-    term_like = f"%{term}%"
-    con = db_connect()
-    cur = con.cursor()
+def load_comments(news_id, limit=COMMENTS_PAGE_SIZE, depois=None):
+    return load_comments_page(news_id, limit, depois)[0]
+
+
+def parse_search_query(q):
+    filtros = {}
+
+    def guarda(m):
+        filtros[m.group(1).lower()] = m.group(2) if m.group(2) is not None else m.group(3)
+        return " "
+
+    termo = clean_text(SEARCH_FILTER_RE.sub(guarda, q or ""))
+    return termo, filtros
+
+
+def parse_date(valor, fim_do_dia=False):
+    try:
+        ts = int(time.mktime(time.strptime(valor.strip(), "%Y-%m-%d")))
+    except (ValueError, AttributeError):
+        return None
+    return ts + 86399 if fim_do_dia else ts
+
+
+def resolve_facet_value(valor, opcoes):
+    if not valor:
+        return None
+    alvo = valor.strip().casefold()
+    for op in opcoes:
+        if op and op.casefold() == alvo:
+            return op
+    for op in opcoes:
+        if op and op.casefold().startswith(alvo):
+            return op
+    return valor.strip()
+
+
+def search_filters_sql(term, site=None, categoria=None, de=None, ate=None):
+    where = []
+    params = []
+    if term:
+        term_like = f"%{term}%"
+        where.append("(titulo LIKE ? OR resumo LIKE ? OR texto_completo LIKE ?)")
+        params.extend([term_like, term_like, term_like])
+    if site:
+        where.append("site = ?")
+        params.append(site)
+    if categoria:
+        where.append("categoria = ?")
+        params.append(categoria)
+    if de is not None:
+        where.append("created_at >= ?")
+        params.append(de)
+    if ate is not None:
+        where.append("created_at <= ?")
+        params.append(ate)
+    clause = ("WHERE " + " AND ".join(where)) if where else ""
+    return clause, params
+
+
+def highlight_term(text, term):
+    if not term:
+        return html_lib.escape(text or "")
+    try:
+        return re.sub(
+            re.escape(term),
+            lambda m: f"<mark>{m.group(0)}</mark>",
+            text,
+            flags=re.IGNORECASE,
+        )
+    except re.error:
+        return text
+
+
+def iter_search_news(term, limit=200, order="recentes", site=None, categoria=None, de=None, ate=None):
     if order == "mais_lidas":
         order_clause = "ORDER BY views DESC, created_at DESC"
+    elif order == "em_alta":
+        order_clause = "ORDER BY trend_score DESC"
     else:
         order_clause = "ORDER BY created_at DESC, id DESC"
+    where_clause, params = search_filters_sql(term, site, categoria, de, ate)
     query = f"""
-        SELECT id, titulo, imagem_url, resumo, texto_completo, link,
-               autor, site, categoria, views, created_at, likes, liked
+        SELECT {NEWS_COLUMNS}, trend_score
         FROM news
-        WHERE titulo LIKE ? OR resumo LIKE ? OR texto_completo LIKE ?
+        {where_clause}
         {order_clause}
         LIMIT ?
     """
-    cur.execute(query, (term_like, term_like, term_like, limit))
+
+    def row_fn(r):
+        n = news_from_row(r)
+        n["resumo"] = n["resumo"] or ""
+        n["titulo_highlight"] = highlight_term(n["titulo"], term)
+        n["resumo_highlight"] = highlight_term(n["resumo"], term)
+        return n
+
+    if order == "mais_lidas":
+        chave = lambda r: (-(r[9] or 0), -(r[10] or 0))
+    elif order == "em_alta":
+        chave = lambda r: -(r[14] if r[14] is not None else -math.inf)
+    else:
+        return iter_partitioned(
+            query + " OFFSET ?", params, limit, 0, row_fn, "iter_search_news", de, ate,
+            query_count=f"SELECT COUNT(*) FROM news {where_clause}",
+        )
+    return iter_merged(query, params, limit, chave, row_fn, "iter_search_news", de, ate)
+
+
+@timed("search_news")
+def search_news(term, limit=200, order="recentes", site=None, categoria=None, de=None, ate=None):
+    return list(iter_search_news(term, limit, order, site, categoria, de, ate))
+
+
+@timed("search_facets")
+def search_facets(term, site=None, categoria=None, de=None, ate=None):
+    if term:
+        where_clause, params = search_filters_sql(term, de=de, ate=ate)
+        query = f"""
+            SELECT site, categoria, COUNT(*)
+            FROM news
+            {where_clause}
+            GROUP BY site, categoria
+        """
+        rows = list(iter_query(query, params, lambda r: r, "search_facets"))
+        for caminho, _ in archive_months(de, ate):
+            rows.extend(iter_query(query, params, lambda r: r, "search_facets", caminho))
+        return tally_facets(rows, site, categoria)
+    con = db_connect()
+    cur = con.cursor()
+    where = []
+    params = []
+    if de is not None:
+        where.append("dia >= ?")
+        params.append(day_number(de))
+    if ate is not None:
+        where.append("dia <= ?")
+        params.append(day_number(ate))
+    where_clause = ("WHERE " + " AND ".join(where)) if where else ""
+    cur.execute(
+        f"""
+        SELECT site, categoria, SUM(total)
+        FROM news_daily
+        {where_clause}
+        GROUP BY site, categoria
+        """,
+        params,
+    )
     rows = cur.fetchall()
     con.close()
-    out = []
+    return tally_facets(rows, site, categoria)
 
-    for r in rows:
-        ts = r[10] or int(time.time())
-        data_fmt = time.strftime("%d/%m/%Y %H:%M", time.localtime(ts))
-        titulo = r[1]
-        resumo = r[3] or ""
 
-        def highlight(text):
-            try:
-                return re.sub(
-                    re.escape(term),
-                    lambda m: f"<mark>{m.group(0)}</mark>",
-                    text,
-                    flags=re.IGNORECASE,
-                )
-            except re.error:
-                return text
+def tally_facets(rows, site=None, categoria=None):
+    por_site = {}
+    por_categoria = {}
+    total = 0
+    for s_, c_, n in rows:
+        if not n:
+            continue
+        if not categoria or c_ == categoria:
+            por_site[s_] = por_site.get(s_, 0) + n
+        if not site or s_ == site:
+            por_categoria[c_] = por_categoria.get(c_, 0) + n
+        if (not site or s_ == site) and (not categoria or c_ == categoria):
+            total += n
+    return {
+        "site": sorted(((k, v) for k, v in por_site.items() if k), key=lambda kv: (-kv[1], kv[0])),
+        "categoria": sorted(((k, v) for k, v in por_categoria.items() if k), key=lambda kv: (-kv[1], kv[0])),
+        "total": total,
+    }
 
-        out.append(
-            {
-                "id": r[0],
-                "titulo": titulo,
-                "titulo_highlight": highlight(titulo),
-                "imagem_url": r[2],
-                "resumo": resumo,
-                "resumo_highlight": highlight(resumo),
-                "texto_completo": r[4],
-                "link": r[5],
-                "autor": r[6],
-                "site": r[7],
-                "categoria": r[8],
-                "views": r[9],
-                "data": data_fmt,
-                "likes": r[11],
-                "liked": r[12],
-            }
-        )
-    return out
 
+@timed("load_facet_options")
+def load_facet_options():
+    con = db_connect()
+    cur = con.cursor()
+    cur.execute("SELECT DISTINCT site FROM news_daily")
+    sites = [r[0] for r in cur.fetchall() if r[0]]
+    cur.execute("SELECT DISTINCT categoria FROM news_daily")
+    categorias = [r[0] for r in cur.fetchall() if r[0]]
+    con.close()
+    return sites, categorias
 
-def clean_text(t):
-    t = html_lib.unescape(t or "")
-    return re.sub(r"\s+", " ", t).strip()
 
+def artist_key(nome):
+    return re.sub(r"[^a-z0-9]+", "-", fold_text(nome)).strip("-")
 
-def strip_html(text):
-    return clean_text(re.sub(r"<.*?>", " ", text or ""))
 
+def _build_artist_matcher():
+    nomes = {}
+    for nome in ARTISTAS:
+        nomes[re.sub(r"\s+", " ", fold_text(nome))] = nome
+    alternativas = sorted(nomes, key=len, reverse=True)
+    padrao = "|".join(re.escape(p).replace(r"\ ", r"\s+") for p in alternativas)
+    return re.compile(rf"(?<![\w])({padrao})(?![\w])"), nomes
 
-def fetch_html(url):
-    try:
-        r = requests.get(url, timeout=15, headers=UA_HEADER)
-        r.raise_for_status()
-        return html.fromstring(r.content)
-    except Exception as e:
-        print("Erro em fetch_html:", e)
-        log_error("fetch_html", e)
-        raise
 
+ARTIST_RE, ARTIST_NAMES = _build_artist_matcher()
 
-def extract_article_generic(url, default_author, site_label):
-    try:
-        tree = fetch_html(url)
-        paras = tree.xpath(
-            "//article//p | //div[contains(@class,'content') or contains(@class,'texto') or contains(@class,'body') or contains(@id,'content')]//p"
+
+def extract_artists(*textos):
+    encontrados = {}
+    for texto in textos:
+        if not texto:
+            continue
+        curados = []
+        for m in ARTIST_RE.finditer(fold_text(texto)):
+            nome = ARTIST_NAMES[re.sub(r"\s+", " ", m.group(1))]
+            chave = artist_key(nome)
+            atual = encontrados.get(chave)
+            encontrados[chave] = (nome, 1, (atual[2] if atual else 0) + 1)
+            curados.append(m.span(1))
+        for m in CAPS_NGRAM_RE.finditer(texto):
+            ini, fim = m.span(1)
+            if any(ini < c_fim and c_ini < fim for c_ini, c_fim in curados):
+                continue
+            palavras = m.group(1).strip(" .-&").split()
+            while palavras and fold_text(palavras[0]) in CAPS_STOP:
+                palavras.pop(0)
+            if len(palavras) < 2 or fold_text(palavras[-1]) in CAPS_STOP:
+                continue
+            nome = " ".join(palavras)
+            chave = artist_key(nome)
+            atual = encontrados.get(chave)
+            if atual:
+                encontrados[chave] = (atual[0], atual[1], atual[2] + 1)
+            else:
+                encontrados[chave] = (nome, 0, 1)
+    return encontrados
+
+
+def _unindex_artists(cur, news_ids):
+    marcadores = ",".join("?" * len(news_ids))
+    cur.execute(
+        f"""
+        SELECT artist_id, SUM(mencoes), COUNT(*)
+        FROM artist_news WHERE news_id IN ({marcadores})
+        GROUP BY artist_id
+        """,
+        news_ids,
+    )
+    for artist_id, mencoes, noticias in cur.fetchall():
+        cur.execute(
+            "UPDATE artists SET mencoes = mencoes - ?, noticias = noticias - ? WHERE id = ?",
+            (mencoes, noticias, artist_id),
         )
-        textos = []
-        for p in paras:
-            txt = clean_text(p.text_content())
-            if len(txt) > 40:
-                textos.append(txt)
-        texto = "\n\n".join(textos) if textos else ""
-        autor = default_author
-        meta_autor = tree.xpath("//meta[@name='author']/@content")
-        if meta_autor:
-            autor = clean_text(meta_autor[0])
-        if not autor:
-            autor = default_author
-        img = None
-        og_img = tree.xpath("//meta[@property='og:image']/@content")
-        if og_img:
-            img = og_img[0]
-        if not img:
-            img_tags = tree.xpath("//article//img/@src | //img[@class='featured']/@src")
-            if img_tags:
-                img = img_tags[0]
-        return texto, autor, img
-    except Exception as e:
-        log_error(f"extract_article_generic_{site_label}", e)
-        return "", default_author, None
+    cur.execute(f"DELETE FROM artist_news WHERE news_id IN ({marcadores})", news_ids)
 
 
-def extract_full_article_g1(url):
+def index_artists(news_ids):
+    news_ids = list(news_ids)
+    if not news_ids:
+        return 0
+    con = db_connect()
+    total = 0
     try:
-        tree = fetch_html(url)
-        paras = tree.xpath(
-            "//div[contains(@class,'mc-article-body')]//p | //article//p"
-        )
-        textos = []
-        for p in paras:
-            txt = clean_text(p.text_content())
-            if len(txt) > 40:
-                textos.append(txt)
-        texto = "\n\n".join(textos)
-        autor = None
-        meta_autor = tree.xpath("//meta[@name='author']/@content")
-        if meta_autor:
-            autor = clean_text(meta_autor[0])
-        if not autor:
-            autor_span = tree.xpath(
-                "//span[contains(@class,'content-publication-data__from')]/text()"
-            )
-            if autor_span:
-                autor = clean_text(" ".join(autor_span))
-        if not autor:
-            autor = "Redação G1"
-        img = None
-        og_img = tree.xpath("//meta[@property='og:image']/@content")
-        if og_img:
-            img = og_img[0]
-        if not img:
-            img_tags = tree.xpath("//article//img/@src")
-            if img_tags:
-                img = img_tags[0]
-        return texto, autor, img
-    except Exception as e:
-        print("G1 erro ao extrair artigo:", e)
-        log_error("extract_full_article_g1", e)
-        return "", "Redação G1", None
+        for ini in range(0, len(news_ids), 500):
+            lote = news_ids[ini : ini + 500]
+            rows = con.execute(
+                f"SELECT id, titulo, resumo, texto_completo FROM news WHERE id IN ({','.join('?' * len(lote))})",
+                lote,
+            ).fetchall()
+            with con:
+                cur = con.cursor()
+                _unindex_artists(cur, lote)
+                for id_, titulo, resumo, texto in rows:
+                    for chave, (nome, curado, mencoes) in extract_artists(titulo, resumo, texto).items():
+                        cur.execute(
+                            """
+                            INSERT INTO artists (nome, chave, curado, mencoes, noticias)
+                            VALUES (?, ?, ?, ?, 1)
+                            ON CONFLICT (chave) DO UPDATE SET
+                                mencoes = mencoes + excluded.mencoes,
+                                noticias = noticias + 1,
+                                curado = MAX(curado, excluded.curado),
+                                nome = CASE WHEN excluded.curado > curado THEN excluded.nome ELSE nome END
+                            """,
+                            (nome, chave, curado, mencoes),
+                        )
+                        cur.execute("SELECT id FROM artists WHERE chave = ?", (chave,))
+                        cur.execute(
+                            "INSERT INTO artist_news (artist_id, news_id, mencoes) VALUES (?, ?, ?)",
+                            (cur.fetchone()[0], id_, mencoes),
+                        )
+                        total += 1
+    finally:
+        con.close()
+    return total
+
+
+def rebuild_artist_index(batch_size=2000):
+    inicio = time.perf_counter()
+    con = db_connect()
+    with con:
+        con.execute("DELETE FROM artist_news")
+        con.execute("UPDATE artists SET mencoes = 0, noticias = 0")
+    ultimo = 0
+    vistos = 0
+    while True:
+        ids = [r[0] for r in con.execute("SELECT id FROM news WHERE id > ? ORDER BY id LIMIT ?", (ultimo, batch_size))]
+        if not ids:
+            break
+        index_artists(ids)
+        ultimo = ids[-1]
+        vistos += len(ids)
+    with con:
+        con.execute("DELETE FROM artists WHERE noticias <= 0 AND curado = 0")
+    con.close()
+    log_event("rebuild_artist_index", noticias=vistos, ms=round((time.perf_counter() - inicio) * 1000))
+    return vistos
+
+
+@timed("load_artist")
+def load_artist(nome):
+    con = db_connect()
+    cur = con.cursor()
+    cur.execute(
+        "SELECT id, nome, chave, mencoes, noticias FROM artists WHERE chave = ?",
+        (artist_key(nome),),
+    )
+    row = cur.fetchone()
+    con.close()
+    if not row:
+        return None
+    return {"id": row[0], "nome": row[1], "chave": row[2], "mencoes": row[3], "noticias": row[4]}
+
+
+def iter_artist_news(artist_id, limit=ARTIST_PAGE_LIMIT):
+    cols = ", ".join(f"n.{c.strip()}" for c in NEWS_COLUMNS.split(","))
+    return iter_query(
+        f"""
+        SELECT {cols}
+        FROM artist_news an
+        JOIN news n ON n.id = an.news_id
+        WHERE an.artist_id = ?
+        ORDER BY an.news_id DESC
+        LIMIT ?
+        """,
+        (artist_id, limit),
+        nome="iter_artist_news",
+    )
+
+
+@timed("load_news_artists")
+def load_news_artists(news_id):
+    con = db_connect()
+    cur = con.cursor()
+    cur.execute(
+        """
+        SELECT a.nome, a.chave
+        FROM artist_news an
+        JOIN artists a ON a.id = an.artist_id
+        WHERE an.news_id = ? AND (a.curado = 1 OR a.noticias >= ?)
+        ORDER BY an.mencoes DESC, a.mencoes DESC
+        LIMIT 10
+        """,
+        (news_id, ARTIST_MIN_NEWS),
+    )
+    rows = cur.fetchall()
+    con.close()
+    return [{"nome": r[0], "chave": r[1]} for r in rows]
+
+
+_suggest_lock = threading.Lock()
+_suggest_model = None
+_suggest_building = None
+
+
+def news_popularity(views, likes, comentarios):
+    return 1.0 + math.log1p((views or 0) + 3 * (likes or 0) + 2 * (comentarios or 0))
+
+
+def _suggest_add(model, chave, texto, tipo, peso, url):
+    entrada = model["entradas"].get(chave)
+    if entrada is None:
+        entrada = model["entradas"][chave] = {"texto": texto, "tipo": tipo, "peso": 0.0, "url": url, "formas": Counter()}
+        if model["construindo"]:
+            model["chaves"].append(chave)
+        else:
+            bisect.insort(model["chaves"], chave)
+    entrada["peso"] += peso
+    if tipo == "termo":
+        entrada["formas"][texto] += 1
+        entrada["texto"] = entrada["formas"].most_common(1)[0][0]
+    return chave
+
+
+def _suggest_top(model, prefixo, chaves_tocadas):
+    topo = model["topo"].get(prefixo, [])
+    entradas = model["entradas"]
+    candidatos = set(topo) | {c for c in chaves_tocadas if c.startswith(prefixo)}
+    model["topo"][prefixo] = heapq.nlargest(SUGGEST_K, candidatos, key=lambda c: entradas[c]["peso"])
+
+
+def _suggest_index_rows(model, rows):
+    tocadas = set()
+    for id_, titulo, views, likes, comentarios in rows:
+        peso = news_popularity(views, likes, comentarios)
+        vistos = set()
+        for palavra in WORD_RE.findall(titulo or ""):
+            chave = fold_text(palavra)
+            if len(chave) < 3 or chave in STOPWORDS or chave.isdigit() or chave in vistos:
+                continue
+            vistos.add(chave)
+            tocadas.add(_suggest_add(model, chave, palavra.lower(), "termo", peso, None))
+    return tocadas
+
+
+def _suggest_index_artists(model, con, artist_ids=None):
+    filtro = ""
+    params = []
+    if artist_ids is not None:
+        if not artist_ids:
+            return set()
+        filtro = f"AND a.id IN ({','.join('?' * len(artist_ids))})"
+        params = list(artist_ids)
+    rows = con.execute(
+        f"""
+        SELECT a.nome, a.chave, SUM(1 + ln(1 + COALESCE(n.views, 0) + 3 * COALESCE(n.likes, 0)
+                                          + 2 * COALESCE(n.comment_count, 0)))
+        FROM artists a
+        JOIN artist_news an ON an.artist_id = a.id
+        JOIN news n ON n.id = an.news_id
+        WHERE (a.curado = 1 OR a.noticias >= ?) {filtro}
+        GROUP BY a.id
+        """,
+        [ARTIST_MIN_NEWS] + params,
+    ).fetchall()
+    tocadas = set()
+    for nome, chave_artista, peso in rows:
+        dobrado = re.sub(r"\s+", " ", fold_text(nome)).strip()
+        palavras = dobrado.split(" ")
+        url = f"/artista/{chave_artista}"
+        for i in range(len(palavras)):
+            chave = "\0".join([" ".join(palavras[i:]), chave_artista])
+            entrada = model["entradas"].get(chave)
+            novo_peso = (peso or 0) * SUGGEST_ARTIST_BOOST
+            if entrada is not None:
+                entrada["peso"] = 0.0
+            tocadas.add(_suggest_add(model, chave, nome, "artista", novo_peso, url))
+    return tocadas
+
+
+def _suggest_refresh_prefixes(model, tocadas):
+    prefixos = {c[:n] for c in tocadas for n in range(1, SUGGEST_PRECOMPUTE_LEN + 1) if len(c) >= n}
+    for prefixo in prefixos:
+        _suggest_top(model, prefixo, [c for c in tocadas if c.startswith(prefixo)])
+
+
+def build_suggest_index():
+    global _suggest_model
+    inicio = time.perf_counter()
+    model = {
+        "chaves": [], "entradas": {}, "topo": {}, "ultimo_id": 0, "construindo": True, "verificado": time.monotonic()
+    }
+    con = db_connect()
+    try:
+        con.create_function("ln", 1, math.log, deterministic=True)
+        rows = con.execute("SELECT id, titulo, views, likes, comment_count FROM news").fetchall()
+        _suggest_index_rows(model, rows)
+        _suggest_index_artists(model, con)
+        model["ultimo_id"] = max((r[0] for r in rows), default=0)
+    finally:
+        con.close()
+    model["chaves"].sort()
+    model["construindo"] = False
+    for prefixo_len in range(1, SUGGEST_PRECOMPUTE_LEN + 1):
+        grupos = {}
+        for chave in model["chaves"]:
+            if len(chave) >= prefixo_len:
+                grupos.setdefault(chave[:prefixo_len], []).append(chave)
+        for prefixo, chaves in grupos.items():
+            model["topo"][prefixo] = heapq.nlargest(
+                SUGGEST_K, chaves, key=lambda c: model["entradas"][c]["peso"]
+            )
+    with _suggest_lock:
+        _suggest_model = model
+    log_event(
+        "build_suggest_index",
+        chaves=len(model["chaves"]),
+        prefixos=len(model["topo"]),
+        ms=round((time.perf_counter() - inicio) * 1000),
+    )
+    return model
+
+
+def update_suggest_index(novos_ids):
+    with _suggest_lock:
+        model = _suggest_model
+        if model is None or not novos_ids:
+            return
+        con = db_connect()
+        try:
+            con.create_function("ln", 1, math.log, deterministic=True)
+            ids = sorted(i for i in novos_ids if i > model["ultimo_id"])
+            tocadas = set()
+            for ini in range(0, len(ids), 500):
+                lote = ids[ini : ini + 500]
+                marcas = ",".join("?" * len(lote))
+                rows = con.execute(
+                    f"SELECT id, titulo, views, likes, comment_count FROM news WHERE id IN ({marcas})", lote
+                ).fetchall()
+                tocadas |= _suggest_index_rows(model, rows)
+                artistas = [
+                    r[0] for r in con.execute(
+                        f"SELECT DISTINCT artist_id FROM artist_news WHERE news_id IN ({marcas})", lote
+                    )
+                ]
+                tocadas |= _suggest_index_artists(model, con, artistas)
+            if ids:
+                model["ultimo_id"] = ids[-1]
+        finally:
+            con.close()
+        _suggest_refresh_prefixes(model, tocadas)
+
+
+def current_suggest_model():
+    """Índice de sugestões pronto: constrói uma vez só e acompanha o MAX(id) do banco."""
+    global _suggest_building
+    with _suggest_lock:
+        model = _suggest_model
+        futuro = _suggest_building
+        dono = model is None and futuro is None
+        if dono:
+            futuro = _suggest_building = Future()
+    if model is None:
+        if not dono:
+            return futuro.result()
+        try:
+            model = build_suggest_index()
+        except Exception as e:
+            futuro.set_exception(e)
+            raise
+        finally:
+            with _suggest_lock:
+                _suggest_building = None
+        futuro.set_result(model)
+        return model
+    agora = time.monotonic()
+    with _suggest_lock:
+        if agora - model["verificado"] < SUGGEST_REFRESH:
+            return model
+        model["verificado"] = agora
+    atual = max_news_id()
+    if atual > model["ultimo_id"]:
+        update_suggest_index(range(model["ultimo_id"] + 1, atual + 1))
+    return model
+
+
+def suggest(q, k=SUGGEST_K):
+    model = current_suggest_model()
+    prefixo = re.sub(r"\s+", " ", fold_text(q)).strip()
+    if not prefixo:
+        return []
+    entradas = model["entradas"]
+    if len(prefixo) <= SUGGEST_PRECOMPUTE_LEN and prefixo in model["topo"]:
+        chaves = model["topo"][prefixo]
+    else:
+        chaves_ord = model["chaves"]
+        i = bisect.bisect_left(chaves_ord, prefixo)
+        candidatos = []
+        while i < len(chaves_ord) and chaves_ord[i].startswith(prefixo):
+            candidatos.append(chaves_ord[i])
+            i += 1
+        chaves = heapq.nlargest(k, candidatos, key=lambda c: entradas[c]["peso"])
+    resultado = []
+    vistos = set()
+    for chave in chaves:
+        e = entradas[chave]
+        if e["tipo"] == "termo" and e["peso"] < SUGGEST_MIN_WEIGHT and len(prefixo) < 3:
+            continue
+        if e["texto"] in vistos:
+            continue
+        vistos.add(e["texto"])
+        resultado.append(
+            {
+                "texto": e["texto"],
+                "tipo": e["tipo"],
+                "url": e["url"] or "/buscar?" + urlencode({"q": e["texto"]}),
+            }
+        )
+        if len(resultado) >= k:
+            break
+    if len(resultado) < k and " " in prefixo:
+        inicio_q, ultimo = prefixo.rsplit(" ", 1)
+        for s in suggest(ultimo, k):
+            if s["tipo"] == "termo":
+                texto = f"{q.strip().rsplit(' ', 1)[0]} {s['texto']}"
+                if texto not in vistos:
+                    vistos.add(texto)
+                    resultado.append({"texto": texto, "tipo": "termo", "url": "/buscar?" + urlencode({"q": texto})})
+            if len(resultado) >= k:
+                break
+    return resultado
+
+
+@timed("load_related")
+def load_related(news_id):
+    con = db_connect()
+    cur = con.cursor()
+    cur.execute(
+        """
+        SELECT n.id, n.titulo, n.imagem_url, n.site, r.score
+        FROM news_related r
+        JOIN news n ON n.id = r.related_id
+        WHERE r.news_id = ?
+        ORDER BY r.posicao
+        """,
+        (news_id,),
+    )
+    rows = cur.fetchall()
+    con.close()
+    return [{"id": r[0], "titulo": r[1], "imagem_url": r[2], "site": r[3], "score": r[4]} for r in rows]
+
+
+_related_lock = threading.Lock()
+# Serializa quem altera o modelo (build, load, update): as threads de coleta,
+# o trabalhador local e a carga inicial chegam aqui ao mesmo tempo.
+_related_update_lock = threading.RLock()
+_related_model = None
+
+
+def tokenize(texto):
+    return [t for t in TOKEN_RE.findall(fold_text(texto)) if t not in STOPWORDS]
+
+
+def related_document(titulo, resumo, texto):
+    return f"{titulo} {titulo} {resumo or ''} {(texto or '')[:RELATED_TEXT_CHARS]}"
+
+
+def iter_related_documents(con, ids=None):
+    query = "SELECT id, titulo, resumo, substr(texto_completo, 1, ?) FROM news"
+    params = [RELATED_TEXT_CHARS]
+    if ids is not None:
+        query += f" WHERE id IN ({','.join('?' * len(ids))})"
+        params.extend(ids)
+    for r in con.execute(query + " ORDER BY id", params):
+        yield r[0], related_document(r[1], r[2], r[3])
+
+
+def count_matrix(docs, vocab, crescer):
+    indptr = array.array("q", [0])
+    indices = array.array("i")
+    data = array.array("f")
+    for doc in docs:
+        for termo, qtd in Counter(tokenize(doc)).items():
+            j = vocab.get(termo)
+            if j is None:
+                if not crescer:
+                    continue
+                j = vocab[termo] = len(vocab)
+            indices.append(j)
+            data.append(qtd)
+        indptr.append(len(indices))
+    return sparse.csr_matrix(
+        (np.frombuffer(data, dtype=np.float32), np.frombuffer(indices, dtype=np.int32), np.frombuffer(indptr, dtype=np.int64)),
+        shape=(len(indptr) - 1, len(vocab)),
+    )
+
+
+def keep_top_terms(X, t):
+    indptr = [0]
+    indices = []
+    data = []
+    for i in range(X.shape[0]):
+        ini, fim = X.indptr[i], X.indptr[i + 1]
+        cols = X.indices[ini:fim]
+        vals = X.data[ini:fim]
+        if len(vals) > t:
+            sel = np.argpartition(-vals, t)[:t]
+            cols = cols[sel]
+            vals = vals[sel]
+        indices.append(cols)
+        data.append(vals)
+        indptr.append(indptr[-1] + len(vals))
+    if not indices:
+        return X
+    return sparse.csr_matrix(
+        (np.concatenate(data), np.concatenate(indices), np.array(indptr, dtype=np.int64)),
+        shape=X.shape,
+    )
+
+
+def tfidf_normalize(contagens, idf):
+    X = contagens.astype(np.float32)
+    X.data = 1.0 + np.log(X.data)
+    X = sparse.csr_matrix(X.multiply(idf.reshape(1, -1)), dtype=np.float32)
+    X = keep_top_terms(X, RELATED_TERMS_PER_DOC)
+    normas = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+    normas[normas == 0] = 1.0
+    return sparse.csr_matrix(sparse.diags(1.0 / normas).dot(X), dtype=np.float32)
+
+
+def top_k_rows(S, linhas_globais, k):
+    n = S.shape[0]
+    top_idx = np.full((n, k), -1, dtype=np.int32)
+    top_score = np.zeros((n, k), dtype=np.float32)
+    for i in range(n):
+        ini, fim = S.indptr[i], S.indptr[i + 1]
+        cols = S.indices[ini:fim]
+        vals = S.data[ini:fim]
+        mask = (cols != linhas_globais[i]) & (vals >= RELATED_MIN_SCORE)
+        cols = cols[mask]
+        vals = vals[mask]
+        if not len(vals):
+            continue
+        if len(vals) > k:
+            sel = np.argpartition(-vals, k)[:k]
+            cols = cols[sel]
+            vals = vals[sel]
+        ordem = np.argsort(-vals)
+        top_idx[i, : len(ordem)] = cols[ordem]
+        top_score[i, : len(ordem)] = vals[ordem]
+    return top_idx, top_score
+
+
+def write_related(con, model, linhas):
+    ids = model["ids"]
+    rows = []
+    for r in linhas:
+        for pos in range(model["top_idx"].shape[1]):
+            j = model["top_idx"][r, pos]
+            if j < 0:
+                break
+            rows.append((ids[r], pos, ids[j], float(model["top_score"][r, pos])))
+    with con:
+        con.executemany("DELETE FROM news_related WHERE news_id = ?", [(ids[r],) for r in linhas])
+        con.executemany(
+            "INSERT INTO news_related (news_id, posicao, related_id, score) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+
+
+def related_model_path(sufixo):
+    return f"{DB_PATH}.related{sufixo}"
+
+
+def related_model_marks(con, ids):
+    """Links da primeira e da última notícia do modelo, para reconhecer um banco recriado."""
+    if not ids:
+        return []
+    return [
+        (con.execute("SELECT link FROM news WHERE id = ?", (id_,)).fetchone() or [None])[0]
+        for id_ in (min(ids), max(ids))
+    ]
+
+
+def save_related_model(model):
+    """Grava o modelo TF-IDF ao lado do banco: matriz em .npz, vocabulário e ids em JSON.
+
+    Cada gravação usa arquivos novos e só troca o JSON no fim, então um leitor
+    nunca mistura a matriz de uma geração com o vocabulário de outra.
+    """
+    inicio = time.perf_counter()
+    gera = f"{os.getpid()}-{time.time_ns()}"
+    try:
+        anterior = None
+        try:
+            with open(related_model_path(".json"), encoding="utf-8") as f:
+                anterior = json.load(f).get("gera")
+        except (OSError, ValueError):
+            pass
+        sparse.save_npz(related_model_path(f".{gera}.npz"), model["X"], compressed=False)
+        np.savez(
+            related_model_path(f".{gera}.top.npz"),
+            idf=model["idf"], top_idx=model["top_idx"], top_score=model["top_score"],
+        )
+        con = db_connect()
+        try:
+            marcas = related_model_marks(con, model["ids"])
+        finally:
+            con.close()
+        tmp = related_model_path(f".{gera}.json")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"gera": gera, "ids": model["ids"], "vocab": model["vocab"], "base": model["base"],
+                       "marcas": marcas}, f)
+        os.replace(tmp, related_model_path(".json"))
+    except OSError as e:
+        log_error("save_related_model", e)
+        return
+    model["salvo"] = time.monotonic()
+    if anterior and anterior != gera:
+        for sufixo in (".npz", ".top.npz"):
+            try:
+                os.remove(related_model_path(f".{anterior}{sufixo}"))
+            except OSError:
+                pass
+    log_event("save_related_model", noticias=len(model["ids"]), ms=round((time.perf_counter() - inicio) * 1000))
+
+
+def load_related_model():
+    """Carrega o modelo gravado e indexa só as notícias que chegaram depois dele."""
+    global _related_model
+    if np is None:
+        return None
+    inicio = time.perf_counter()
+    with _related_update_lock:
+        with _related_lock:
+            if _related_model is not None:
+                return _related_model
+        try:
+            with open(related_model_path(".json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            X = sparse.load_npz(related_model_path(f".{meta['gera']}.npz")).tocsr()
+            with np.load(related_model_path(f".{meta['gera']}.top.npz")) as top:
+                idf, top_idx, top_score = top["idf"], top["top_idx"], top["top_score"]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            log_error("load_related_model", e)
+            return None
+        ids = meta["ids"]
+        con = db_connect()
+        try:
+            ultimo = max(ids, default=0)
+            total = con.execute("SELECT COUNT(*) FROM news WHERE id <= ?", (ultimo,)).fetchone()[0]
+            marcas = related_model_marks(con, ids)
+            novos = [r[0] for r in con.execute("SELECT id FROM news WHERE id > ? ORDER BY id", (ultimo,))]
+        finally:
+            con.close()
+        if X.shape[0] != len(ids) or total != len(ids) or marcas != meta["marcas"]:
+            log_event("load_related_model", nivel="aviso", erro="modelo não corresponde ao banco")
+            return None
+        model = {"ids": ids, "pos": {id_: i for i, id_ in enumerate(ids)}, "vocab": meta["vocab"], "idf": idf,
+                 "X": X, "top_idx": top_idx, "top_score": top_score, "base": meta["base"], "salvo": time.monotonic()}
+        with _related_lock:
+            _related_model = model
+        log_event("load_related_model", noticias=len(ids), novas=len(novos), ms=round((time.perf_counter() - inicio) * 1000))
+        if novos:
+            update_related_index(novos)
+        return model
+
+
+def build_related_index(k=RELATED_K):
+    global _related_model
+    if np is None:
+        log_event("build_related_index", nivel="aviso", erro="numpy/scipy não instalados")
+        return None
+    inicio = time.perf_counter()
+    with _related_update_lock:
+        con = db_connect()
+        try:
+            ids = []
+
+            def documentos():
+                for id_, doc in iter_related_documents(con):
+                    ids.append(id_)
+                    yield doc
+
+            vocab = {}
+            contagens = count_matrix(documentos(), vocab, crescer=True)
+            n = len(ids)
+            df = np.bincount(contagens.indices, minlength=len(vocab))
+            manter = (df >= 2) & (df <= max(2, RELATED_MAX_DF * n))
+            novo_indice = np.cumsum(manter) - 1
+            vocab = {t: int(novo_indice[j]) for t, j in vocab.items() if manter[j]}
+            contagens = contagens[:, np.flatnonzero(manter)]
+            idf = (np.log((1.0 + n) / (1.0 + df[manter])) + 1.0).astype(np.float32)
+            X = tfidf_normalize(contagens, idf)
+            del contagens
+            top_idx = np.full((n, k), -1, dtype=np.int32)
+            top_score = np.zeros((n, k), dtype=np.float32)
+            XT = X.T.tocsr()
+            for ini in range(0, n, RELATED_CHUNK_ROWS):
+                fim = min(n, ini + RELATED_CHUNK_ROWS)
+                S = X[ini:fim].dot(XT).tocsr()
+                top_idx[ini:fim], top_score[ini:fim] = top_k_rows(S, np.arange(ini, fim), k)
+            model = {"ids": ids, "pos": {id_: i for i, id_ in enumerate(ids)}, "vocab": vocab, "idf": idf,
+                     "X": X, "top_idx": top_idx, "top_score": top_score, "base": n}
+            with con:
+                con.execute("DELETE FROM news_related")
+            write_related(con, model, range(n))
+        finally:
+            con.close()
+        with _related_lock:
+            _related_model = model
+        log_event("build_related_index", noticias=n, termos=len(vocab), ms=round((time.perf_counter() - inicio) * 1000))
+        save_related_model(model)
+        return model
+
+
+def update_related_index(novos_ids, k=RELATED_K):
+    if np is None or not novos_ids:
+        return
+    with _related_update_lock:
+        with _related_lock:
+            model = _related_model
+        if model is None:
+            load_related_model()
+            with _related_lock:
+                model = _related_model
+        if model is None or len(model["ids"]) + len(novos_ids) > model["base"] * (1 + RELATED_REBUILD_RATIO):
+            build_related_index(k)
+            return
+        inicio = time.perf_counter()
+        con = db_connect()
+        try:
+            novos = [(id_, doc) for id_, doc in iter_related_documents(con, list(novos_ids)) if id_ not in model["pos"]]
+            if not novos:
+                return
+            Xn = tfidf_normalize(count_matrix([d for _, d in novos], model["vocab"], crescer=False), model["idf"])
+            n_antigo = len(model["ids"])
+            X = sparse.vstack([model["X"], Xn], format="csr")
+            for id_, _ in novos:
+                model["pos"][id_] = len(model["ids"])
+                model["ids"].append(id_)
+            S = Xn.dot(X.T.tocsr()).tocsr()
+            linhas_novas = np.arange(n_antigo, n_antigo + len(novos))
+            idx_n, score_n = top_k_rows(S, linhas_novas, k)
+            model["top_idx"] = np.vstack([model["top_idx"], idx_n])
+            model["top_score"] = np.vstack([model["top_score"], score_n])
+            model["X"] = X
+            alterados = set(linhas_novas.tolist())
+            C = S[:, :n_antigo].tocoo()
+            minimos = model["top_score"][:, -1]
+            for i, j, v in zip(C.row, C.col, C.data):
+                if v < RELATED_MIN_SCORE or v <= minimos[j]:
+                    continue
+                linha_idx = model["top_idx"][j]
+                linha_score = model["top_score"][j]
+                pos = int(np.searchsorted(-linha_score, -v))
+                linha_idx[pos + 1 :] = linha_idx[pos:-1].copy()
+                linha_score[pos + 1 :] = linha_score[pos:-1].copy()
+                linha_idx[pos] = n_antigo + i
+                linha_score[pos] = v
+                alterados.add(int(j))
+            write_related(con, model, sorted(alterados))
+        finally:
+            con.close()
+        log_event(
+            "update_related_index",
+            novas=len(novos),
+            alteradas=len(alterados),
+            ms=round((time.perf_counter() - inicio) * 1000),
+        )
+        if time.monotonic() - model.get("salvo", 0) >= RELATED_SAVE_EVERY:
+            save_related_model(model)
+
+
+def clean_text(t):
+    t = html_lib.unescape(t or "")
+    return re.sub(r"\s+", " ", t).strip()
+
+
+def strip_html(text):
+    return clean_text(re.sub(r"<.*?>", " ", text or ""))
+
+
+_http_local = threading.local()
+_hosts_lock = threading.Lock()
+_hosts = {}
+_robots = {}
+_crawl_report_lock = threading.Lock()
+_crawl_report = {}
+
+
+def http_session():
+    sessao = getattr(_http_local, "sessao", None)
+    if sessao is None:
+        sessao = _http_local.sessao = requests.Session()
+        sessao.headers.update(UA_HEADER)
+    return sessao
+
+
+def host_of(url):
+    return (urlparse(url).hostname or "").lower()
+
+
+def canonical_url(url, base=None):
+    if not url:
+        return url
+    url = url.strip()
+    if base:
+        url = urljoin(base, url)
+    partes = urlsplit(url)
+    esquema = partes.scheme.lower()
+    if esquema not in ("http", "https"):
+        return url
+    host = (partes.hostname or "").lower()
+    if host.startswith("amp."):
+        host = host[4:]
+    if host.startswith("www.") and host[4:] in SITE_HOSTS:
+        host = host[4:]
+    if host in SITE_HOSTS:
+        esquema = "https"
+    try:
+        porta = partes.port
+    except ValueError:
+        porta = None
+    netloc = host if porta in (None, 80, 443) else f"{host}:{porta}"
+    caminho = re.sub(r"/{2,}", "/", partes.path) or "/"
+    if host in SITE_HOSTS:
+        # Convenções das fontes: AMP do G1 em /google/amp/, do WordPress em .../amp/;
+        # artigos .ghtml sem barra final, permalinks do WordPress com.
+        if caminho.startswith("/google/amp/"):
+            caminho = caminho[len("/google/amp"):]
+        caminho = re.sub(r"/amp/?$", "/", caminho)
+        ultimo = caminho.rstrip("/").rsplit("/", 1)[-1]
+        if caminho != "/":
+            caminho = caminho.rstrip("/") if "." in ultimo else caminho.rstrip("/") + "/"
+    query = sorted(
+        (k, v)
+        for k, v in parse_qsl(partes.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PREFIXES)
+    )
+    return urlunsplit((esquema, netloc, caminho, urlencode(query), ""))
+
+
+def page_canonical(tree, url):
+    hrefs = tree.xpath("//link[@rel='canonical']/@href")
+    if not hrefs or not hrefs[0].strip():
+        return None
+    canonico = canonical_url(hrefs[0], base=url)
+    if host_of(canonico) != host_of(canonical_url(url)):
+        return None
+    return canonico
+
+
+def record_throttle(host, evento, segundos=0.0):
+    inc("inmusic_crawler_throttle_total", host=host, evento=evento)
+    with _crawl_report_lock:
+        item = _crawl_report.setdefault(host, {})
+        qtd, total = item.get(evento, (0, 0.0))
+        item[evento] = (qtd + 1, total + segundos)
+
+
+def reset_crawl_report():
+    with _crawl_report_lock:
+        _crawl_report.clear()
+
+
+def crawl_report():
+    with _crawl_report_lock:
+        return {
+            host: {ev: {"eventos": qtd, "segundos": round(seg, 2)} for ev, (qtd, seg) in eventos.items()}
+            for host, eventos in _crawl_report.items()
+        }
+
+
+def host_state(host):
+    with _hosts_lock:
+        estado = _hosts.get(host)
+        if estado is None:
+            taxa, burst = HOST_RATES.get(host, HOST_RATE_DEFAULT)
+            estado = _hosts[host] = {
+                "taxa": taxa,
+                "burst": burst,
+                "tokens": float(burst),
+                "atualizado": time.monotonic(),
+                "bloqueado_ate": 0.0,
+                "lock": threading.Lock(),
+            }
+        return estado
+
+
+def host_acquire(host):
+    estado = host_state(host)
+    esperou = 0.0
+    while True:
+        with estado["lock"]:
+            agora = time.monotonic()
+            estado["tokens"] = min(
+                estado["burst"], estado["tokens"] + (agora - estado["atualizado"]) * estado["taxa"]
+            )
+            estado["atualizado"] = agora
+            if estado["bloqueado_ate"] > agora:
+                espera = estado["bloqueado_ate"] - agora
+            elif estado["tokens"] >= 1.0:
+                estado["tokens"] -= 1.0
+                break
+            else:
+                espera = (1.0 - estado["tokens"]) / estado["taxa"]
+        time.sleep(espera)
+        esperou += espera
+    if esperou:
+        record_throttle(host, "espera", esperou)
+    return esperou
+
+
+def host_try_acquire(host):
+    """Como host_acquire, mas sem esperar: False se o host está sem fichas ou bloqueado."""
+    estado = host_state(host)
+    with estado["lock"]:
+        agora = time.monotonic()
+        estado["tokens"] = min(estado["burst"], estado["tokens"] + (agora - estado["atualizado"]) * estado["taxa"])
+        estado["atualizado"] = agora
+        if estado["bloqueado_ate"] > agora or estado["tokens"] < 1.0:
+            return False
+        estado["tokens"] -= 1.0
+        return True
+
+
+def host_block(host, segundos):
+    estado = host_state(host)
+    with estado["lock"]:
+        estado["bloqueado_ate"] = max(estado["bloqueado_ate"], time.monotonic() + segundos)
+        estado["tokens"] = 0.0
+
+
+def parse_retry_after(valor):
+    if not valor:
+        return None
+    valor = valor.strip()
+    if valor.isdigit():
+        return min(int(valor), RETRY_AFTER_MAX)
+    try:
+        alvo = parsedate_to_datetime(valor).timestamp()
+    except (TypeError, ValueError):
+        return None
+    return max(0, min(alvo - time.time(), RETRY_AFTER_MAX))
+
+
+def robots_for(url, timeout=10):
+    partes = urlparse(url)
+    host = (partes.hostname or "").lower()
+    agora = time.time()
+    with _hosts_lock:
+        cache = _robots.get(host)
+    if cache and cache[1] > agora:
+        return cache[0]
+    parser = RobotFileParser()
+    try:
+        r = http_session().get(f"{partes.scheme}://{partes.netloc}/robots.txt", timeout=timeout)
+        if r.status_code in (401, 403):
+            parser.disallow_all = True
+        elif r.status_code >= 400:
+            parser.allow_all = True
+        else:
+            parser.parse(r.text.splitlines())
+    except Exception as e:
+        log_error("robots_for", e, url=url)
+        parser.allow_all = True
+    atraso = parser.crawl_delay(CRAWLER_AGENT) or parser.crawl_delay("*")
+    if atraso:
+        estado = host_state(host)
+        with estado["lock"]:
+            estado["taxa"] = min(estado["taxa"], 1.0 / float(atraso))
+            estado["burst"] = 1
+    with _hosts_lock:
+        _robots[host] = (parser, agora + ROBOTS_TTL)
+    return parser
+
+
+def http_get(url, esperar=True, **kwargs):
+    """GET educado: robots.txt, balde de fichas do host e Retry-After em 429/503.
+
+    Com ``esperar=False`` (rotas que atendem o usuário) nada dorme: sem ficha
+    livre ou com o host bloqueado sai com RuntimeError, e um 429/503 bloqueia
+    o host para a coleta e volta direto, sem nova tentativa.
+    """
+    host = host_of(url)
+    kwargs.setdefault("timeout", 15)
+    robots = robots_for(url, timeout=kwargs["timeout"])
+    if not (robots.can_fetch(CRAWLER_AGENT, url) and robots.can_fetch(UA_HEADER["User-Agent"], url)):
+        record_throttle(host, "robots")
+        raise PermissionError(f"robots.txt não permite {url}")
+    if not esperar:
+        if not host_try_acquire(host):
+            record_throttle(host, "recusado")
+            raise RuntimeError(f"{host} sem fichas livres; pedido não vai esperar")
+        r = http_session().get(url, **kwargs)
+        if r.status_code in (429, 503):
+            espera = parse_retry_after(r.headers.get("Retry-After"))
+            espera = 5 if espera is None else espera
+            record_throttle(host, f"http_{r.status_code}", espera)
+            host_block(host, espera)
+        return r
+    for tentativa in range(HTTP_MAX_RETRIES + 1):
+        host_acquire(host)
+        r = http_session().get(url, **kwargs)
+        if r.status_code not in (429, 503) or tentativa == HTTP_MAX_RETRIES:
+            return r
+        espera = parse_retry_after(r.headers.get("Retry-After"))
+        if espera is None:
+            espera = min(RETRY_AFTER_MAX, 5 * 2**tentativa)
+        record_throttle(host, f"http_{r.status_code}", espera)
+        host_block(host, espera)
+        r.close()
+    return r
+
+
+def declared_charset(r):
+    tipo = r.headers.get("Content-Type", "")
+    m = re.search(r"charset=[\"']?([\w.:-]+)", tipo, re.I)
+    return m.group(1) if m else None
+
+
+def article_body_seen(el):
+    classes = (el.get("class") or "").split()
+    if el.tag == "article":
+        # Chamadas de outras matérias em <aside>/<header> não são o corpo.
+        if any(a.tag in ARTICLE_SKIP_PARENTS for a in el.iterancestors()):
+            return False
+    elif el.tag != "div" or not any(c in ARTICLE_BODY_CLASSES for c in classes):
+        return False
+    return any(len(clean_text(p.text_content())) > 40 for p in el.iter("p"))
+
+
+def fetch_html(url, parar=None, esperar=True):
+    """Baixa e interpreta a página em blocos, com teto de bytes e de tempo.
+
+    ``parar`` recebe cada elemento fechado pelo parser; quando devolve True a
+    leitura termina ali e a árvore parcial (com as tags ainda abertas
+    fechadas pelo lxml) é devolvida. ``esperar`` vai para http_get.
+    """
+    inicio = time.perf_counter()
+    fonte = source_for_url(url)
+    try:
+        with http_get(url, esperar=esperar, stream=True) as r:
+            r.raise_for_status()
+            parser = etree.HTMLPullParser(events=("end",), encoding=declared_charset(r))
+            parser.set_element_class_lookup(html.HtmlElementClassLookup())
+            lido = 0
+            parse = 0.0
+            resultado = "fim"
+            for chunk in r.iter_content(FETCH_CHUNK):
+                lido += len(chunk)
+                t0 = time.perf_counter()
+                parser.feed(chunk)
+                if parar is not None and any(parar(el) for _, el in parser.read_events()):
+                    resultado = "antecipado"
+                parse += time.perf_counter() - t0
+                if resultado != "fim":
+                    break
+                if lido >= FETCH_MAX_BYTES:
+                    resultado = "limite_bytes"
+                    break
+                if time.perf_counter() - inicio > FETCH_MAX_SECONDS:
+                    resultado = "limite_tempo"
+                    break
+            t0 = time.perf_counter()
+            tree = parser.close()
+            parse += time.perf_counter() - t0
+        inc("inmusic_crawler_fetch_total", fonte=fonte, resultado=resultado)
+        if resultado.startswith("limite"):
+            log_event("fetch_truncado", nivel="aviso", url=url, fonte=fonte, motivo=resultado, bytes=lido)
+        observe("inmusic_crawler_duration_seconds", time.perf_counter() - inicio - parse, fonte=fonte, etapa="fetch")
+        observe("inmusic_crawler_duration_seconds", parse, fonte=fonte, etapa="parse")
+        return tree
+    except Exception as e:
+        print("Erro em fetch_html:", e)
+        log_error("fetch_html", e, url=url, ms=round((time.perf_counter() - inicio) * 1000))
+        raise
+
+
+_thumb_lock = threading.Lock()
+_thumb_key_locks = {}
+_thumb_cache_bytes = None
+
+
+def thumb_path(imagem_url, fmt):
+    key = hashlib.sha1(imagem_url.encode("utf-8")).hexdigest()
+    return os.path.join(THUMB_DIR, key[:2], f"{key}.{fmt}")
+
+
+def make_thumbnail(data, fmt):
+    img = Image.open(io.BytesIO(data))
+    img.draft("RGB", THUMB_SIZE)
+    img = ImageOps.fit(img.convert("RGB"), THUMB_SIZE, Image.LANCZOS)
+    out = io.BytesIO()
+    if fmt == "webp":
+        img.save(out, "WEBP", quality=78, method=4)
+    else:
+        img.save(out, "JPEG", quality=80, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def download_image(imagem_url, esperar=True):
+    inicio = time.monotonic()
+    opcoes = {} if esperar else {"esperar": False, "timeout": THUMB_FETCH_TIMEOUT}
+    with http_get(imagem_url, stream=True, **opcoes) as r:
+        r.raise_for_status()
+        partes = []
+        total = 0
+        for chunk in r.iter_content(64 * 1024):
+            total += len(chunk)
+            if total > THUMB_MAX_SOURCE_BYTES:
+                raise ValueError(f"imagem maior que {THUMB_MAX_SOURCE_BYTES} bytes")
+            if not esperar and time.monotonic() - inicio > THUMB_FETCH_TIMEOUT:
+                raise TimeoutError(f"imagem não baixou em {THUMB_FETCH_TIMEOUT}s")
+            partes.append(chunk)
+    return b"".join(partes)
+
+
+def thumb_cache_size():
+    global _thumb_cache_bytes
+    if _thumb_cache_bytes is None:
+        total = 0
+        for raiz, _, arquivos in os.walk(THUMB_DIR):
+            for nome in arquivos:
+                try:
+                    total += os.path.getsize(os.path.join(raiz, nome))
+                except OSError:
+                    pass
+        _thumb_cache_bytes = total
+    return _thumb_cache_bytes
+
+
+def evict_thumbnails():
+    global _thumb_cache_bytes
+    arquivos = []
+    for raiz, _, nomes in os.walk(THUMB_DIR):
+        for nome in nomes:
+            caminho = os.path.join(raiz, nome)
+            try:
+                st = os.stat(caminho)
+            except OSError:
+                continue
+            arquivos.append((st.st_mtime, st.st_size, caminho))
+    arquivos.sort()
+    total = sum(a[1] for a in arquivos)
+    alvo = int(THUMB_CACHE_MAX_BYTES * 0.9)
+    for _, tamanho, caminho in arquivos:
+        if total <= alvo:
+            break
+        try:
+            os.remove(caminho)
+            total -= tamanho
+        except OSError:
+            pass
+    _thumb_cache_bytes = total
+
+
+def store_thumbnail(caminho, data):
+    global _thumb_cache_bytes
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    tmp = f"{caminho}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, caminho)
+    with _thumb_lock:
+        _thumb_cache_bytes = thumb_cache_size() + len(data)
+        if _thumb_cache_bytes > THUMB_CACHE_MAX_BYTES:
+            evict_thumbnails()
+
+
+def get_thumbnail(imagem_url, fmt="jpeg", esperar=True):
+    caminho = thumb_path(imagem_url, fmt)
+    if os.path.exists(caminho):
+        try:
+            os.utime(caminho)
+            return caminho
+        except OSError:
+            pass
+    with _thumb_lock:
+        key_lock = _thumb_key_locks.setdefault(imagem_url, threading.Lock())
+    try:
+        with key_lock:
+            if os.path.exists(caminho):
+                return caminho
+            data = download_image(imagem_url, esperar)
+            for f in ("webp", "jpeg"):
+                store_thumbnail(thumb_path(imagem_url, f), make_thumbnail(data, f))
+            return caminho
+    finally:
+        with _thumb_lock:
+            _thumb_key_locks.pop(imagem_url, None)
+
+
+def prefetch_thumbnails(news_ids):
+    if Image is None or not news_ids:
+        return
+
+    def worker(id_):
+        imagem_url = load_image_url(id_)
+        if not imagem_url or not imagem_url.startswith(("http://", "https://")):
+            return
+        try:
+            get_thumbnail(imagem_url)
+        except Exception as e:
+            log_error("prefetch_thumbnails", e, url=imagem_url, news_id=id_)
+
+    with ThreadPoolExecutor(max_workers=THUMB_PREFETCH_WORKERS) as pool:
+        list(pool.map(worker, news_ids))
+
+
+def extract_article_generic(url, default_author, site_label, esperar=True):
+    try:
+        tree = fetch_html(url, parar=article_body_seen, esperar=esperar)
+        inicio = time.perf_counter()
+        paras = tree.xpath(
+            "//article//p | //div[contains(@class,'content') or contains(@class,'texto') or contains(@class,'body') or contains(@id,'content')]//p"
+        )
+        textos = []
+        for p in paras:
+            txt = clean_text(p.text_content())
+            if len(txt) > 40:
+                textos.append(txt)
+        texto = "\n\n".join(textos) if textos else ""
+        autor = default_author
+        meta_autor = tree.xpath("//meta[@name='author']/@content")
+        if meta_autor:
+            autor = clean_text(meta_autor[0])
+        if not autor:
+            autor = default_author
+        img = None
+        og_img = tree.xpath("//meta[@property='og:image']/@content")
+        if og_img:
+            img = og_img[0]
+        if not img:
+            img_tags = tree.xpath("//article//img/@src | //img[@class='featured']/@src")
+            if img_tags:
+                img = img_tags[0]
+        observe("inmusic_crawler_duration_seconds", time.perf_counter() - inicio, fonte=source_for_url(url), etapa="extract")
+        return texto, autor, img, page_canonical(tree, url)
+    except Exception as e:
+        log_error(f"extract_article_generic_{site_label}", e, url=url, fonte=site_label)
+        return "", default_author, None, None
+
+
+def extract_full_article_g1(url, esperar=True):
+    try:
+        tree = fetch_html(url, parar=article_body_seen, esperar=esperar)
+        inicio = time.perf_counter()
+        paras = tree.xpath(
+            "//div[contains(@class,'mc-article-body')]//p | //article//p"
+        )
+        textos = []
+        for p in paras:
+            txt = clean_text(p.text_content())
+            if len(txt) > 40:
+                textos.append(txt)
+        texto = "\n\n".join(textos)
+        autor = None
+        meta_autor = tree.xpath("//meta[@name='author']/@content")
+        if meta_autor:
+            autor = clean_text(meta_autor[0])
+        if not autor:
+            autor_span = tree.xpath(
+                "//span[contains(@class,'content-publication-data__from')]/text()"
+            )
+            if autor_span:
+                autor = clean_text(" ".join(autor_span))
+        if not autor:
+            autor = "Redação G1"
+        img = None
+        og_img = tree.xpath("//meta[@property='og:image']/@content")
+        if og_img:
+            img = og_img[0]
+        if not img:
+            img_tags = tree.xpath("//article//img/@src")
+            if img_tags:
+                img = img_tags[0]
+        observe("inmusic_crawler_duration_seconds", time.perf_counter() - inicio, fonte="G1 Música", etapa="extract")
+        return texto, autor, img, page_canonical(tree, url)
+    except Exception as e:
+        print("G1 erro ao extrair artigo:", e)
+        log_error("extract_full_article_g1", e, url=url, fonte="G1 Música")
+        return "", "Redação G1", None, None
+
+
+def g1_page_url(page):
+    return G1_URL if page == 1 else f"{G1_URL}?page={page}"
+
+
+def g1_cards(tree):
+    for art in tree.xpath("//div[contains(@class,'feed-post-body')]"):
+        titulo = clean_text(" ".join(art.xpath(".//a//text()")))
+        link_list = art.xpath(".//a/@href")
+        img_list = art.xpath(".//img/@src")
+        yield {
+            "titulo": titulo,
+            "link": canonical_url(link_list[0]) if link_list else None,
+            "imagem_url": img_list[0] if img_list else None,
+            "resumo": clean_text(" ".join(art.xpath(".//p//text()"))),
+        }
+
+
+def wordpress_cards(tree):
+    for art in tree.xpath("//article"):
+        titulo = clean_text(" ".join(art.xpath(".//h2//text()") or art.xpath(".//a//text()")))
+        link_list = art.xpath(".//a/@href")
+        img_list = art.xpath(".//img/@src")
+        yield {
+            "titulo": titulo,
+            "link": canonical_url(link_list[0]) if link_list else None,
+            "imagem_url": img_list[0] if img_list else None,
+            "resumo": clean_text(" ".join(art.xpath(".//p//text()"))),
+        }
+
+
+def crawl_checkpoint(fonte):
+    con = db_connect()
+    row = con.execute("SELECT pagina, itens, concluido FROM crawl_state WHERE fonte = ?", (fonte,)).fetchone()
+    if row and row[2] is None:
+        con.close()
+        return row[0] + 1, row[1]
+    con.execute(
+        """
+        INSERT INTO crawl_state (fonte, pagina, itens, iniciado, concluido) VALUES (?, 0, 0, ?, NULL)
+        ON CONFLICT (fonte) DO UPDATE SET
+            pagina = 0, itens = 0, iniciado = excluded.iniciado, concluido = NULL
+        """,
+        (fonte, int(time.time())),
+    )
+    con.commit()
+    con.close()
+    return 1, 0
+
+
+def save_checkpoint(fonte, pagina, itens, status_urls=(), concluido=False):
+    agora = int(time.time())
+    con = db_connect()
+    con.executemany(
+        """
+        INSERT INTO crawl_urls (url, fonte, status, tentativas, atualizado) VALUES (?, ?, ?, 1, ?)
+        ON CONFLICT (url) DO UPDATE SET
+            status = excluded.status, tentativas = tentativas + 1, atualizado = excluded.atualizado
+        """,
+        [(url, fonte, status, agora) for url, status in status_urls],
+    )
+    con.execute(
+        "UPDATE crawl_state SET pagina = ?, itens = ?, concluido = ? WHERE fonte = ?",
+        (pagina, itens, agora if concluido else None, fonte),
+    )
+    con.commit()
+    con.close()
+
+
+def finished_urls(urls):
+    urls = [u for u in urls if u]
+    if not urls:
+        return set()
+    con = db_connect()
+    marcas = ",".join("?" * len(urls))
+    rows = con.execute(
+        f"""
+        SELECT url FROM crawl_urls WHERE status = 'ok' AND url IN ({marcas})
+        UNION SELECT link FROM news WHERE link IN ({marcas})
+        """,
+        urls + urls,
+    ).fetchall()
+    con.close()
+    return {r[0] for r in rows}
+
+
+def news_item(fonte, card, texto_completo, autor, img_full, canonico=None):
+    resumo = card["resumo"]
+    if not resumo and texto_completo:
+        resumo = texto_completo
+    if len(resumo) > 230:
+        resumo = resumo[:230].rsplit(" ", 1)[0] + "..."
+    return {
+        "titulo": card["titulo"],
+        "imagem_url": img_full or card["imagem_url"],
+        "resumo": resumo,
+        "texto_completo": texto_completo,
+        "link": canonico or card["link"],
+        "autor": autor,
+        "site": fonte,
+    }
+
+
+def crawl_source(fonte, rotulo, contexto, page_url, cards, extract, max_items, max_pages):
+    print(rotulo, "buscando notícias...")
+    inicio = time.perf_counter()
+    page, itens = crawl_checkpoint(fonte)
+    if page > 1:
+        print(rotulo, "retomando coleta interrompida na página", page)
+        log_event(contexto, fonte=fonte, retomada=page, itens=itens)
+    novos_ids = []
+    concluido = False
+    while True:
+        if itens >= max_items or page > max_pages:
+            concluido = True
+            break
+        url = page_url(page)
+        print(rotulo, "página", page, url)
+        try:
+            tree = fetch_html(url)
+        except Exception as e:
+            print(rotulo, "erro ao baixar página:", e)
+            log_error(f"{contexto}_fetch_page", e, url=url, fonte=fonte, pagina=page)
+            break
+        lista = [c for c in cards(tree) if c["titulo"] and c["link"]]
+        if not lista:
+            concluido = True
+            break
+        feitos = finished_urls([c["link"] for c in lista])
+        results = []
+        status_urls = []
+        for card in lista:
+            if itens >= max_items:
+                break
+            itens += 1
+            link = card["link"]
+            if link in feitos:
+                continue
+            try:
+                if LAZY_BODIES:
+                    results.append(news_item(fonte, card, None, None, None))
+                else:
+                    results.append(news_item(fonte, card, *extract(link)))
+                status_urls.append((link, "ok"))
+            except Exception as e:
+                print(rotulo, "erro em um card:", e)
+                log_error(f"{contexto}_card", e, url=link, fonte=fonte, pagina=page)
+                status_urls.append((link, "erro"))
+        novos_ids.extend(save_source_batch(fonte, results))
+        save_checkpoint(fonte, page, itens, status_urls)
+        page += 1
+    if concluido:
+        save_checkpoint(fonte, page - 1, itens, concluido=True)
+        record_crawl_rate(fonte, len(novos_ids), itens, page - 1)
+    print(rotulo, "coletadas", len(novos_ids), "notícias novas.")
+    log_event(
+        contexto,
+        fonte=fonte,
+        itens=itens,
+        novas=len(novos_ids),
+        paginas=page - 1,
+        concluido=concluido,
+        ms=round((time.perf_counter() - inicio) * 1000),
+    )
+    return novos_ids
+
+
+def popline_page_url(page):
+    return POPLINE_URL if page == 1 else f"{POPLINE_URL}page/{page}/"
+
+
+def tracklist_page_url(page):
+    return TRACKLIST_URL if page == 1 else f"{TRACKLIST_URL}page/{page}/"
+
+
+def extract_popline(link, esperar=True):
+    return extract_article_generic(link, "Portal POPline", "Popline", esperar)
+
+
+def extract_tracklist(link, esperar=True):
+    return extract_article_generic(link, "Tracklist", "Tracklist", esperar)
+
+
+CRAWL_SOURCES = {
+    "G1 Música": {
+        "rotulo": "G1",
+        "contexto": "crawl_g1_musica",
+        "page_url": g1_page_url,
+        "cards": g1_cards,
+        "extract": extract_full_article_g1,
+        "max_pages": 8,
+    },
+    "Portal POPline": {
+        "rotulo": "Popline",
+        "contexto": "crawl_popline",
+        "page_url": popline_page_url,
+        "cards": wordpress_cards,
+        "extract": extract_popline,
+        "max_pages": 5,
+    },
+    "Tracklist": {
+        "rotulo": "Tracklist",
+        "contexto": "crawl_tracklist",
+        "page_url": tracklist_page_url,
+        "cards": wordpress_cards,
+        "extract": extract_tracklist,
+        "max_pages": 5,
+    },
+}
+
+
+def crawl_named_source(fonte, max_items=120, max_pages=None):
+    cfg = CRAWL_SOURCES[fonte]
+    return crawl_source(
+        fonte, cfg["rotulo"], cfg["contexto"], cfg["page_url"], cfg["cards"], cfg["extract"],
+        max_items, max_pages or load_schedule()[fonte]["paginas"],
+    )
+
+
+def load_schedule():
+    con = db_connect()
+    rows = con.execute(
+        "SELECT fonte, taxa, cards_pagina, intervalo, paginas, ultima, proxima, novas_ultima FROM crawl_schedule"
+    ).fetchall()
+    con.close()
+    salvos = {r[0]: r for r in rows}
+    agenda = {}
+    for fonte, cfg in CRAWL_SOURCES.items():
+        r = salvos.get(fonte)
+        agenda[fonte] = {
+            "fonte": fonte,
+            "taxa": r[1] if r else None,
+            "cards_pagina": r[2] if r else None,
+            "intervalo": r[3] if r and r[3] else SCHEDULE_DEFAULT_INTERVAL,
+            "paginas": min(r[4], cfg["max_pages"]) if r and r[4] else cfg["max_pages"],
+            "ultima": r[5] if r else None,
+            "proxima": r[6] if r and r[6] else 0,
+            "novas_ultima": r[7] if r else None,
+        }
+    return agenda
+
+
+def due_sources(agora=None):
+    agora = agora or int(time.time())
+    return [fonte for fonte, a in load_schedule().items() if a["proxima"] <= agora]
+
+
+def mark_scheduled(fontes):
+    agora = int(time.time())
+    agenda = load_schedule()
+    con = db_connect()
+    con.executemany(
+        """
+        INSERT INTO crawl_schedule (fonte, intervalo, paginas, proxima) VALUES (?, ?, ?, ?)
+        ON CONFLICT (fonte) DO UPDATE SET proxima = excluded.proxima
+        """,
+        [(f, agenda[f]["intervalo"], agenda[f]["paginas"], agora + agenda[f]["intervalo"]) for f in fontes],
+    )
+    con.commit()
+    con.close()
+
+
+def record_crawl_rate(fonte, novas, itens=None, paginas=None):
+    agora = int(time.time())
+    a = load_schedule()[fonte]
+    max_pages = CRAWL_SOURCES[fonte]["max_pages"]
+    taxa, cards_pagina = a["taxa"], a["cards_pagina"]
+    if itens and paginas:
+        cards_pagina = itens / paginas if cards_pagina is None else (
+            SCHEDULE_ALPHA * itens / paginas + (1 - SCHEDULE_ALPHA) * cards_pagina
+        )
+    horas = (agora - a["ultima"]) / 3600 if a["ultima"] else None
+    if horas and horas > 1 / 60:
+        observada = novas / horas
+        if itens and novas >= itens and paginas and paginas >= a["paginas"]:
+            observada = max(observada, (taxa or observada) * 2)
+        taxa = observada if taxa is None else SCHEDULE_ALPHA * observada + (1 - SCHEDULE_ALPHA) * taxa
+    if taxa:
+        intervalo = SCHEDULE_TARGET_NEW / taxa * 3600
+    else:
+        intervalo = SCHEDULE_DEFAULT_INTERVAL if taxa is None else SCHEDULE_MAX_INTERVAL
+    intervalo = int(min(max(intervalo, SCHEDULE_MIN_INTERVAL), SCHEDULE_MAX_INTERVAL))
+    if taxa is None or not cards_pagina:
+        paginas_prox = max_pages
+    else:
+        esperadas = taxa * intervalo / 3600 * SCHEDULE_PAGE_SLACK
+        paginas_prox = min(max(math.ceil(esperadas / cards_pagina), 1), max_pages)
+    con = db_connect()
+    con.execute(
+        """
+        INSERT INTO crawl_schedule (fonte, taxa, cards_pagina, intervalo, paginas, ultima, proxima, novas_ultima)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (fonte) DO UPDATE SET
+            taxa = excluded.taxa, cards_pagina = excluded.cards_pagina, intervalo = excluded.intervalo,
+            paginas = excluded.paginas, ultima = excluded.ultima, proxima = excluded.proxima,
+            novas_ultima = excluded.novas_ultima
+        """,
+        (fonte, taxa, cards_pagina, intervalo, paginas_prox, agora, agora + intervalo, novas),
+    )
+    con.commit()
+    con.close()
+    log_event("record_crawl_rate", fonte=fonte, novas=novas, taxa=taxa, intervalo=intervalo, paginas=paginas_prox)
+
+
+def crawl_g1_musica(max_items=120, max_pages=8):
+    return crawl_named_source("G1 Música", max_items, max_pages)
+
+
+def crawl_popline(max_items=120, max_pages=5):
+    return crawl_named_source("Portal POPline", max_items, max_pages)
+
+
+def crawl_tracklist(max_items=120, max_pages=5):
+    return crawl_named_source("Tracklist", max_items, max_pages)
+
+
+def save_source_batch(fonte, news_list):
+    inicio = time.perf_counter()
+    novos_ids = save_news_batch(news_list)
+    observe("inmusic_crawler_duration_seconds", time.perf_counter() - inicio, fonte=fonte, etapa="save")
+    inc("inmusic_crawler_items_total", len(novos_ids), fonte=fonte)
+    return novos_ids
+
+
+def crawl_all_sources(fontes=None):
+    fontes = list(CRAWL_SOURCES) if fontes is None else list(fontes)
+    if not fontes:
+        return {"novas": {}, "limites": {}, "ms": 0}
+    if not (PROFILE_CRAWLS and _profile_lock.acquire(blocking=False)):
+        return run_crawl(fontes)
+    inicio = time.perf_counter()
+    perfis = []
+    try:
+        relatorio = profiled_call(perfis, run_crawl, fontes, perfis)
+    finally:
+        try:
+            save_profile("coleta " + " ".join(fontes), perfis, time.perf_counter() - inicio)
+        finally:
+            _profile_lock.release()
+    return relatorio
+
+
+def run_crawl(fontes, perfis=None):
+    reset_crawl_report()
+    inicio = time.perf_counter()
+    novos_ids = []
+    por_fonte = {}
+    mark_scheduled(fontes)
+    with ThreadPoolExecutor(max_workers=len(fontes)) as pool:
+        if perfis is None:
+            futuros = [(fonte, pool.submit(crawl_named_source, fonte)) for fonte in fontes]
+        else:
+            futuros = [(fonte, pool.submit(profiled_call, perfis, crawl_named_source, fonte)) for fonte in fontes]
+        for fonte, futuro in futuros:
+            try:
+                ids = futuro.result()
+            except Exception as e:
+                log_error("crawl_all_sources", e, fonte=fonte)
+                ids = []
+            por_fonte[fonte] = len(ids)
+            novos_ids.extend(ids)
+    relatorio = {
+        "novas": por_fonte,
+        "limites": crawl_report(),
+        "ms": round((time.perf_counter() - inicio) * 1000),
+    }
+    print("Relatório da coleta:", json.dumps(relatorio, ensure_ascii=False))
+    log_event("crawl_all_sources", **relatorio)
+    after_crawl(novos_ids)
+    return relatorio
+
+
+_bodies_lock = threading.Lock()
+_bodies_inflight = {}
+_bodies_failed = {}
+_bodies_pool = ThreadPoolExecutor(max_workers=BODY_PREFETCH_WORKERS, thread_name_prefix="corpo")
+
+
+def fetch_body(id_, link, site, esperar=True):
+    inicio = time.perf_counter()
+    cfg = CRAWL_SOURCES.get(site)
+    if cfg:
+        texto, autor, img, _ = cfg["extract"](link, esperar)
+    else:
+        texto, autor, img, _ = extract_article_generic(link, site, site, esperar)
+    if not texto:
+        # Falha (ou página sem texto): mantém NULL para tentar de novo depois de BODY_RETRY_AFTER.
+        raise ValueError("extração não retornou texto")
+    con = db_connect()
+    con.execute(
+        """
+        UPDATE news SET texto_completo = ?, autor = COALESCE(autor, ?), imagem_url = COALESCE(imagem_url, ?)
+        WHERE id = ? AND texto_completo IS NULL
+        """,
+        (texto, autor, img, id_),
+    )
+    con.commit()
+    con.close()
+    try:
+        index_artists([id_])
+    except Exception as e:
+        log_error("index_artists", e, news_id=id_)
+    observe("inmusic_crawler_duration_seconds", time.perf_counter() - inicio, fonte=site, etapa="corpo")
+    return texto
+
+
+def ensure_body(id_, link, site, prazo=None):
+    """Busca o corpo uma vez só por notícia, mesmo com vários pedidos ao mesmo tempo.
+
+    Sem ``prazo`` (prefetch) o dono busca na própria thread, com as esperas
+    educadas da coleta. Com ``prazo`` (rota /noticia) a busca vai para
+    _bodies_pool sem esperar fichas nem Retry-After; se não terminar a tempo
+    devolve None, a página sai com o resumo e o corpo fica gravado para a
+    próxima visita.
+    """
+    with _bodies_lock:
+        if time.time() - _bodies_failed.get(id_, 0) < BODY_RETRY_AFTER:
+            return None
+        futuro = _bodies_inflight.get(id_)
+        dono = futuro is None
+        if dono:
+            futuro = _bodies_inflight[id_] = Future()
+    if dono and prazo is None:
+        return fetch_body_owned(futuro, id_, link, site, esperar=True)
+    if dono:
+        _bodies_pool.submit(fetch_body_owned, futuro, id_, link, site, esperar=False)
+    else:
+        inc("inmusic_body_fetch_total", resultado="aguardou")
+    try:
+        return futuro.result(timeout=BODY_FETCH_TIMEOUT if prazo is None else prazo)
+    except Exception:
+        inc("inmusic_body_fetch_total", resultado="prazo")
+        return None
+
+
+def fetch_body_owned(futuro, id_, link, site, esperar):
+    texto = None
+    try:
+        texto = fetch_body(id_, link, site, esperar)
+        inc("inmusic_body_fetch_total", resultado="buscou")
+    except Exception as e:
+        log_error("ensure_body", e, url=link, fonte=site, news_id=id_)
+        inc("inmusic_body_fetch_total", resultado="erro")
+        texto = None
+    finally:
+        with _bodies_lock:
+            _bodies_inflight.pop(id_, None)
+            if texto is None:
+                _bodies_failed[id_] = time.time()
+            else:
+                _bodies_failed.pop(id_, None)
+    futuro.set_result(texto)
+    return texto
+
+
+def prefetch_bodies(limite=BODY_PREFETCH_LIMIT):
+    con = db_connect()
+    pendentes = con.execute(
+        """
+        SELECT id, link, site FROM news
+        WHERE texto_completo IS NULL AND link IS NOT NULL
+        ORDER BY trend_score DESC
+        LIMIT ?
+        """,
+        (limite,),
+    ).fetchall()
+    con.close()
+    if not pendentes:
+        return 0
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=BODY_PREFETCH_WORKERS) as pool:
+        list(pool.map(lambda r: ensure_body(*r), pendentes))
+    log_event("prefetch_bodies", noticias=len(pendentes), ms=round((time.perf_counter() - inicio) * 1000))
+    return len(pendentes)
+
+
+def background_refresh():
+    try:
+        crawl_all_sources()
+    except Exception as e:
+        log_error("background_refresh", e)
+    run_scheduler()
+
+
+def run_scheduler():
+    while True:
+        try:
+            fontes = due_sources()
+            if fontes:
+                crawl_all_sources(fontes)
+            proxima = min(a["proxima"] for a in load_schedule().values())
+        except Exception as e:
+            log_error("run_scheduler", e)
+            proxima = 0
+        time.sleep(min(max(proxima - time.time(), 1), SCHEDULE_POLL))
+
+
+def after_crawl(novos_ids):
+    prefetch_thumbnails(novos_ids)
+    if LAZY_BODIES:
+        prefetch_bodies()
+    try:
+        update_related_index(novos_ids)
+    except Exception as e:
+        log_error("update_related_index", e)
+    try:
+        index_artists(novos_ids)
+    except Exception as e:
+        log_error("index_artists", e)
+    try:
+        update_suggest_index(novos_ids)
+    except Exception as e:
+        log_error("update_suggest_index", e)
+
+
+def enqueue_urls(rows, reabrir=False):
+    agora = int(time.time())
+    con = db_connect()
+    conflito = (
+        "DO UPDATE SET status = 'pendente', tentativas = 0, lease_ate = NULL, atualizado = excluded.atualizado "
+        "WHERE frontier.status IN ('ok', 'erro')"
+        if reabrir
+        else "DO NOTHING"
+    )
+    cur = con.executemany(
+        f"""
+        INSERT INTO frontier (url, fonte, tipo, pagina, dados, prioridade, status, tentativas, atualizado)
+        VALUES (?, ?, ?, ?, ?, ?, 'pendente', 0, ?)
+        ON CONFLICT (url) {conflito}
+        """,
+        [(url, fonte, tipo, pagina, dados, prioridade, agora) for url, fonte, tipo, pagina, dados, prioridade in rows],
+    )
+    total = cur.rowcount
+    con.commit()
+    con.close()
+    return total
+
+
+def enqueue_listings(fontes=None):
+    fontes = list(CRAWL_SOURCES) if fontes is None else list(fontes)
+    if not fontes:
+        return 0
+    agenda = load_schedule()
+    mark_scheduled(fontes)
+    rows = []
+    for fonte in fontes:
+        cfg = CRAWL_SOURCES[fonte]
+        for page in range(1, agenda[fonte]["paginas"] + 1):
+            rows.append((cfg["page_url"](page), fonte, "lista", page, None, 100 - page))
+    total = enqueue_urls(rows, reabrir=True)
+    log_event("enqueue_listings", urls=total)
+    return total
+
+
+def claim_urls(dono, limite=FRONTIER_BATCH, lease=FRONTIER_LEASE):
+    agora = int(time.time())
+    con = db_connect()
+    try:
+        con.execute(
+            """
+            UPDATE frontier SET status = 'erro', lease_ate = NULL
+            WHERE status = 'em_andamento' AND lease_ate < ? AND tentativas >= ?
+            """,
+            (agora, FRONTIER_MAX_ATTEMPTS),
+        )
+        rows = con.execute(
+            """
+            UPDATE frontier
+            SET status = 'em_andamento', lease_ate = ?, dono = ?, tentativas = tentativas + 1, atualizado = ?
+            WHERE url IN (
+                SELECT url FROM frontier
+                WHERE (status = 'pendente' OR (status = 'em_andamento' AND lease_ate < ?))
+                  AND tentativas < ?
+                ORDER BY prioridade DESC, atualizado
+                LIMIT ?
+            )
+            RETURNING url, fonte, tipo, pagina, dados, tentativas
+            """,
+            (agora + lease, dono, agora, agora, FRONTIER_MAX_ATTEMPTS, limite),
+        ).fetchall()
+        con.commit()
+    finally:
+        con.close()
+    return rows
+
+
+def finish_url(url, dono, ok):
+    con = db_connect()
+    con.execute(
+        """
+        UPDATE frontier
+        SET status = CASE WHEN ? THEN 'ok' WHEN tentativas >= ? THEN 'erro' ELSE 'pendente' END,
+            lease_ate = NULL, atualizado = ?
+        WHERE url = ? AND dono = ?
+        """,
+        (ok, FRONTIER_MAX_ATTEMPTS, int(time.time()), url, dono),
+    )
+    con.commit()
+    con.close()
+
+
+def process_frontier_url(url, fonte, tipo, pagina, dados):
+    cfg = CRAWL_SOURCES[fonte]
+    if tipo == "lista":
+        tree = fetch_html(url)
+        lista = [c for c in cfg["cards"](tree) if c["titulo"] and c["link"]]
+        feitos = finished_urls([c["link"] for c in lista])
+        novos = [c for c in lista if c["link"] not in feitos]
+        save_listing_stats(url, len(lista), len(novos))
+        if LAZY_BODIES:
+            return save_source_batch(fonte, [news_item(fonte, c, None, None, None) for c in novos])
+        enqueue_urls(
+            [(c["link"], fonte, "artigo", pagina, json.dumps(c, ensure_ascii=False), 50 - pagina) for c in novos]
+        )
+        return []
+    card = json.loads(dados)
+    return save_source_batch(fonte, [news_item(fonte, card, *cfg["extract"](url))])
+
+
+def run_worker(limite=FRONTIER_BATCH, continuo=False, so_listagem=False):
+    global LAZY_BODIES
+    LAZY_BODIES = LAZY_BODIES or so_listagem
+    dono = f"{socket.gethostname()}:{os.getpid()}"
+    novos_ids = []
+    processadas = 0
+    while True:
+        lote = claim_urls(dono, limite)
+        if not lote:
+            if not continuo:
+                break
+            fontes = due_sources()
+            if fontes:
+                enqueue_listings(fontes)
+            else:
+                time.sleep(FRONTIER_POLL)
+            continue
+        ids_lote = []
+        for url, fonte, tipo, pagina, dados, tentativas in lote:
+            try:
+                ids_lote.extend(process_frontier_url(url, fonte, tipo, pagina, dados))
+                finish_url(url, dono, True)
+            except Exception as e:
+                log_error("run_worker", e, url=url, fonte=fonte, tentativa=tentativas)
+                finish_url(url, dono, False)
+            processadas += 1
+            if tipo == "lista":
+                try:
+                    record_listing_round(fonte)
+                except Exception as e:
+                    log_error("record_listing_round", e, fonte=fonte)
+        prefetch_thumbnails(ids_lote)
+        try:
+            index_artists(ids_lote)
+        except Exception as e:
+            log_error("index_artists", e)
+        novos_ids.extend(ids_lote)
+    log_event("run_worker", dono=dono, urls=processadas, novas=len(novos_ids))
+    return novos_ids
+
+
+def save_listing_stats(url, itens, novas):
+    con = db_connect()
+    con.execute(
+        "UPDATE frontier SET dados = ? WHERE url = ? AND tipo = 'lista'",
+        (json.dumps({"itens": itens, "novas": novas}), url),
+    )
+    con.commit()
+    con.close()
+
+
+def record_listing_round(fonte):
+    """Alimenta a agenda quando a última listagem pendente da fonte termina.
+
+    As contagens de cada página ficam em frontier.dados e são lidas e apagadas
+    na mesma transação de escrita, então só um trabalhador registra cada rodada.
+    """
+    con = db_connect()
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        pendentes = con.execute(
+            """
+            SELECT COUNT(*) FROM frontier
+            WHERE fonte = ? AND tipo = 'lista' AND status IN ('pendente', 'em_andamento')
+            """,
+            (fonte,),
+        ).fetchone()[0]
+        if pendentes:
+            con.rollback()
+            return
+        filtro = "fonte = ? AND tipo = 'lista' AND status = 'ok' AND dados IS NOT NULL"
+        rows = con.execute(f"SELECT dados FROM frontier WHERE {filtro}", (fonte,)).fetchall()
+        con.execute(f"UPDATE frontier SET dados = NULL WHERE {filtro}", (fonte,))
+        con.commit()
+    finally:
+        con.close()
+    if not rows:
+        return
+    paginas = [json.loads(r[0]) for r in rows]
+    record_crawl_rate(
+        fonte, sum(p["novas"] for p in paginas), itens=sum(p["itens"] for p in paginas), paginas=len(paginas)
+    )
+
+
+def run_local_worker():
+    """Trabalhador em thread para `servir`: esvazia a fila que /atualizar enche."""
+    while True:
+        try:
+            novos_ids = run_worker()
+            if novos_ids:
+                update_related_index(novos_ids)
+                update_suggest_index(novos_ids)
+        except Exception as e:
+            log_error("run_local_worker", e)
+        time.sleep(FRONTIER_POLL)
+
+
+def run_workers(processos, limite=FRONTIER_BATCH, continuo=False, so_listagem=False):
+    inicio = time.perf_counter()
+    novos_ids = []
+    with ProcessPoolExecutor(max_workers=processos, initializer=use_process_log) as pool:
+        futuros = [pool.submit(run_worker, limite, continuo, so_listagem) for _ in range(processos)]
+        for fut in futuros:
+            novos_ids.extend(fut.result())
+    try:
+        update_related_index(novos_ids)
+    except Exception as e:
+        log_error("update_related_index", e)
+    print(f"Trabalhadores coletaram {len(novos_ids)} notícias novas em {time.perf_counter() - inicio:.1f}s")
+    return novos_ids
+
+
+def archive_old_news(dias=ARCHIVE_AFTER_DAYS, vacuum=False):
+    inicio = time.perf_counter()
+    corte = int(time.time()) - dias * 86400
+    os.makedirs(os.path.dirname(archive_path("x")), exist_ok=True)
+    con = db_connect()
+    cur = con.cursor()
+    colunas = ", ".join(table_columns(cur, "news"))
+    mes_sql = "strftime('%Y-%m', created_at, 'unixepoch', 'localtime')"
+    cur.execute(f"SELECT DISTINCT {mes_sql} FROM news WHERE created_at < ?", (corte,))
+    meses = [r[0] for r in cur.fetchall()]
+    movidas = {}
+    for mes in meses:
+        arquivo = f"inmusic-{mes}.db"
+        cur.execute("ATTACH DATABASE ? AS p", (archive_path(arquivo),))
+        try:
+            cur.execute(NEWS_DDL.format(schema="p."))
+            for ddl in ARCHIVE_INDEXES:
+                cur.execute(ddl)
+            filtro = f"created_at < ? AND {mes_sql} = ?"
+            with con:
+                cur.execute(
+                    f"INSERT OR REPLACE INTO p.news ({colunas}) SELECT {colunas} FROM main.news WHERE {filtro}",
+                    (corte, mes),
+                )
+                cur.execute(
+                    f"INSERT OR REPLACE INTO archive_index (news_id, mes) SELECT id, ? FROM main.news WHERE {filtro}",
+                    (mes, corte, mes),
+                )
+                cur.execute(f"DELETE FROM main.news WHERE {filtro}", (corte, mes))
+                movidas[mes] = cur.rowcount
+                cur.execute(
+                    """
+                    INSERT INTO archive_months (mes, arquivo, total, inicio, fim)
+                    SELECT ?, ?, COUNT(*), MIN(created_at), MAX(created_at) FROM p.news WHERE true
+                    ON CONFLICT (mes) DO UPDATE SET
+                        arquivo = excluded.arquivo, total = excluded.total,
+                        inicio = excluded.inicio, fim = excluded.fim
+                    """,
+                    (mes, arquivo),
+                )
+        finally:
+            cur.execute("DETACH DATABASE p")
+    if vacuum and movidas:
+        cur.execute("VACUUM")
+    con.close()
+    ms = round((time.perf_counter() - inicio) * 1000)
+    log_event("archive_old_news", dias=dias, meses=movidas, ms=ms)
+    print(f"Arquivadas {sum(movidas.values())} notícias em {len(movidas)} partições mensais ({ms} ms)")
+    return movidas
+
+
+def merge_news_rows(cur, manter, duplicadas):
+    marcas = ",".join("?" * len(duplicadas))
+    cur.execute("SELECT trend_score FROM news WHERE id = ?", (manter,))
+    score = cur.fetchone()[0]
+    cur.execute(
+        f"SELECT id, trend_score, created_at, site, categoria FROM news WHERE id IN ({marcas})", duplicadas
+    )
+    for _, outro, created_at, site, categoria in cur.fetchall():
+        if outro is not None:
+            somado = trend_add(score, outro)
+            score = trend_sub(somado, trend_term("publicacao", created_at)) or somado
+        bump_daily_count(cur, created_at, site, categoria, -1)
+    cur.execute(f"UPDATE comments SET news_id = ? WHERE news_id IN ({marcas})", [manter] + duplicadas)
+    cur.execute(
+        f"""
+        UPDATE news SET
+            views = views + (SELECT COALESCE(SUM(views), 0) FROM news WHERE id IN ({marcas})),
+            likes = likes + (SELECT COALESCE(SUM(likes), 0) FROM news WHERE id IN ({marcas})),
+            liked = MAX(liked, (SELECT COALESCE(MAX(liked), 0) FROM news WHERE id IN ({marcas}))),
+            comment_count = (SELECT COUNT(*) FROM comments WHERE news_id = news.id),
+            texto_completo = COALESCE(texto_completo, (
+                SELECT texto_completo FROM news WHERE id IN ({marcas}) AND texto_completo IS NOT NULL
+                ORDER BY LENGTH(texto_completo) DESC LIMIT 1
+            )),
+            imagem_url = COALESCE(imagem_url, (
+                SELECT imagem_url FROM news WHERE id IN ({marcas}) AND imagem_url IS NOT NULL LIMIT 1
+            )),
+            trend_score = ?
+        WHERE id = ?
+        """,
+        duplicadas * 5 + [score, manter],
+    )
+    _unindex_artists(cur, duplicadas)
+    cur.execute(f"DELETE FROM news_categorias WHERE news_id IN ({marcas})", duplicadas)
+    cur.execute(
+        f"DELETE FROM news_related WHERE news_id IN ({marcas}) OR related_id IN ({marcas})", duplicadas * 2
+    )
+    cur.execute(f"DELETE FROM news WHERE id IN ({marcas})", duplicadas)
+
+
+def merge_duplicate_news():
+    """Canonicaliza os links gravados e funde as notícias que caem no mesmo link.
+
+    Fica a linha mais antiga; views, curtidas e comentários das demais são
+    somados nela. Só olha o banco principal: partições arquivadas são meses
+    fechados e não recebem coletas novas.
+    """
+    inicio = time.perf_counter()
+    con = db_connect()
+    cur = con.cursor()
+    grupos = {}
+    for id_, link in cur.execute("SELECT id, link FROM news WHERE link IS NOT NULL ORDER BY id").fetchall():
+        grupos.setdefault(canonical_url(link), []).append((id_, link))
+    fundidas = 0
+    corrigidos = 0
+    with con:
+        for canonico, linhas in grupos.items():
+            manter = linhas[0][0]
+            duplicadas = [id_ for id_, _ in linhas[1:]]
+            if duplicadas:
+                merge_news_rows(cur, manter, duplicadas)
+                fundidas += len(duplicadas)
+            if linhas[0][1] != canonico:
+                cur.execute("UPDATE news SET link = ? WHERE id = ?", (canonico, manter))
+                corrigidos += 1
+    con.close()
+    ms = round((time.perf_counter() - inicio) * 1000)
+    log_event("merge_duplicate_news", fundidas=fundidas, links_corrigidos=corrigidos, ms=ms)
+    print(f"{fundidas} notícias duplicadas fundidas, {corrigidos} links canonicalizados ({ms} ms)")
+    return fundidas, corrigidos
+
+
+def open_snapshot(caminho, modo):
+    if modo == "w":
+        if caminho.endswith(".zst"):
+            if zstandard is None:
+                raise RuntimeError("zstandard não está instalado; use um arquivo .gz")
+            arquivo = open(caminho, "wb")
+            return io.TextIOWrapper(zstandard.ZstdCompressor(level=3).stream_writer(arquivo), encoding="utf-8")
+        return gzip.open(caminho, "wt", encoding="utf-8", compresslevel=5)
+    with open(caminho, "rb") as f:
+        magica = f.read(4)
+    if magica == b"\x28\xb5\x2f\xfd":
+        if zstandard is None:
+            raise RuntimeError("zstandard não está instalado; não é possível ler snapshots .zst")
+        arquivo = open(caminho, "rb")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(arquivo), encoding="utf-8")
+    return gzip.open(caminho, "rt", encoding="utf-8")
+
+
+def table_columns(cur, tabela):
+    cur.execute(f"PRAGMA table_info({tabela})")
+    return [r[1] for r in cur.fetchall()]
+
+
+def export_snapshot(caminho):
+    """Grava o banco num snapshot JSON lines.
+
+    As notícias das partições mensais entram junto com as do banco principal,
+    na mesma tabela `news`: o snapshot restaura tudo no banco quente e
+    `arquivar` pode ser rodado de novo depois.
+    """
+    inicio = time.perf_counter()
+    con = db_connect()
+    cur = con.cursor()
+    colunas = {t: table_columns(cur, t) for t in SNAPSHOT_TABLES}
+    particoes = [particao for particao, _ in archive_months()]
+    totais = {}
+    with open_snapshot(caminho, "w") as out:
+        out.write(json.dumps({"formato": "inmusic-snapshot", "versao": 1, "tabelas": colunas}) + "\n")
+        for tabela in SNAPSHOT_TABLES:
+            total = 0
+            for origem in [None] + (particoes if tabela == "news" else []):
+                leitura = con if origem is None else db_connect(origem)
+                try:
+                    cur_origem = leitura.execute(f"SELECT {', '.join(colunas[tabela])} FROM {tabela}")
+                    while True:
+                        rows = cur_origem.fetchmany(SNAPSHOT_BATCH)
+                        if not rows:
+                            break
+                        out.write("".join(json.dumps([tabela, r], ensure_ascii=False) + "\n" for r in rows))
+                        total += len(rows)
+                finally:
+                    if origem is not None:
+                        leitura.close()
+            totais[tabela] = total
+    con.close()
+    ms = round((time.perf_counter() - inicio) * 1000)
+    log_event("export_snapshot", arquivo=caminho, linhas=totais, bytes=os.path.getsize(caminho), ms=ms)
+    print(f"Snapshot gravado em {caminho}: {totais} ({ms} ms)")
+    return totais
 
 
-def crawl_g1_musica(max_items=120, max_pages=8):
-    print("G1 buscando notícias...")
-    results = []
-    page = 1
-    while len(results) < max_items and page <= max_pages:
-        if page == 1:
-            url = G1_URL
-        else:
-            url = f"{G1_URL}?page={page}"
-        print("G1 página", page, url)
+def import_snapshot(caminho, substituir=False):
+    inicio = time.perf_counter()
+    if os.path.exists(DB_PATH):
+        con = db_connect()
+        tem_noticias = con.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'news'"
+        ).fetchone() and con.execute("SELECT EXISTS(SELECT 1 FROM news)").fetchone()[0]
+        con.close()
+        if tem_noticias and not substituir:
+            raise RuntimeError(f"{DB_PATH} já tem notícias; use --substituir para recriá-lo")
+        # As partições do banco antigo saem junto: o snapshot já traz as notícias
+        # arquivadas, e um `arquivar` futuro gravaria por cima de linhas velhas.
         try:
-            tree = fetch_html(url)
-        except Exception as e:
-            print("G1 erro ao baixar página:", e)
-            log_error("crawl_g1_musica_fetch_page", e)
-            break
-        articles = tree.xpath("//div[contains(@class,'feed-post-body')]")
-        if not articles:
-            break
-        for art in articles:
-            try:
-                titulo = clean_text(" ".join(art.xpath(".//a//text()")))
-                link_list = art.xpath(".//a/@href")
-                if not titulo or not link_list:
-                    continue
-                link = link_list[0]
-                img_list = art.xpath(".//img/@src")
-                imagem_url = img_list[0] if img_list else None
-                resumo = clean_text(" ".join(art.xpath(".//p//text()")))
-                texto_completo, autor, img_full = extract_full_article_g1(link)
-                if img_full:
-                    imagem_url = img_full
-                if not resumo and texto_completo:
-                    resumo = texto_completo
-                if len(resumo) > 230:
-                    resumo = resumo[:230].rsplit(" ", 1)[0] + "..."
-                results.append(
-                    {
-                        "titulo": titulo,
-                        "imagem_url": imagem_url,
-                        "resumo": resumo,
-                        "texto_completo": texto_completo,
-                        "link": link,
-                        "autor": autor,
-                        "site": "G1 Música",
-                    }
-                )
-            except Exception as e:
-                print("G1 erro em um card:", e)
-                log_error("crawl_g1_musica_card", e)
+            particoes = archive_months()
+        except sqlite3.OperationalError:
+            particoes = []
+        for particao, _ in particoes:
+            if os.path.exists(particao):
+                os.remove(particao)
+        for sufixo in ("", "-wal", "-shm"):
+            if os.path.exists(DB_PATH + sufixo):
+                os.remove(DB_PATH + sufixo)
+    init_db(indices=False)
+    con = db_connect()
+    cur = con.cursor()
+    cur.execute("PRAGMA journal_mode=OFF")
+    cur.execute("PRAGMA synchronous=OFF")
+    cur.execute("PRAGMA cache_size=-262144")
+    totais = {}
+    with open_snapshot(caminho, "r") as f:
+        cabecalho = json.loads(f.readline())
+        if cabecalho.get("formato") != "inmusic-snapshot":
+            raise RuntimeError(f"{caminho} não é um snapshot do InMusic")
+        inserts = {}
+        indices_coluna = {}
+        for tabela, colunas in cabecalho["tabelas"].items():
+            if tabela not in SNAPSHOT_TABLES:
                 continue
-            if len(results) >= max_items:
-                break
-        page += 1
-    print("G1 coletadas", len(results), "notícias.")
-    return results
+            destino = set(table_columns(cur, tabela))
+            indices_coluna[tabela] = [i for i, c in enumerate(colunas) if c in destino]
+            nomes = [colunas[i] for i in indices_coluna[tabela]]
+            inserts[tabela] = (
+                f"INSERT INTO {tabela} ({', '.join(nomes)}) VALUES ({', '.join('?' * len(nomes))})"
+            )
+            totais[tabela] = 0
+        # Uma executemany por bloco de tabela, alimentada direto do arquivo: sem listas
+        # intermediárias e tudo na mesma transação, que só fecha no commit final.
+        decode = json.JSONDecoder().decode
+        for tabela, grupo in itertools.groupby(map(decode, f), key=lambda linha: linha[0]):
+            if tabela not in inserts:
+                continue
+            sel = indices_coluna[tabela]
+            cur.executemany(inserts[tabela], ([row[i] for i in sel] for _, row in grupo))
+            totais[tabela] += cur.rowcount
+    carga_ms = round((time.perf_counter() - inicio) * 1000)
+    for ddl in NEWS_INDEXES:
+        cur.execute(ddl)
+    rebuild_daily_counts(cur)
+    cur.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    con.commit()
+    cur.execute("PRAGMA journal_mode=WAL")
+    con.close()
+    ms = round((time.perf_counter() - inicio) * 1000)
+    log_event("import_snapshot", arquivo=caminho, linhas=totais, carga_ms=carga_ms, ms=ms)
+    print(f"Snapshot carregado de {caminho}: {totais} ({carga_ms} ms de carga, {ms} ms com índices)")
+    return totais
 
 
-def crawl_popline(max_items=120, max_pages=5):
-    print("Popline buscando notícias...")
-    results = []
-    page = 1
-    while len(results) < max_items and page <= max_pages:
-        url = POPLINE_URL if page == 1 else f"{POPLINE_URL}page/{page}/"
-        print("Popline página", page, url)
-        try:
-            tree = fetch_html(url)
-        except Exception as e:
-            log_error("crawl_popline_fetch_page", e)
-            break
-        articles = tree.xpath("//article")
-        if not articles:
-            break
-        for art in articles:
-            try:
-                titulo = clean_text(" ".join(art.xpath(".//h2//text()") or art.xpath(".//a//text()")))
-                link_list = art.xpath(".//a/@href")
-                link = link_list[0] if link_list else None
-                if not titulo or not link:
-                    continue
-                img_list = art.xpath(".//img/@src")
-                imagem_url = img_list[0] if img_list else None
-                resumo = clean_text(" ".join(art.xpath(".//p//text()")))
-                texto_completo, autor, img_full = extract_article_generic(link, "Portal POPline", "Popline")
-                if img_full:
-                    imagem_url = img_full
-                if not resumo and texto_completo:
-                    resumo = texto_completo
-                if len(resumo) > 230:
-                    resumo = resumo[:230].rsplit(" ", 1)[0] + "..."
-                results.append(
-                    {
-                        "titulo": titulo,
-                        "imagem_url": imagem_url,
-                        "resumo": resumo,
-                        "texto_completo": texto_completo,
-                        "link": link,
-                        "autor": autor,
-                        "site": "Portal POPline",
-                    }
-                )
-            except Exception as e:
-                log_error("crawl_popline_card", e)
-                continue
-            if len(results) >= max_items:
-                break
-        page += 1
-    print("Popline coletadas", len(results), "notícias.")
-    return results
+_feeds_lock = threading.Lock()
+_feeds = OrderedDict()
 
 
-def crawl_tracklist(max_items=120, max_pages=5):
-    print("Tracklist buscando notícias...")
-    results = []
-    page = 1
-    while len(results) < max_items and page <= max_pages:
-        url = TRACKLIST_URL if page == 1 else f"{TRACKLIST_URL}page/{page}/"
-        print("Tracklist página", page, url)
-        try:
-            tree = fetch_html(url)
-        except Exception as e:
-            log_error("crawl_tracklist_fetch_page", e)
-            break
-        articles = tree.xpath("//article")
-        if not articles:
-            break
-        for art in articles:
-            try:
-                titulo = clean_text(" ".join(art.xpath(".//h2//text()") or art.xpath(".//a//text()")))
-                link_list = art.xpath(".//a/@href")
-                link = link_list[0] if link_list else None
-                if not titulo or not link:
-                    continue
-                img_list = art.xpath(".//img/@src")
-                imagem_url = img_list[0] if img_list else None
-                resumo = clean_text(" ".join(art.xpath(".//p//text()")))
-                texto_completo, autor, img_full = extract_article_generic(link, "Tracklist", "Tracklist")
-                if img_full:
-                    imagem_url = img_full
-                if not resumo and texto_completo:
-                    resumo = texto_completo
-                if len(resumo) > 230:
-                    resumo = resumo[:230].rsplit(" ", 1)[0] + "..."
-                results.append(
-                    {
-                        "titulo": titulo,
-                        "imagem_url": imagem_url,
-                        "resumo": resumo,
-                        "texto_completo": texto_completo,
-                        "link": link,
-                        "autor": autor,
-                        "site": "Tracklist",
-                    }
-                )
-            except Exception as e:
-                log_error("crawl_tracklist_card", e)
-                continue
-            if len(results) >= max_items:
-                break
-        page += 1
-    print("Tracklist coletadas", len(results), "notícias.")
-    return results
+def max_news_id():
+    con = db_connect()
+    try:
+        return con.execute("SELECT COALESCE(MAX(id), 0) FROM news").fetchone()[0]
+    finally:
+        con.close()
+
+
+def feed_entry(r, base):
+    id_, titulo, resumo, link, autor, site, categoria, created_at = r
+    url = f"{base}noticia/{id_}"
+    data = datetime.datetime.fromtimestamp(created_at or 0, datetime.timezone.utc)
+    esc = html_lib.escape
+    return {
+        "id": id_,
+        "created_at": created_at or 0,
+        "rss": (
+            f"<item><title>{esc(titulo or '')}</title><link>{esc(url)}</link>"
+            f"<guid isPermaLink=\"true\">{esc(url)}</guid>"
+            f"<description>{esc(resumo or '')}</description>"
+            f"<category>{esc(categoria or '')}</category><source url=\"{esc(link or url)}\">{esc(site or '')}</source>"
+            f"<pubDate>{format_datetime(data, usegmt=True)}</pubDate></item>\n"
+        ),
+        "atom": (
+            f"<entry><title>{esc(titulo or '')}</title><link href=\"{esc(url)}\"/>"
+            f"<id>{esc(url)}</id><updated>{data.isoformat()}</updated>"
+            f"<author><name>{esc(autor or site or 'InMusic')}</name></author>"
+            f"<category term=\"{esc(categoria or '')}\"/><summary>{esc(resumo or '')}</summary></entry>\n"
+        ),
+        "json": json.dumps(
+            {
+                "id": str(id_),
+                "url": url,
+                "external_url": link,
+                "title": titulo,
+                "summary": resumo,
+                "content_text": resumo,
+                "date_published": data.isoformat(),
+                "authors": [{"name": autor or site}],
+                "tags": [t for t in (categoria, site) if t],
+            },
+            ensure_ascii=False,
+        ),
+    }
+
+
+def feed_new_rows(filtro, valor, depois_de, limite):
+    where = "WHERE id > ?"
+    params = [depois_de]
+    if filtro:
+        where += f" AND {filtro} = ?"
+        params.append(valor)
+    query = f"""
+        SELECT id, titulo, resumo, link, autor, site, categoria, created_at
+        FROM news {where}
+        ORDER BY id DESC
+        LIMIT ? OFFSET ?
+    """
+    if depois_de:
+        return list(iter_query(query, params + [limite, 0], lambda r: r, "feed_new_rows"))
+    return list(
+        iter_partitioned(
+            query, params, limite, 0, lambda r: r, "feed_new_rows",
+            query_count=f"SELECT COUNT(*) FROM news {where}",
+        )
+    )
+
+
+def render_feed(formato, entradas, titulo, base, self_url):
+    atualizado = datetime.datetime.fromtimestamp(
+        entradas[0]["created_at"] if entradas else 0, datetime.timezone.utc
+    )
+    esc = html_lib.escape
+    if formato == "rss":
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n<rss version="2.0"><channel>'
+            f"<title>{esc(titulo)}</title><link>{esc(base)}</link>"
+            f"<description>{esc(titulo)}</description><language>pt-BR</language>"
+            f"<lastBuildDate>{format_datetime(atualizado, usegmt=True)}</lastBuildDate>\n"
+            + "".join(e["rss"] for e in entradas)
+            + "</channel></rss>\n"
+        )
+    if formato == "atom":
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n<feed xmlns="http://www.w3.org/2005/Atom" xml:lang="pt-BR">'
+            f"<title>{esc(titulo)}</title><id>{esc(self_url)}</id>"
+            f"<link rel=\"self\" href=\"{esc(self_url)}\"/><link href=\"{esc(base)}\"/>"
+            f"<updated>{atualizado.isoformat()}</updated>\n"
+            + "".join(e["atom"] for e in entradas)
+            + "</feed>\n"
+        )
+    return (
+        json.dumps(
+            {"version": "https://jsonfeed.org/version/1.1", "title": titulo, "home_page_url": base,
+             "feed_url": self_url, "language": "pt-BR"},
+            ensure_ascii=False,
+        )[:-1]
+        + ', "items": ['
+        + ", ".join(e["json"] for e in entradas)
+        + "]}\n"
+    )
 
 
-def crawl_all_sources():
-    all_news = []
-    all_news.extend(crawl_g1_musica(max_items=120, max_pages=8))
-    all_news.extend(crawl_popline(max_items=120, max_pages=5))
-    all_news.extend(crawl_tracklist(max_items=120, max_pages=5))
-    save_news_batch(all_news)
+def get_feed(formato, filtro, valor, base, self_url):
+    chave = (filtro, valor, base)
+    atual = max_news_id()
+    with _feeds_lock:
+        feed = _feeds.get(chave)
+        if feed is None:
+            titulo = f"{FEED_TITLE} – {valor}" if filtro else FEED_TITLE
+            feed = _feeds[chave] = {"lock": threading.Lock(), "max_id": 0, "entradas": [], "renders": {},
+                                    "valor": valor, "titulo": titulo}
+            while len(_feeds) > FEED_CACHE_MAX:
+                _feeds.popitem(last=False)
+        else:
+            _feeds.move_to_end(chave)
+    with feed["lock"]:
+        if atual != feed["max_id"]:
+            novos = feed_new_rows(filtro, feed["valor"], feed["max_id"], FEED_SIZE)
+            if novos:
+                feed["entradas"] = ([feed_entry(r, base) for r in novos] + feed["entradas"])[:FEED_SIZE]
+                feed["renders"] = {}
+                inc("inmusic_feed_rebuilds_total", formato=formato)
+            feed["max_id"] = atual
+        render = feed["renders"].get(formato)
+        if render is None:
+            corpo = render_feed(formato, feed["entradas"], feed["titulo"], base, self_url).encode("utf-8")
+            ultima = feed["entradas"][0]["created_at"] if feed["entradas"] else 0
+            render = feed["renders"][formato] = (corpo, hashlib.md5(corpo).hexdigest(), ultima)
+        return render
 
 
 HTML_INDEX = """
@@ -657,6 +3945,9 @@ HTML_INDEX = """
 <head>
 <meta charset="UTF-8">
 <title>InMusic – Notícias de Música</title>
+<link rel="alternate" type="application/rss+xml" title="InMusic (RSS)" href="/feed.xml">
+<link rel="alternate" type="application/atom+xml" title="InMusic (Atom)" href="/atom.xml">
+<link rel="alternate" type="application/feed+json" title="InMusic (JSON Feed)" href="/feed.json">
 <style>
  body {
    font-family: Arial, Helvetica, sans-serif;
@@ -694,6 +3985,10 @@ HTML_INDEX = """
    grid-template-columns: minmax(0, 3fr) minmax(240px, 1fr);
    gap:24px;
  }
+ .main-col {
+   grid-column:1;
+   grid-row:1;
+ }
  .section-title {
    margin:0 0 16px;
    font-size:18px;
@@ -762,6 +4057,9 @@ HTML_INDEX = """
    background:#38bdf8;
  }
  .sidebar {
+   grid-column:2;
+   grid-row:1;
+   align-self:start;
    background:#020617;
    border-radius:14px;
    border:1px solid rgba(148,163,184,0.3);
@@ -772,6 +4070,20 @@ HTML_INDEX = """
    margin:0 0 8px;
    font-size:15px;
  }
+ .sidebar-tabs {
+   display:flex;
+   gap:12px;
+   margin-bottom:10px;
+   font-size:15px;
+   font-weight:bold;
+ }
+ .sidebar-tabs a {
+   color:#6b7280;
+   text-decoration:none;
+ }
+ .sidebar-tabs a.ativo {
+   color:#e5e7eb;
+ }
  .mais-lidas-list {
    list-style:none;
    padding:0;
@@ -819,7 +4131,27 @@ HTML_INDEX = """
 </header>
 
 <div class="container">
-  <div>
+  <aside class="sidebar">
+    <div class="sidebar-tabs">
+      <a href="?lateral=mais_lidas" class="{% if lateral != 'em_alta' %}ativo{% endif %}">Mais lidas</a>
+      <a href="?lateral=em_alta" class="{% if lateral == 'em_alta' %}ativo{% endif %}">Em alta</a>
+    </div>
+    <ul class="mais-lidas-list">
+      {% for m in mais_lidas %}
+        <li>
+          <a href="/noticia/{{ m.id }}">{{ m.titulo }}</a><br>
+          {% if lateral == 'em_alta' %}
+            <span class="mais-lidas-views">{{ m.pontos }} pontos • {{ m.views }} visualizações</span>
+          {% else %}
+            <span class="mais-lidas-views">{{ m.views }} visualizações</span>
+          {% endif %}
+        </li>
+      {% endfor %}
+    </ul>
+  </aside>
+  <!-- flush -->
+
+  <div class="main-col">
     {% if titulo_lista %}
       <h2 class="section-title">{{ titulo_lista }}</h2>
     {% endif %}
@@ -828,7 +4160,7 @@ HTML_INDEX = """
         <div class="card">
           <div class="thumb">
             {% if n.imagem_url %}
-              <img src="{{ n.imagem_url }}" alt="">
+              <img src="/thumb/{{ n.id }}" alt="" loading="lazy">
             {% endif %}
           </div>
           <div class="card-body">
@@ -840,6 +4172,7 @@ HTML_INDEX = """
                 <span class="categoria-label">{{ n.categoria }}</span>
               {% endif %}
               <span class="likes-tag">• {{ n.likes }} curtidas</span>
+              <span>• {{ n.comentarios }} comentários</span>
             </div>
             <div class="title">{{ n.titulo }}</div>
             <div class="resumo">{{ n.resumo }}</div>
@@ -849,18 +4182,6 @@ HTML_INDEX = """
       {% endfor %}
     </div>
   </div>
-
-  <aside class="sidebar">
-    <h3>Mais lidas</h3>
-    <ul class="mais-lidas-list">
-      {% for m in mais_lidas %}
-        <li>
-          <a href="/noticia/{{ m.id }}">{{ m.titulo }}</a><br>
-          <span class="mais-lidas-views">{{ m.views }} visualizações</span>
-        </li>
-      {% endfor %}
-    </ul>
-  </aside>
 </div>
 
 </body>
@@ -963,6 +4284,10 @@ HTML_NOTICIA = """
    letter-spacing:1px;
    color:#6b7280;
  }
+ .artist-link {
+   color:#38bdf8;
+   text-decoration:none;
+ }
  .content-panel {
    background:#020617;
    border-radius:18px;
@@ -1015,6 +4340,51 @@ HTML_NOTICIA = """
    font-size:14px;
    line-height:1.6;
  }
+ .related {
+   max-width:1200px;
+   margin:0 auto 32px;
+   padding:0 20px;
+ }
+ .related-grid {
+   display:grid;
+   grid-template-columns:repeat(auto-fill,minmax(180px,1fr));
+   gap:14px;
+ }
+ .related-card {
+   background:#020617;
+   border-radius:12px;
+   border:1px solid rgba(148,163,184,0.3);
+   overflow:hidden;
+   color:#e5e7eb;
+   text-decoration:none;
+   display:flex;
+   flex-direction:column;
+ }
+ .related-card img {
+   width:100%;
+   height:100px;
+   object-fit:cover;
+   display:block;
+ }
+ .related-site {
+   font-size:10px;
+   color:#9ca3af;
+   padding:8px 10px 0;
+ }
+ .related-title {
+   font-size:13px;
+   line-height:1.4;
+   padding:4px 10px 10px;
+ }
+ .comments-nav {
+   display:flex;
+   gap:18px;
+   font-size:13px;
+ }
+ .comments-nav a, .comment-text a {
+   color:#38bdf8;
+   text-decoration:none;
+ }
  .comment-form {
    margin-top:18px;
    background:#020617;
@@ -1099,6 +4469,15 @@ window.onload = updateClock;
       <div style="height:10px;"></div>
       <div class="meta-label">Categoria</div>
       <div>{{ categoria }}</div>
+      {% if artistas %}
+        <div style="height:10px;"></div>
+        <div class="meta-label">Artistas</div>
+        <div>
+          {% for a in artistas %}
+            <a class="artist-link" href="/artista/{{ a.chave }}">{{ a.nome }}</a>{% if not loop.last %}, {% endif %}
+          {% endfor %}
+        </div>
+      {% endif %}
       <div style="height:10px;"></div>
       <div class="meta-label">Coletada em</div>
       <div>{{ data }}</div>
@@ -1121,8 +4500,23 @@ window.onload = updateClock;
   </div>
 </div>
 
+{% if relacionadas %}
+<div class="related">
+  <div class="comments-title">Leia também</div>
+  <div class="related-grid">
+    {% for r in relacionadas %}
+      <a class="related-card" href="/noticia/{{ r.id }}">
+        {% if r.imagem_url %}<img src="/thumb/{{ r.id }}" alt="" loading="lazy">{% endif %}
+        <span class="related-site">{{ r.site or 'Música' }}</span>
+        <span class="related-title">{{ r.titulo }}</span>
+      </a>
+    {% endfor %}
+  </div>
+</div>
+{% endif %}
+
 <div class="comments" id="comentarios">
-  <div class="comments-title">Comentários</div>
+  <div class="comments-title">Comentários ({{ total_comentarios }})</div>
 
   {% if comentarios %}
     {% for c in comentarios %}
@@ -1131,6 +4525,18 @@ window.onload = updateClock;
         <div class="comment-text">{{ c.texto }}</div>
       </div>
     {% endfor %}
+    <div class="comments-nav">
+      {% if paginando %}
+        <a href="/noticia/{{ news_id }}#comentarios">← Primeiros comentários</a>
+      {% endif %}
+      {% if proximo_cursor %}
+        <a href="/noticia/{{ news_id }}?comentarios_depois={{ proximo_cursor }}#comentarios">Próximos comentários →</a>
+      {% endif %}
+    </div>
+  {% elif paginando %}
+    <div class="comment-card">
+      <div class="comment-text">Não há mais comentários. <a href="/noticia/{{ news_id }}#comentarios">Voltar ao início</a></div>
+    </div>
   {% else %}
     <div class="comment-card">
       <div class="comment-text">Ainda não há comentários. Seja o primeiro a comentar!</div>
@@ -1233,11 +4639,44 @@ HTML_SEARCH = """
  .search-box button:hover {
    background:#38bdf8;
  }
+ .search-box input[type="date"] {
+   padding:7px 10px;
+   border-radius:8px;
+   border:1px solid #4b5563;
+   background:#020617;
+   color:#e5e7eb;
+   font-size:13px;
+ }
  .msg {
    margin-top:12px;
    font-size:13px;
    color:#9ca3af;
  }
+ .artist-link {
+   color:#38bdf8;
+   text-decoration:none;
+ }
+ .facets {
+   margin-top:12px;
+   display:flex;
+   flex-wrap:wrap;
+   gap:6px 18px;
+   font-size:12px;
+   color:#9ca3af;
+ }
+ .facets a {
+   color:#e5e7eb;
+   text-decoration:none;
+   padding:2px 8px;
+   border-radius:999px;
+   border:1px solid #4b5563;
+   margin-right:4px;
+ }
+ .facets a.ativo {
+   background:#0ea5e9;
+   border-color:#0ea5e9;
+   color:#0b1120;
+ }
  .grid {
    display:grid;
    grid-template-columns:repeat(auto-fit,minmax(320px,1fr));
@@ -1332,27 +4771,74 @@ HTML_SEARCH = """
 <div class="container">
   <div class="search-box">
     <form method="get" action="/buscar">
-      <input type="text" name="q" placeholder="Buscar por artista, música, álbum..." value="{{ termo }}">
+      <input type="text" name="q" placeholder="Buscar por artista, música, álbum..." value="{{ termo }}"
+             list="sugestoes" autocomplete="off" id="busca-q">
+      <datalist id="sugestoes"></datalist>
+      <script>
+      (function(){
+        const campo = document.getElementById('busca-q');
+        const lista = document.getElementById('sugestoes');
+        let espera = null;
+        campo.addEventListener('input', function(){
+          clearTimeout(espera);
+          const q = campo.value.trim();
+          if(!q) return;
+          espera = setTimeout(function(){
+            fetch('/api/suggest?q=' + encodeURIComponent(q))
+              .then(function(r){ return r.json(); })
+              .then(function(d){
+                lista.innerHTML = '';
+                d.sugestoes.forEach(function(s){
+                  const op = document.createElement('option');
+                  op.value = s.texto;
+                  lista.appendChild(op);
+                });
+              });
+          }, 120);
+        });
+      })();
+      </script>
       <select name="ordem">
         <option value="recentes" {% if ordem == 'recentes' %}selected{% endif %}>Mais recentes</option>
         <option value="mais_lidas" {% if ordem == 'mais_lidas' %}selected{% endif %}>Mais lidas</option>
+        <option value="em_alta" {% if ordem == 'em_alta' %}selected{% endif %}>Em alta</option>
       </select>
+      <input type="date" name="de" value="{{ de }}" title="De">
+      <input type="date" name="ate" value="{{ ate }}" title="Até">
+      {% if site %}<input type="hidden" name="site" value="{{ site }}">{% endif %}
+      {% if categoria %}<input type="hidden" name="categoria" value="{{ categoria }}">{% endif %}
       <button type="submit">Pesquisar</button>
     </form>
-    {% if termo %}
-      <div class="msg">Resultados para: <strong>{{ termo }}</strong> ({{ total }} encontrados)</div>
+    {% if ativo %}
+      <div class="msg">Resultados para: <strong>{{ termo or 'todas as notícias' }}</strong> ({{ total }} encontrados)</div>
+      {% if artista %}
+        <div class="msg">Artista: <a class="artist-link" href="/artista/{{ artista.chave }}">{{ artista.nome }}</a> ({{ artista.noticias }} notícias)</div>
+      {% endif %}
+      <div class="facets">
+        <div>Fonte:
+          {% for valor, n, href, sel in facetas_site %}
+            <a href="{{ href }}" class="{% if sel %}ativo{% endif %}">{{ valor }} ({{ n }})</a>
+          {% endfor %}
+        </div>
+        <div>Categoria:
+          {% for valor, n, href, sel in facetas_categoria %}
+            <a href="{{ href }}" class="{% if sel %}ativo{% endif %}">{{ valor }} ({{ n }})</a>
+          {% endfor %}
+        </div>
+      </div>
     {% else %}
-      <div class="msg">Digite um termo e clique em Pesquisar.</div>
+      <div class="msg">Digite um termo e clique em Pesquisar. Filtros: site:g1 categoria:shows de:2025-01-01 ate:2025-12-31</div>
     {% endif %}
   </div>
+  <!-- flush -->
 
-  {% if resultados %}
+  {% if ativo %}
   <div class="grid">
     {% for n in resultados %}
       <div class="card">
         <div class="thumb">
           {% if n.imagem_url %}
-            <img src="{{ n.imagem_url }}" alt="">
+            <img src="/thumb/{{ n.id }}" alt="" loading="lazy">
           {% endif %}
         </div>
         <div class="card-body">
@@ -1364,16 +4850,17 @@ HTML_SEARCH = """
               <span class="categoria-label">{{ n.categoria }}</span>
             {% endif %}
             <span class="likes-tag">• {{ n.likes }} curtidas</span>
+            <span>• {{ n.comentarios }} comentários</span>
           </div>
           <div class="title">{{ n.titulo_highlight|safe }}</div>
           <div class="resumo">{{ n.resumo_highlight|safe }}</div>
           <a class="btn" href="/noticia/{{ n.id }}">Ver mais</a>
         </div>
       </div>
+    {% else %}
+      <div class="msg">Nenhuma notícia encontrada para esse termo.</div>
     {% endfor %}
   </div>
-  {% elif termo %}
-    <div class="msg">Nenhuma notícia encontrada para esse termo.</div>
   {% endif %}
 </div>
 
@@ -1383,6 +4870,124 @@ HTML_SEARCH = """
 
 app = Flask(__name__)
 
+STREAM_CHUNK_BYTES = 8 * 1024
+STREAM_FLUSH_MARK = "<!-- flush -->"
+_compiled_templates = {}
+
+
+def buffered_chunks(chunks, size=STREAM_CHUNK_BYTES):
+    buf = []
+    tamanho = 0
+    for chunk in chunks:
+        buf.append(chunk)
+        tamanho += len(chunk)
+        if tamanho >= size or STREAM_FLUSH_MARK in chunk:
+            yield "".join(buf)
+            buf = []
+            tamanho = 0
+    if buf:
+        yield "".join(buf)
+
+
+def stream_page(source, **context):
+    tpl = _compiled_templates.get(source)
+    if tpl is None:
+        tpl = _compiled_templates[source] = app.jinja_env.from_string(source)
+    app.update_template_context(context)
+    return Response(
+        stream_with_context(buffered_chunks(tpl.generate(**context))),
+        mimetype="text/html",
+    )
+
+
+_first_request_lock = threading.Lock()
+_first_request_seen = False
+
+
+@app.before_request
+def start_request_timer():
+    global _first_request_seen
+    g.inicio_request = time.perf_counter()
+    if not _first_request_seen:
+        with _first_request_lock:
+            if _first_request_seen:
+                return
+            _first_request_seen = True
+        segundos = g.inicio_request - PROCESS_START
+        observe("inmusic_startup_seconds", segundos, marco="primeira_requisicao")
+        log_event("primeira_requisicao", rota=request.path, ms=round(segundos * 1000))
+        print(f"Primeira requisição {segundos:.2f}s após o início do processo")
+
+
+@app.before_request
+def start_request_profile():
+    # Token só por cabeçalho: em query string ele iria parar em logs de acesso e no histórico.
+    pedido = admin_authorized(request.headers.get("X-InMusic-Profile"))
+    amostra = (
+        PROFILE_SAMPLE_EVERY > 0
+        and not request.path.startswith("/admin/")
+        and next(_profile_requests) % PROFILE_SAMPLE_EVERY == 0
+    )
+    if not (pedido or amostra) or not _profile_lock.acquire(blocking=False):
+        return
+    perfil = start_profile()
+    if perfil is None:
+        _profile_lock.release()
+        return
+    g.perfil = perfil
+    g.perfil_pedido = pedido
+
+
+def finish_request_profile(perfil, nome, inicio):
+    perfil.disable()
+    try:
+        save_profile(nome, [perfil], time.perf_counter() - inicio)
+    finally:
+        _profile_lock.release()
+
+
+@app.after_request
+def attach_request_profile(response):
+    perfil = g.pop("perfil", None)
+    if perfil is None:
+        return response
+    nome = f"{request.method} {request.path}"
+    inicio = g.inicio_request
+    # Fecha só depois do último bloco do corpo, incluindo a renderização em streaming.
+    response.call_on_close(lambda: finish_request_profile(perfil, nome, inicio))
+    if g.perfil_pedido:
+        response.headers["X-InMusic-Profile"] = "gravado; veja /admin/perfis"
+    return response
+
+
+@app.teardown_request
+def drop_request_profile(erro=None):
+    perfil = g.pop("perfil", None)
+    if perfil is not None:
+        finish_request_profile(perfil, f"{request.method} {request.path}", g.inicio_request)
+
+
+@app.after_request
+def record_request_latency(response):
+    inicio = g.get("inicio_request")
+    if inicio is None:
+        return response
+    rota = request.url_rule.rule if request.url_rule else "nao_encontrada"
+    metodo = request.method
+    status = str(response.status_code)
+
+    def registra():
+        observe(
+            "inmusic_http_request_duration_seconds",
+            time.perf_counter() - inicio,
+            rota=rota,
+            metodo=metodo,
+            status=status,
+        )
+
+    response.call_on_close(registra)
+    return response
+
 
 @app.route("/")
 def index():
@@ -1390,12 +4995,14 @@ def index():
     if total <= 0:
         noticias = []
     else:
-        noticias = load_news(limit=min(total, 200), offset=0)
-    mais_lidas = load_most_viewed(limit=5)
-    return render_template_string(
+        noticias = iter_news(limit=min(total, 200), offset=0)
+    lateral = request.args.get("lateral", "mais_lidas")
+    mais_lidas = load_sidebar(lateral, limit=5)
+    return stream_page(
         HTML_INDEX,
         noticias=noticias,
         mais_lidas=mais_lidas,
+        lateral=lateral,
         total=total,
         titulo_lista="Últimas notícias",
     )
@@ -1403,48 +5010,99 @@ def index():
 
 @app.route("/curtidas")
 def curtidas():
-    noticias = load_liked(limit=200)
-    mais_lidas = load_most_viewed(limit=5)
-    return render_template_string(
+    noticias = iter_liked(limit=200)
+    lateral = request.args.get("lateral", "mais_lidas")
+    mais_lidas = load_sidebar(lateral, limit=5)
+    return stream_page(
         HTML_INDEX,
         noticias=noticias,
         mais_lidas=mais_lidas,
-        total=len(noticias),
+        lateral=lateral,
         titulo_lista="Minhas notícias curtidas",
     )
 
 
 @app.route("/buscar")
 def buscar():
-    termo = request.args.get("q", "").strip()
+    q = request.args.get("q", "").strip()
     ordem = request.args.get("ordem", "recentes")
+    termo, filtros = parse_search_query(q)
+    for chave in ("site", "categoria", "de", "ate"):
+        if request.args.get(chave):
+            filtros[chave] = request.args[chave]
+    sites, categorias = load_facet_options()
+    site = resolve_facet_value(filtros.get("site"), sites)
+    categoria = resolve_facet_value(filtros.get("categoria"), categorias)
+    de = parse_date(filtros.get("de"))
+    ate = parse_date(filtros.get("ate"), fim_do_dia=True)
+    ativo = bool(termo or site or categoria or de is not None or ate is not None)
+    artista = load_artist(termo) if termo else None
     resultados = []
-    total = 0
-    if termo:
-        resultados = search_news(termo, limit=200, order=ordem)
-        total = len(resultados)
-    return render_template_string(
+    facetas = {"site": [], "categoria": [], "total": 0}
+    if ativo:
+        facetas = search_facets(termo, site=site, categoria=categoria, de=de, ate=ate)
+        resultados = iter_search_news(termo, limit=200, order=ordem, site=site, categoria=categoria, de=de, ate=ate)
+
+    base = {"q": termo, "ordem": ordem, "site": site, "categoria": categoria,
+            "de": filtros.get("de") if de is not None else None,
+            "ate": filtros.get("ate") if ate is not None else None}
+
+    def facet_link(chave, valor):
+        args = dict(base)
+        args[chave] = None if args.get(chave) == valor else valor
+        return "/buscar?" + urlencode({k: v for k, v in args.items() if v})
+
+    return stream_page(
         HTML_SEARCH,
-        termo=termo,
+        termo=q,
+        ativo=ativo,
         resultados=resultados,
-        total=total,
+        total=facetas["total"],
         ordem=ordem,
+        site=site,
+        categoria=categoria,
+        de=base["de"] or "",
+        ate=base["ate"] or "",
+        facetas_site=[(v, n, facet_link("site", v), v == site) for v, n in facetas["site"]],
+        facetas_categoria=[(v, n, facet_link("categoria", v), v == categoria) for v, n in facetas["categoria"]],
+        artista=artista,
+    )
+
+
+@app.route("/artista/<nome>")
+def artista(nome):
+    a = load_artist(nome)
+    if not a:
+        return redirect("/buscar?" + urlencode({"q": nome.replace("-", " ")}))
+    lateral = request.args.get("lateral", "mais_lidas")
+    return stream_page(
+        HTML_INDEX,
+        noticias=iter_artist_news(a["id"]),
+        mais_lidas=load_sidebar(lateral, limit=5),
+        lateral=lateral,
+        titulo_lista=f"{a['nome']} – {a['noticias']} notícias, {a['mencoes']} menções",
     )
 
 
 @app.route("/noticia/<int:id_>")
 def noticia(id_):
-    increment_views(id_)
+    depois = parse_comment_cursor(request.args.get("comentarios_depois"))
+    if not depois:
+        increment_views(id_)
     n = load_one(id_)
     if not n:
         return "Notícia não encontrada."
+    if LAZY_BODIES and n["texto_completo"] is None and n["link"]:
+        n["texto_completo"] = ensure_body(id_, n["link"], n["site"], prazo=BODY_PAGE_DEADLINE)
     texto = n["texto_completo"] or ""
     paragrafos = [p.strip() for p in texto.split("\n\n") if p.strip()]
     if not paragrafos and texto:
         paragrafos = [texto]
     if not paragrafos and n.get("resumo"):
         paragrafos = [n["resumo"]]
-    comentarios = load_comments(id_)
+    comentarios, proximo_cursor = load_comments_page(id_, depois=depois)
+    relacionadas = load_related(id_)
+    artistas = load_news_artists(id_)
     return render_template_string(
         HTML_NOTICIA,
         news_id=id_,
@@ -1459,6 +5117,11 @@ def noticia(id_):
         liked=n.get("liked") or 0,
         paragrafos=paragrafos,
         comentarios=comentarios,
+        total_comentarios=n.get("comentarios") or 0,
+        proximo_cursor=proximo_cursor,
+        paginando=bool(depois),
+        relacionadas=relacionadas,
+        artistas=artistas,
     )
 
 
@@ -1477,38 +5140,292 @@ def curtir(id_):
     return redirect(referer)
 
 
+@app.route("/thumb/<int:id_>")
+def thumb(id_):
+    imagem_url = load_image_url(id_)
+    if not imagem_url or not imagem_url.startswith(("http://", "https://")):
+        abort(404)
+    if Image is None:
+        return redirect(imagem_url)
+    if "image/webp" in request.headers.get("Accept", ""):
+        fmt, mimetype = "webp", "image/webp"
+    else:
+        fmt, mimetype = "jpeg", "image/jpeg"
+    try:
+        # Sem esperar pelo balde do host nem por Retry-After: a thread é de um
+        # usuário. Se o host está no limite, o navegador busca a imagem original.
+        caminho = get_thumbnail(imagem_url, fmt, esperar=False)
+    except (PermissionError, RuntimeError):
+        return redirect(imagem_url)
+    except Exception as e:
+        log_error("rota_thumb", e, url=imagem_url, news_id=id_)
+        return redirect(imagem_url)
+    resp = send_file(os.path.abspath(caminho), mimetype=mimetype, max_age=THUMB_MAX_AGE, conditional=True)
+    resp.headers["Cache-Control"] = f"public, max-age={THUMB_MAX_AGE}, immutable"
+    resp.headers["Vary"] = "Accept"
+    return resp
+
+
+@app.route("/api/suggest")
+def api_suggest():
+    q = request.args.get("q", "")[:80]
+    try:
+        k = max(1, min(int(request.args.get("limite", SUGGEST_K)), 20))
+    except ValueError:
+        k = SUGGEST_K
+    resp = Response(
+        json.dumps({"q": q, "sugestoes": suggest(q, k)}, ensure_ascii=False),
+        mimetype="application/json",
+    )
+    resp.cache_control.public = True
+    resp.cache_control.max_age = 60
+    return resp
+
+
+@app.route("/feed.xml", defaults={"formato": "rss"})
+@app.route("/atom.xml", defaults={"formato": "atom"})
+@app.route("/feed.json", defaults={"formato": "json"})
+def feed(formato):
+    filtro, valor = None, None
+    for campo in ("categoria", "site"):
+        if request.args.get(campo, "").strip():
+            sites, categorias = load_facet_options()
+            opcoes = sites if campo == "site" else categorias
+            filtro, valor = campo, resolve_facet_value(request.args[campo], opcoes)
+            if valor not in opcoes:
+                abort(404)
+            break
+    args = {filtro: valor} if filtro else {}
+    self_url = url_for("feed", formato=formato, _external=True, **args)
+    corpo, etag, ultima = get_feed(formato, filtro, valor, url_for("index", _external=True), self_url)
+    resp = Response(corpo, mimetype=FEED_FORMATS[formato])
+    resp.set_etag(etag)
+    resp.last_modified = ultima or None
+    resp.cache_control.public = True
+    resp.cache_control.max_age = 300
+    return resp.make_conditional(request)
+
+
 @app.route("/atualizar")
 def atualizar():
     try:
-        crawl_all_sources()
+        enqueue_listings(due_sources())
         return redirect("/")
     except Exception as e:
         log_error("rota_atualizar", e)
         return "Erro ao atualizar notícias."
 
 
+def format_log_entry(entry):
+    partes = [f"[{entry.get('ts', '')}]", f"{entry.get('contexto', '')}:"]
+    if entry.get("erro"):
+        partes.append(str(entry["erro"]))
+    extras = {k: v for k, v in entry.items() if k not in ("ts", "contexto", "erro", "nivel")}
+    partes.extend(f"{k}={v}" for k, v in extras.items())
+    return " ".join(partes)
+
+
+@app.route("/admin/metrics")
+def admin_metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.route("/admin/log")
 def admin_log():
-    if not os.path.exists(LOG_PATH):
+    contexto = request.args.get("contexto", "").strip() or None
+    try:
+        linhas = max(1, min(int(request.args.get("linhas", 200)), 2000))
+    except ValueError:
+        linhas = 200
+    entradas = read_log_tail(linhas, contexto)
+    if request.args.get("formato") == "json":
+        corpo = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entradas)
+        return Response(corpo, mimetype="application/x-ndjson")
+    if not entradas:
         conteudo = "Sem logs ainda."
     else:
-        with open(LOG_PATH, "r", encoding="utf-8") as f:
-            texto = f.read()
-        if len(texto) > 4000:
-            texto = texto[-4000:]
-        conteudo = texto
+        conteudo = html_lib.escape("\n".join(format_log_entry(e) for e in entradas))
     return f"<pre>{conteudo}</pre>"
 
 
+@app.route("/admin/perfis")
+@app.route("/admin/perfis/<arquivo>")
+def admin_perfis(arquivo=None):
+    if not admin_authorized(request.headers.get("X-InMusic-Token")):
+        abort(403)
+    if arquivo is None:
+        entradas = []
+        if os.path.isdir(PROFILE_DIR):
+            entradas = sorted(
+                (e for e in os.scandir(PROFILE_DIR) if e.name.endswith(".prof")),
+                key=lambda e: e.stat().st_mtime,
+                reverse=True,
+            )
+        return Response("".join(e.name + "\n" for e in entradas) or "Sem perfis gravados.\n", mimetype="text/plain")
+    arquivo = os.path.basename(arquivo)
+    caminho = os.path.join(PROFILE_DIR, arquivo)
+    if not arquivo.endswith(".prof") or not os.path.exists(caminho):
+        abort(404)
+    if request.args.get("formato") == "prof":
+        return send_file(os.path.abspath(caminho), mimetype="application/octet-stream", as_attachment=True)
+    ordem = request.args.get("ordem", "cumulative")
+    if ordem not in ("cumulative", "tottime", "ncalls"):
+        ordem = "cumulative"
+    return Response(profile_report(arquivo, ordem), mimetype="text/plain; charset=utf-8")
+
+
+HTML_AGENDA = """
+<!DOCTYPE html>
+<html lang="pt-BR">
+<head>
+<meta charset="UTF-8">
+<title>InMusic – Agenda de coleta</title>
+<style>
+body { font-family: system-ui, sans-serif; margin: 24px; }
+table { border-collapse: collapse; }
+th, td { border: 1px solid #ccc; padding: 6px 10px; text-align: right; }
+th:first-child, td:first-child { text-align: left; }
+.atrasada { color: #b00020; }
+</style>
+</head>
+<body>
+<h1>Agenda de coleta</h1>
+<p>Intervalo entre {{ limites.min }} e {{ limites.max }} min, mirando ~{{ limites.alvo }} notícias novas por coleta.</p>
+<table>
+<tr><th>Fonte</th><th>Novas/hora</th><th>Intervalo</th><th>Páginas</th><th>Cards/página</th>
+<th>Novas na última</th><th>Última coleta</th><th>Próxima</th></tr>
+{% for a in agenda %}
+<tr>
+<td>{{ a.fonte }}</td>
+<td>{{ "%.2f"|format(a.taxa) if a.taxa is not none else "—" }}</td>
+<td>{{ (a.intervalo // 60) }} min</td>
+<td>{{ a.paginas }}</td>
+<td>{{ "%.1f"|format(a.cards_pagina) if a.cards_pagina else "—" }}</td>
+<td>{{ a.novas_ultima if a.novas_ultima is not none else "—" }}</td>
+<td>{{ a.ultima_fmt }}</td>
+<td class="{{ 'atrasada' if a.atrasada else '' }}">{{ a.proxima_fmt }}</td>
+</tr>
+{% endfor %}
+</table>
+</body>
+</html>
+"""
+
+
+@app.route("/admin/agenda")
+def admin_agenda():
+    agora = int(time.time())
+    agenda = list(load_schedule().values())
+    if request.args.get("formato") == "json":
+        return Response(json.dumps(agenda, ensure_ascii=False), mimetype="application/json")
+    for a in agenda:
+        a["ultima_fmt"] = format_ts(a["ultima"]) if a["ultima"] else "nunca"
+        a["proxima_fmt"] = format_ts(a["proxima"]) if a["proxima"] else "agora"
+        a["atrasada"] = a["proxima"] <= agora
+    limites = {
+        "min": SCHEDULE_MIN_INTERVAL // 60,
+        "max": SCHEDULE_MAX_INTERVAL // 60,
+        "alvo": SCHEDULE_TARGET_NEW,
+    }
+    return render_template_string(HTML_AGENDA, agenda=agenda, limites=limites)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="InMusic – agregador de notícias de música")
+    sub = parser.add_subparsers(dest="comando")
+    p = sub.add_parser("servir", help="recria o banco, coleta as notícias e sobe o site (padrão)")
+    p.add_argument(
+        "--rapido",
+        action="store_true",
+        help="usa o banco existente, aplica migrações pendentes, sobe o site na hora e coleta em segundo plano",
+    )
+    p.add_argument("--so-listagem", action="store_true", help="coleta só os cards; o texto é baixado na primeira leitura")
+    p = sub.add_parser("reclassificar", help="reclassifica todo o acervo com o classificador atual")
+    p.add_argument("--lote", type=int, default=RECLASSIFY_BATCH)
+    p.add_argument("--processos", type=int, default=os.cpu_count())
+    sub.add_parser("relacionadas", help="recalcula o índice de notícias relacionadas (TF-IDF)")
+    sub.add_parser("artistas", help="reconstrói o índice de artistas")
+    p = sub.add_parser("coletar", help="coleta as fontes sem recriar o banco, retomando uma coleta interrompida")
+    p.add_argument("--so-listagem", action="store_true", help="coleta só os cards; o texto é baixado na primeira leitura")
+    p = sub.add_parser("corpos", help="baixa o texto das notícias pendentes, das mais populares para as menos")
+    p.add_argument("--limite", type=int, default=BODY_PREFETCH_LIMIT)
+    p = sub.add_parser("arquivar", help="move notícias antigas para partições mensais em arquivo/")
+    p.add_argument("--dias", type=int, default=ARCHIVE_AFTER_DAYS, help="idade mínima das notícias arquivadas")
+    p.add_argument("--vacuum", action="store_true", help="compacta o banco principal depois de mover")
+    sub.add_parser("deduplicar", help="canonicaliza os links e funde notícias duplicadas (tracking, AMP, http/https)")
+    p = sub.add_parser("exportar", help="grava notícias e comentários num snapshot compactado (.jsonl.zst ou .jsonl.gz)")
+    p.add_argument("arquivo")
+    p = sub.add_parser("importar", help="recria o banco a partir de um snapshot")
+    p.add_argument("arquivo")
+    p.add_argument("--substituir", action="store_true", help="apaga o banco atual se ele já tiver notícias")
+    p = sub.add_parser("trabalhador", help="processa a fila de URLs (frontier) em vários processos")
+    p.add_argument("--processos", type=int, default=os.cpu_count())
+    p.add_argument("--lote", type=int, default=FRONTIER_BATCH)
+    p.add_argument("--enfileirar", action="store_true", help="enfileira as páginas de listagem antes de começar")
+    p.add_argument("--continuo", action="store_true", help="continua aguardando novas URLs quando a fila esvazia")
+    p.add_argument("--so-listagem", action="store_true", help="grava só os cards; o texto é baixado na primeira leitura")
+    return parser
+
+
 if __name__ == "__main__":
-    if os.path.exists(DB_PATH):
-        os.remove(DB_PATH)
-    init_db()
-    print("Coletando notícias iniciais (G1, POPline, Tracklist)...")
-    try:
+    args = build_arg_parser().parse_args()
+    LAZY_BODIES = getattr(args, "so_listagem", False)
+    if args.comando == "reclassificar":
+        init_db()
+        reclassify_all(batch_size=args.lote, processos=args.processos)
+    elif args.comando == "relacionadas":
+        init_db()
+        build_related_index()
+    elif args.comando == "artistas":
+        init_db()
+        rebuild_artist_index()
+    elif args.comando == "coletar":
+        init_db()
         crawl_all_sources()
-    except Exception as e:
-        log_error("main_crawler_inicial", e)
-    print(f"Banco agora tem {count_news()} notícias")
-    print("Rodando em http://127.0.0.1:5000")
-    app.run(debug=True)
+    elif args.comando == "corpos":
+        init_db()
+        prefetch_bodies(args.limite)
+    elif args.comando == "arquivar":
+        init_db()
+        archive_old_news(args.dias, vacuum=args.vacuum)
+    elif args.comando == "deduplicar":
+        init_db()
+        merge_duplicate_news()
+    elif args.comando == "exportar":
+        init_db()
+        export_snapshot(args.arquivo)
+    elif args.comando == "importar":
+        import_snapshot(args.arquivo, substituir=args.substituir)
+    elif args.comando == "trabalhador":
+        use_process_log()
+        init_db()
+        if args.enfileirar:
+            enqueue_listings()
+        run_workers(args.processos, limite=args.lote, continuo=args.continuo, so_listagem=args.so_listagem)
+    elif getattr(args, "rapido", False):
+        init_db()
+        threading.Thread(target=background_refresh, name="coleta-inicial", daemon=True).start()
+        threading.Thread(target=run_local_worker, name="trabalhador-local", daemon=True).start()
+        threading.Thread(target=current_suggest_model, name="indice-sugestoes", daemon=True).start()
+        threading.Thread(target=load_related_model, name="modelo-relacionadas", daemon=True).start()
+        segundos = time.perf_counter() - PROCESS_START
+        observe("inmusic_startup_seconds", segundos, marco="servidor_pronto")
+        log_event("servidor_pronto", noticias=count_news(), ms=round(segundos * 1000))
+        print(f"Banco com {count_news()} notícias; servidor pronto em {segundos:.2f}s (coleta em segundo plano)")
+        print("Rodando em http://127.0.0.1:5000")
+        app.run(debug=True, use_reloader=False, threaded=True)
+    else:
+        if os.path.exists(DB_PATH):
+            os.remove(DB_PATH)
+        init_db()
+        print("Coletando notícias iniciais (G1, POPline, Tracklist)...")
+        try:
+            crawl_all_sources()
+        except Exception as e:
+            log_error("main_crawler_inicial", e)
+        print(f"Banco agora tem {count_news()} notícias")
+        threading.Thread(target=run_local_worker, name="trabalhador-local", daemon=True).start()
+        threading.Thread(target=current_suggest_model, name="indice-sugestoes", daemon=True).start()
+        threading.Thread(target=load_related_model, name="modelo-relacionadas", daemon=True).start()
+        print("Rodando em http://127.0.0.1:5000")
+        app.run(debug=True)
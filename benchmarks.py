@@ -0,0 +1,297 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import resource
+import sqlite3
+import tempfile
+import time
+
+import InMusic
+
+
+SILABAS = ["ba", "be", "ca", "co", "da", "de", "fa", "ga", "la", "le", "ma", "me", "na", "no",
+           "pa", "pe", "ra", "ri", "sa", "se", "ta", "te", "va", "vi", "ar", "or", "an", "en"]
+
+
+def synthetic_vocabulary(tamanho, seed=7):
+    rnd = random.Random(seed)
+    vocab = set()
+    while len(vocab) < tamanho:
+        vocab.add("".join(rnd.choice(SILABAS) for _ in range(rnd.randint(2, 4))))
+    return sorted(vocab)
+
+
+def synthetic_rows(n, palavras_por_texto=180, seed=11):
+    rnd = random.Random(seed)
+    vocab = synthetic_vocabulary(30000)
+    acumulado = list(itertools.accumulate(1.0 / (i + 1) ** 1.1 for i in range(len(vocab))))
+    topicos = [rnd.sample(vocab[2000:], 40) for _ in range(400)]
+    agora = int(time.time())
+    for i in range(n):
+        topico = topicos[rnd.randrange(len(topicos))]
+        texto = rnd.choices(vocab, cum_weights=acumulado, k=palavras_por_texto) + rnd.choices(topico, k=palavras_por_texto // 4)
+        rnd.shuffle(texto)
+        yield (
+            " ".join(texto[:8]),
+            " ".join(texto[8:40]),
+            " ".join(texto),
+            f"https://exemplo.com/noticia/{i}",
+            "Tracklist",
+            "Outros",
+            agora - i * 60,
+        )
+
+
+CIDADES = ["São Paulo", "Rio de Janeiro", "Belo Horizonte", "Salvador", "Recife", "Fortaleza", "Curitiba",
+           "Porto Alegre", "Brasília", "Goiânia", "Manaus", "Belém", "Florianópolis", "Campinas", "Lisboa"]
+FESTIVAIS = ["Rock in Rio", "Lollapalooza", "The Town", "Primavera Sound", "Coala Festival", "João Rock",
+             "Festival de Verão", "Villa Mix", "Planeta Atlântida", "Rock the Mountain"]
+GENEROS = ["sertanejo", "funk", "pagode", "samba", "MPB", "rap", "trap", "rock", "pop", "forró", "axé", "eletrônica"]
+PALAVRAS_MUSICA = ["Saudade", "Coração", "Noite", "Verão", "Lua", "Estrada", "Amor", "Mar", "Cidade", "Fogo",
+                   "Céu", "Tempo", "Vida", "Sonho", "Festa", "Chuva", "Segredo", "Paixão", "Madrugada", "Liberdade"]
+TITULO_MODELOS = [
+    "{artista} anuncia turnê pelo Brasil com show em {cidade}",
+    "{artista} lança clipe de \"{musica}\" e fãs reagem nas redes",
+    "{artista} confirma show em {cidade}; ingressos esgotam em horas",
+    "{artista} e {artista2} gravam parceria inédita",
+    "{festival} divulga line-up com {artista} e {artista2}",
+    "{artista} bate recorde no Spotify com \"{musica}\"",
+    "{artista} é indicado ao Grammy Latino em {numero} categorias",
+    "{artista} revela capa e data de lançamento do novo álbum \"{musica}\"",
+    "{artista} fala sobre polêmica e rebate críticas em entrevista",
+    "Single \"{musica}\", de {artista}, estreia no topo das paradas",
+    "{artista} cancela apresentação em {cidade} e pede desculpas aos fãs",
+    "{artista} emociona o público no {festival} com homenagem",
+]
+FRASES = [
+    "A novidade foi anunciada nesta {dia} pelas redes sociais de {artista}.",
+    "Segundo a produtora, a turnê passa por {numero} cidades e começa em {cidade}.",
+    "O show no {festival} reuniu cerca de {milhares} mil pessoas, de acordo com a organização.",
+    "{artista} contou que a música \"{musica}\" nasceu durante uma viagem a {cidade}.",
+    "Nas plataformas digitais, o lançamento somou {milhoes} milhões de reproduções na primeira semana.",
+    "A parceria com {artista2} mistura {genero} e {genero2}, marca das últimas produções do artista.",
+    "Os ingressos começam a ser vendidos na próxima {dia}, com preços a partir de R$ {preco}.",
+    "Em entrevista, {artista} disse que o novo álbum é o trabalho mais pessoal da carreira.",
+    "O clipe foi gravado em {cidade} e tem direção de um coletivo independente.",
+    "Fãs lotaram as redes com comentários sobre a apresentação, que teve participação de {artista2}.",
+    "A indicação ao prêmio coloca {artista} entre os nomes mais ouvidos do {genero} no país.",
+    "A assessoria informou que a agenda de shows será divulgada nas próximas semanas.",
+]
+DIAS = ["segunda-feira", "terça-feira", "quarta-feira", "quinta-feira", "sexta-feira", "sábado", "domingo"]
+COMENTARIOS = ["Que notícia boa!", "Já garanti meu ingresso.", "Não vejo a hora de ouvir o álbum.",
+               "Melhor show que já fui.", "Essa parceria ficou incrível.", "Preciso desse show na minha cidade!",
+               "Ouvindo sem parar desde ontem.", "Discordo totalmente da crítica."]
+LEITORES = ["Ana", "Bruno", "Carla", "Diego", "Fernanda", "Gabriel", "Juliana", "Lucas", "Mariana", "Rafael"]
+FONTES = ["G1 Música", "Portal POPline", "Tracklist"]
+
+
+def synthetic_news(n, seed=13, inicio=None, periodo_dias=730):
+    rnd = random.Random(seed)
+    artistas = InMusic.ARTISTAS
+    pesos_artistas = list(itertools.accumulate(1.0 / (i + 1) ** 0.9 for i in range(len(artistas))))
+    agora = inicio or int(time.time())
+
+    def preenche(modelo):
+        a1, a2 = rnd.choices(artistas, cum_weights=pesos_artistas, k=2)
+        g1, g2 = rnd.sample(GENEROS, 2)
+        return modelo.format(
+            artista=a1, artista2=a2, cidade=rnd.choice(CIDADES), festival=rnd.choice(FESTIVAIS),
+            musica=" ".join(rnd.sample(PALAVRAS_MUSICA, rnd.randint(1, 2))), numero=rnd.randint(2, 30),
+            dia=rnd.choice(DIAS), milhares=rnd.randint(5, 120), milhoes=rnd.randint(1, 90),
+            genero=g1, genero2=g2, preco=rnd.randint(60, 900),
+        )
+
+    for i in range(n):
+        titulo = preenche(rnd.choice(TITULO_MODELOS))
+        paragrafos = [" ".join(preenche(f) for f in rnd.sample(FRASES, rnd.randint(2, 4))) for _ in range(rnd.randint(3, 6))]
+        texto = "\n\n".join(paragrafos)
+        resumo = paragrafos[0][:230].rsplit(" ", 1)[0] + "..."
+        fonte = rnd.choice(FONTES)
+        views = int(rnd.paretovariate(1.2)) - 1
+        yield {
+            "titulo": titulo,
+            "imagem_url": f"https://exemplo.com/img/{i}.jpg",
+            "resumo": resumo,
+            "texto_completo": texto,
+            "link": f"https://exemplo.com/{seed}/noticia/{i}",
+            "autor": f"Redação {fonte}",
+            "site": fonte,
+            "views": views,
+            "likes": int(views * rnd.random() * 0.1),
+            "comentarios": min(int(rnd.paretovariate(1.5)) - 1, 500),
+            "created_at": agora - int((n - 1 - i) * periodo_dias * 86400 / max(n, 1)) - rnd.randint(0, 3600),
+        }
+
+
+def seed_archive(path, n, seed=13, lote=5000):
+    rnd = random.Random(seed + 1)
+    con = sqlite3.connect(path)
+    con.execute("PRAGMA synchronous=OFF")
+    cur = con.cursor()
+    cur.execute("SELECT COALESCE(MAX(id), 0) FROM news")
+    proximo = cur.fetchone()[0] + 1
+    noticias = synthetic_news(n, seed)
+    while True:
+        bloco = list(itertools.islice(noticias, lote))
+        if not bloco:
+            break
+        linhas, categorias, comentarios = [], [], []
+        for id_, item in enumerate(bloco, proximo):
+            labels = InMusic.classify_categories(item["titulo"], item["resumo"])
+            categorias.extend((id_, cat, peso) for cat, peso in labels)
+            for j in range(item["comentarios"]):
+                comentarios.append(
+                    (id_, rnd.choice(LEITORES), rnd.choice(COMENTARIOS), item["created_at"] + 60 * (j + 1))
+                )
+            linhas.append(
+                (
+                    id_, item["titulo"], item["imagem_url"], item["resumo"], item["texto_completo"], item["link"],
+                    item["autor"], item["site"], labels[0][0], item["views"], item["created_at"], item["likes"],
+                    1 if rnd.random() < 0.01 else 0, item["comentarios"],
+                    InMusic.trend_seed(item["created_at"], item["views"], item["likes"], item["comentarios"]),
+                )
+            )
+        proximo += len(bloco)
+        cur.executemany(
+            """
+            INSERT INTO news (id, titulo, imagem_url, resumo, texto_completo, link, autor, site, categoria,
+                              views, created_at, likes, liked, comment_count, trend_score)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            linhas,
+        )
+        cur.executemany("INSERT INTO news_categorias (news_id, categoria, peso) VALUES (?, ?, ?)", categorias)
+        cur.executemany("INSERT INTO comments (news_id, nome, texto, created_at) VALUES (?, ?, ?, ?)", comentarios)
+    InMusic.rebuild_daily_counts(cur)
+    con.commit()
+    con.close()
+
+
+def seed_database(path, n):
+    con = sqlite3.connect(path)
+    con.executemany(
+        """
+        INSERT INTO news (titulo, resumo, texto_completo, link, site, categoria, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        synthetic_rows(n),
+    )
+    con.commit()
+    con.close()
+
+
+def bench_related(n):
+    pasta = tempfile.mkdtemp(prefix="inmusic-bench-")
+    InMusic.DB_PATH = os.path.join(pasta, "bench.db")
+    InMusic.LOG_PATH = os.path.join(pasta, "bench_log.jsonl")
+    InMusic.init_db()
+    t0 = time.perf_counter()
+    seed_database(InMusic.DB_PATH, n)
+    print(f"acervo sintético: {n} notícias em {time.perf_counter() - t0:.1f}s")
+
+    rss_antes = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    t0 = time.perf_counter()
+    model = InMusic.build_related_index()
+    build_s = time.perf_counter() - t0
+    rss_depois = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    X = model["X"]
+    matriz = X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    vizinhos = model["top_idx"].nbytes + model["top_score"].nbytes
+    print(f"construção completa: {build_s:.1f}s")
+    print(f"vocabulário: {len(model['vocab'])} termos, nnz: {X.nnz}")
+    print(f"matriz TF-IDF: {matriz / 2**20:.1f} MiB, vizinhos: {vizinhos / 2**20:.1f} MiB")
+    print(f"RSS máximo: {rss_antes:.0f} MiB antes, {rss_depois:.0f} MiB depois da construção")
+
+    seed_novos = list(synthetic_rows(200, seed=99))
+    con = sqlite3.connect(InMusic.DB_PATH)
+    proximo = con.execute("SELECT MAX(id) FROM news").fetchone()[0] + 1
+    con.executemany(
+        """
+        INSERT INTO news (titulo, resumo, texto_completo, link, site, categoria, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        [r[:3] + (r[3] + "-novo",) + r[4:] for r in seed_novos],
+    )
+    con.commit()
+    con.close()
+    t0 = time.perf_counter()
+    InMusic.update_related_index(list(range(proximo, proximo + len(seed_novos))))
+    print(f"atualização incremental (200 novas): {time.perf_counter() - t0:.2f}s")
+
+    ids = model["ids"]
+    t0 = time.perf_counter()
+    for id_ in random.Random(3).sample(ids, 1000):
+        InMusic.load_related(id_)
+    print(f"load_related: {(time.perf_counter() - t0) * 1000 / 1000:.3f} ms por consulta")
+
+
+def time_calls(fn, repeticoes):
+    tempos = []
+    for i in range(repeticoes):
+        t0 = time.perf_counter()
+        fn(i)
+        tempos.append(time.perf_counter() - t0)
+    tempos.sort()
+    return {
+        "mediana_ms": round(tempos[len(tempos) // 2] * 1000, 3),
+        "p95_ms": round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))] * 1000, 3),
+    }
+
+
+def bench_data_layer(n, repeticoes=20):
+    pasta = tempfile.mkdtemp(prefix="inmusic-bench-")
+    InMusic.DB_PATH = os.path.join(pasta, "bench.db")
+    InMusic.LOG_PATH = os.path.join(pasta, "bench_log.jsonl")
+    InMusic.init_db()
+    t0 = time.perf_counter()
+    seed_archive(InMusic.DB_PATH, n)
+    semeadura = time.perf_counter() - t0
+    print(f"acervo sintético: {n} notícias em {semeadura:.1f}s ({os.path.getsize(InMusic.DB_PATH) / 2**20:.0f} MiB)")
+
+    con = sqlite3.connect(InMusic.DB_PATH)
+    mais_comentada = con.execute("SELECT id FROM news ORDER BY comment_count DESC LIMIT 1").fetchone()[0]
+    con.close()
+    rnd = random.Random(21)
+    novas = synthetic_news(repeticoes * 50, seed=99)
+    casos = {
+        "load_news (página 1)": lambda i: InMusic.load_news(limit=20),
+        "load_news (meio do acervo)": lambda i: InMusic.load_news(limit=20, offset=n // 2),
+        "search_news (artista)": lambda i: InMusic.search_news(rnd.choice(InMusic.ARTISTAS[:10])),
+        "search_news (termo raro)": lambda i: InMusic.search_news("Rock the Mountain"),
+        "search_news (sem resultado)": lambda i: InMusic.search_news("xilofone quântico"),
+        "load_most_viewed": lambda i: InMusic.load_most_viewed(),
+        "load_liked": lambda i: InMusic.load_liked(),
+        "load_comments": lambda i: InMusic.load_comments(mais_comentada),
+        "save_news_batch (50 novas)": lambda i: InMusic.save_news_batch(list(itertools.islice(novas, 50))),
+    }
+    resultados = {"n": n, "semeadura_s": round(semeadura, 1), "funcoes": {}}
+    for nome, fn in casos.items():
+        r = time_calls(fn, repeticoes)
+        resultados["funcoes"][nome] = r
+        print(f"  {nome:<30} mediana {r['mediana_ms']:>10.3f} ms   p95 {r['p95_ms']:>10.3f} ms")
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do InMusic")
+    sub = parser.add_subparsers(dest="bench", required=True)
+    p = sub.add_parser("relacionadas", help="tempo e memória do índice TF-IDF de notícias relacionadas")
+    p.add_argument("--n", type=int, default=100000)
+    p = sub.add_parser("dados", help="tempo das funções de acesso ao banco em acervos de tamanhos crescentes")
+    p.add_argument("--tamanhos", type=int, nargs="+", default=[10000, 100000, 1000000])
+    p.add_argument("--repeticoes", type=int, default=20)
+    p.add_argument("--saida", help="grava os resultados em JSON")
+    args = parser.parse_args()
+    if args.bench == "relacionadas":
+        bench_related(args.n)
+    elif args.bench == "dados":
+        resultados = [bench_data_layer(n, args.repeticoes) for n in args.tamanhos]
+        if args.saida:
+            with open(args.saida, "w", encoding="utf-8") as f:
+                json.dump(resultados, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
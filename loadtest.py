@@ -0,0 +1,246 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from werkzeug.serving import make_server
+
+import InMusic
+import benchmarks
+
+
+MIX_PADRAO = {
+    "/": 30,
+    "/buscar": 20,
+    "/noticia/<id>": 30,
+    "/curtir/<id>": 10,
+    "/noticia/<id>/comentar": 10,
+}
+
+
+def seed_load_database(pasta, n):
+    InMusic.DB_PATH = os.path.join(pasta, "loadtest.db")
+    InMusic.LOG_PATH = os.path.join(pasta, "loadtest_log.jsonl")
+    InMusic.init_db()
+    benchmarks.seed_archive(InMusic.DB_PATH, n)
+    return search_terms()
+
+
+def search_terms():
+    con = sqlite3.connect(InMusic.DB_PATH)
+    termos = [t for (titulo,) in con.execute("SELECT titulo FROM news LIMIT 500") for t in titulo.split() if len(t) > 3]
+    con.close()
+    return sorted(set(termos))
+
+
+def remote_search_terms(base):
+    termos = set()
+    for letra in "abcdefghijlmnoprstv":
+        try:
+            r = requests.get(f"{base.rstrip('/')}/api/suggest", params={"q": letra, "limite": 20}, timeout=5)
+            r.raise_for_status()
+        except requests.RequestException:
+            continue
+        termos.update(s["texto"] for s in r.json()["sugestoes"] if len(s["texto"]) > 3)
+    return sorted(termos)
+
+
+def serve(db_path, log_path, porta):
+    InMusic.DB_PATH = db_path
+    InMusic.LOG_PATH = log_path
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    make_server("127.0.0.1", porta, InMusic.app, threaded=True).serve_forever()
+
+
+def wait_for(url, timeout=30):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            requests.get(url, timeout=2)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    raise RuntimeError(f"servidor não respondeu em {url}")
+
+
+def percentile(ordenados, p):
+    if not ordenados:
+        return None
+    return ordenados[min(len(ordenados) - 1, max(0, int(round(p / 100 * len(ordenados))) - 1))]
+
+
+class LoadRunner:
+    def __init__(self, base, n, termos, mix, seed=1):
+        self.base = base.rstrip("/")
+        self.n = n
+        self.termos = termos or ["musica"]
+        self.rotas = list(mix)
+        self.pesos = [mix[r] for r in self.rotas]
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.latencias = {r: [] for r in self.rotas}
+        self.erros = {r: 0 for r in self.rotas}
+
+    def request(self, sessao, rnd, rota):
+        id_ = rnd.randint(1, self.n)
+        if rota == "/":
+            return sessao.get(f"{self.base}/")
+        if rota == "/buscar":
+            return sessao.get(f"{self.base}/buscar", params={"q": rnd.choice(self.termos)})
+        if rota == "/noticia/<id>":
+            return sessao.get(f"{self.base}/noticia/{id_}")
+        if rota == "/curtir/<id>":
+            return sessao.post(f"{self.base}/curtir/{id_}", allow_redirects=False)
+        return sessao.post(
+            f"{self.base}/noticia/{id_}/comentar",
+            data={"nome": "carga", "texto": "comentário do teste de carga"},
+            allow_redirects=False,
+        )
+
+    def worker(self, indice, fim):
+        rnd = random.Random(self.seed * 1000 + indice)
+        sessao = requests.Session()
+        locais = {r: [] for r in self.rotas}
+        erros = {r: 0 for r in self.rotas}
+        while time.monotonic() < fim:
+            rota = rnd.choices(self.rotas, weights=self.pesos)[0]
+            inicio = time.perf_counter()
+            try:
+                r = self.request(sessao, rnd, rota)
+                r.content
+                ok = r.status_code < 400
+            except requests.RequestException:
+                ok = False
+            if ok:
+                locais[rota].append(time.perf_counter() - inicio)
+            else:
+                erros[rota] += 1
+        with self.lock:
+            for rota in self.rotas:
+                self.latencias[rota].extend(locais[rota])
+                self.erros[rota] += erros[rota]
+
+    def run(self, concorrencia, duracao, aquecimento=0):
+        if aquecimento:
+            self.run_phase(concorrencia, aquecimento)
+            self.latencias = {r: [] for r in self.rotas}
+            self.erros = {r: 0 for r in self.rotas}
+        return self.run_phase(concorrencia, duracao)
+
+    def run_phase(self, concorrencia, duracao):
+        inicio = time.monotonic()
+        fim = inicio + duracao
+        with ThreadPoolExecutor(max_workers=concorrencia) as pool:
+            futuros = [pool.submit(self.worker, i, fim) for i in range(concorrencia)]
+            for futuro in futuros:
+                futuro.result()
+        return time.monotonic() - inicio
+
+    def summary(self, decorrido):
+        rotas = {}
+        for rota in self.rotas:
+            ordenados = sorted(self.latencias[rota])
+            rotas[rota] = {
+                "requisicoes": len(ordenados),
+                "erros": self.erros[rota],
+                "rps": round(len(ordenados) / decorrido, 1),
+                "p50_ms": round(percentile(ordenados, 50) * 1000, 2) if ordenados else None,
+                "p95_ms": round(percentile(ordenados, 95) * 1000, 2) if ordenados else None,
+                "p99_ms": round(percentile(ordenados, 99) * 1000, 2) if ordenados else None,
+                "max_ms": round(ordenados[-1] * 1000, 2) if ordenados else None,
+            }
+        total = sum(r["requisicoes"] for r in rotas.values())
+        return {"rps_total": round(total / decorrido, 1), "segundos": round(decorrido, 2), "rotas": rotas}
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(resultado):
+    print(f"{'rota':<26}{'req':>8}{'erros':>7}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for rota, r in resultado["rotas"].items():
+        print(
+            f"{rota:<26}{r['requisicoes']:>8}{r['erros']:>7}{r['rps']:>9}"
+            f"{r['p50_ms'] or '-':>9}{r['p95_ms'] or '-':>9}{r['p99_ms'] or '-':>9}"
+        )
+    print(f"total: {resultado['rps_total']} req/s em {resultado['segundos']}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga HTTP das rotas do InMusic")
+    parser.add_argument("--n", type=int, default=10000, help="notícias no banco semeado (com --url: maior id no servidor)")
+    parser.add_argument("--concorrencia", type=int, default=16)
+    parser.add_argument("--duracao", type=float, default=30, help="segundos de medição")
+    parser.add_argument("--aquecimento", type=float, default=3)
+    parser.add_argument("--porta", type=int, default=5055)
+    parser.add_argument("--url", help="usa um servidor já rodando em vez de semear um banco local")
+    parser.add_argument("--termos", help="termos de busca separados por vírgula (com --url; padrão: via /api/suggest)")
+    parser.add_argument("--mix", help='pesos por rota em JSON, ex.: {"/": 50, "/buscar": 50}')
+    parser.add_argument("--saida", default="loadtest_resultado.json")
+    args = parser.parse_args()
+
+    mix = json.loads(args.mix) if args.mix else MIX_PADRAO
+    servidor = None
+    if args.url:
+        base = args.url
+        n = args.n
+        termos = [t.strip() for t in args.termos.split(",") if t.strip()] if args.termos else remote_search_terms(base)
+    else:
+        pasta = tempfile.mkdtemp(prefix="inmusic-carga-")
+        t0 = time.perf_counter()
+        termos = seed_load_database(pasta, args.n)
+        n = args.n
+        print(f"banco semeado: {n} notícias em {time.perf_counter() - t0:.1f}s")
+        servidor = multiprocessing.Process(
+            target=serve, args=(InMusic.DB_PATH, InMusic.LOG_PATH, args.porta), daemon=True
+        )
+        servidor.start()
+        base = f"http://127.0.0.1:{args.porta}"
+        wait_for(base + "/admin/metrics")
+
+    try:
+        runner = LoadRunner(base, n, termos, mix)
+        decorrido = runner.run(args.concorrencia, args.duracao, args.aquecimento)
+    finally:
+        if servidor is not None:
+            servidor.terminate()
+            servidor.join()
+
+    resultado = runner.summary(decorrido)
+    resultado.update(
+        {
+            "versao": git_revision(),
+            "data": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "parametros": {
+                "n": n,
+                "concorrencia": args.concorrencia,
+                "duracao": args.duracao,
+                "mix": mix,
+                "url": args.url,
+            },
+        }
+    )
+    print_summary(resultado)
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"resultado salvo em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()